@@ -0,0 +1,249 @@
+"""Append-only audit journal of admin commands.
+
+Each entry records who ran what, where, with which options, what the server
+answered and how long it took. `record()` only appends to an in-memory
+buffer, so the command path never waits on the disk; a background task
+writes the buffer out, and fsyncs it, every `audit_flush_interval` seconds.
+
+The journal is a directory of JSON-lines segments, numbered in order. A new
+segment is started once the current one reaches `audit_max_bytes`, and the
+oldest are deleted beyond `audit_max_segments`. An in-memory index (by time,
+and by player Steam ID) maps entries to their position on disk, so `/audit`
+only reads the lines it shows.
+"""
+import asyncio
+import bisect
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from parsing import parse_steam_ids
+import logger
+
+log = logger.get_logger(__name__)
+
+DEFAULT_DIRECTORY = "audit"
+DEFAULT_FLUSH_INTERVAL = 1
+DEFAULT_MAX_BYTES = 10_000_000
+DEFAULT_MAX_SEGMENTS = 10
+SEGMENT_NAME = "audit-{number:06d}.jsonl"
+SEGMENT_GLOB = "audit-*.jsonl"
+# Longest RCON response kept in an entry
+MAX_RESPONSE_LENGTH = 500
+
+
+def segment_number(path: Path) -> int:
+    return int(path.stem.split("-", 1)[1])
+
+
+class AuditJournal:
+    def __init__(
+        self,
+        directory: str = DEFAULT_DIRECTORY,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_segments: int = DEFAULT_MAX_SEGMENTS,
+    ):
+        self.DIRECTORY = Path(directory)
+        self.FLUSH_INTERVAL = flush_interval
+        self.MAX_BYTES = max_bytes
+        self.MAX_SEGMENTS = max(1, max_segments)
+        # Appends and reads each get a thread, so a slow query never holds up a flush
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-writer")
+        self.reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-reader")
+        self.file = None  # The segment being appended to; only touched on the writer thread
+        self.segment = 0
+        self.pending: list[dict] = []
+        self.flushing: list[dict] = []  # Taken from `pending`, but not indexed yet
+        # Index, oldest first: (timestamp, segment, offset, length) per entry on disk
+        self.index: list[tuple[float, int, int, int]] = []
+        self.first = 0  # Sequence number of index[0]; entries keep theirs as older ones are dropped
+        self.by_steam_id: dict[str, list[int]] = {}  # { Key (Steam ID): Value (sequence numbers, ascending) }
+        self.task: asyncio.Task | None = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "AuditJournal":
+        return cls(
+            directory=config.get("audit_directory", DEFAULT_DIRECTORY),
+            flush_interval=config.get("audit_flush_interval", DEFAULT_FLUSH_INTERVAL),
+            max_bytes=config.get("audit_max_bytes", DEFAULT_MAX_BYTES),
+            max_segments=config.get("audit_max_segments", DEFAULT_MAX_SEGMENTS),
+        )
+
+    # Lifecycle --------------------------------------------------------------------
+    async def start(self) -> None:
+        if self.task:
+            return
+        await asyncio.get_running_loop().run_in_executor(self.writer, self._open)
+        self.task = asyncio.create_task(self.run())
+
+    def _open(self) -> None:
+        """Rebuilds the index from the segments on disk, and opens the newest for appending"""
+        self.DIRECTORY.mkdir(parents=True, exist_ok=True)
+        for path in sorted(self.DIRECTORY.glob(SEGMENT_GLOB), key=segment_number):
+            self.segment = segment_number(path)
+            offset = 0
+            with path.open("rb") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        self.add_to_index(entry, self.segment, offset, len(line))
+                    except ValueError:
+                        # A line cut short by a crash; everything after it is still usable
+                        log.warning(f"Skipping a corrupt line in {path}")
+                    offset += len(line)
+        self.open_segment(self.segment or 1)
+        self.delete_old_segments()
+        self.prune()
+        log.info(f"Audit journal stored in {self.DIRECTORY} ({len(self.index)} entries)")
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                # The entries are kept for the next flush; the journal must outlive any one bad write
+                log.error(f"Unable to write the audit journal: {type(e).__name__}: {e}")
+
+    async def close(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+            await self.flush()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.writer, self._close)
+        self.writer.shutdown()
+        self.reader.shutdown()
+
+    def _close(self) -> None:
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    # Writes -----------------------------------------------------------------------
+    def record(self, **entry) -> None:
+        """Buffers an entry; never blocks"""
+        entry.setdefault("timestamp", time.time())
+        if len(entry.get("response") or "") > MAX_RESPONSE_LENGTH:
+            entry["response"] = entry["response"][:MAX_RESPONSE_LENGTH] + "..."
+        arguments = entry.get("arguments", {})
+        steam_ids = [arguments["steam_id"]] if arguments.get("steam_id") else []
+        steam_ids.extend(parse_steam_ids(arguments.get("steam_ids") or ""))
+        entry["steam_ids"] = steam_ids
+        self.pending.append(entry)
+
+    async def flush(self) -> None:
+        if not self.pending or not self.file:
+            return
+        entries = self.flushing = self.pending
+        self.pending = []
+        try:
+            # default=str, so an argument nobody thought to convert can't stall every later entry
+            lines = [(json.dumps(entry, ensure_ascii=False, default=str) + "\n").encode("utf-8") for entry in entries]
+            positions = await asyncio.get_running_loop().run_in_executor(self.writer, self._write, lines)
+        except Exception:
+            # Kept for the next flush
+            self.pending[:0] = entries
+            raise
+        finally:
+            self.flushing = []
+        # Indexed once they are on disk, so the index never points past the end of a segment
+        for entry, (segment, offset, length) in zip(entries, positions):
+            self.add_to_index(entry, segment, offset, length)
+        self.prune()
+
+    def _write(self, lines: list[bytes]) -> list[tuple[int, int, int]]:
+        positions = []
+        for line in lines:
+            if self.file.tell() and self.file.tell() + len(line) > self.MAX_BYTES:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.open_segment(self.segment + 1)
+                self.delete_old_segments()
+            positions.append((self.segment, self.file.tell(), len(line)))
+            self.file.write(line)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return positions
+
+    def delete_old_segments(self) -> None:
+        for path in self.DIRECTORY.glob(SEGMENT_GLOB):
+            if segment_number(path) <= self.segment - self.MAX_SEGMENTS:
+                path.unlink(missing_ok=True)
+
+    def open_segment(self, number: int) -> None:
+        self.segment = number
+        self.file = (self.DIRECTORY / SEGMENT_NAME.format(number=number)).open("ab")
+
+    # Index ------------------------------------------------------------------------
+    def add_to_index(self, entry: dict, segment: int, offset: int, length: int) -> None:
+        sequence = self.first + len(self.index)
+        self.index.append((entry["timestamp"], segment, offset, length))
+        for steam_id in entry.get("steam_ids", []):
+            self.by_steam_id.setdefault(steam_id, []).append(sequence)
+
+    def prune(self) -> None:
+        """Drops index entries of deleted segments"""
+        oldest = self.segment - self.MAX_SEGMENTS + 1
+        dropped = bisect.bisect_left(self.index, oldest, key=lambda position: position[1])
+        if not dropped:
+            return
+        del self.index[:dropped]
+        self.first += dropped
+        for steam_id, sequences in list(self.by_steam_id.items()):
+            kept = sequences[bisect.bisect_left(sequences, self.first):]
+            if kept:
+                self.by_steam_id[steam_id] = kept
+            else:
+                del self.by_steam_id[steam_id]
+
+    def lookup(self, steam_id: str | None, since: float, until: float, limit: int) -> list[tuple[int, int, int]]:
+        """Disk positions of the newest `limit` matching entries, newest first"""
+        if steam_id is None:
+            start = bisect.bisect_left(self.index, since, key=lambda position: position[0])
+            end = bisect.bisect_right(self.index, until, key=lambda position: position[0])
+            return [position[1:] for position in reversed(self.index[max(start, end - limit):end])]
+        sequences = self.by_steam_id.get(steam_id, [])
+        timestamp = lambda sequence: self.index[sequence - self.first][0]
+        start = bisect.bisect_left(sequences, since, key=timestamp)
+        end = bisect.bisect_right(sequences, until, key=timestamp)
+        return [self.index[sequence - self.first][1:] for sequence in reversed(sequences[max(start, end - limit):end])]
+
+    # Reads ------------------------------------------------------------------------
+    async def search(self, steam_id: str = None, since: float = 0, until: float = None, limit: int = 20) -> list[dict]:
+        """The newest `limit` entries in the time range, optionally only those about one player; newest first"""
+        until = time.time() if until is None else until
+        # Entries still waiting for a flush are newer than anything on disk
+        pending = [
+            entry for entry in reversed(self.flushing + self.pending)
+            if since <= entry["timestamp"] <= until and (steam_id is None or steam_id in entry["steam_ids"])
+        ][:limit]
+        positions = self.lookup(steam_id, since, until, limit - len(pending))
+        if not positions:
+            return pending
+        return pending + await asyncio.get_running_loop().run_in_executor(self.reader, self._read, positions)
+
+    def _read(self, positions: list[tuple[int, int, int]]) -> list[dict]:
+        entries = []
+        files = {}
+        try:
+            for segment, offset, length in positions:
+                if segment not in files:
+                    path = self.DIRECTORY / SEGMENT_NAME.format(number=segment)
+                    try:
+                        files[segment] = path.open("rb")
+                    except FileNotFoundError:
+                        # Deleted by rotation after the lookup
+                        files[segment] = None
+                if files[segment]:
+                    files[segment].seek(offset)
+                    entries.append(json.loads(files[segment].read(length)))
+        finally:
+            for file in files.values():
+                if file:
+                    file.close()
+        return entries
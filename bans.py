@@ -0,0 +1,200 @@
+"""Ban registry shared by every server, enforced on each roster poll.
+
+Bans are kept in a dict keyed by Steam ID, so checking a player is a single
+hash lookup; every `ShowPlayers` snapshot is checked player by player, and
+banned players found online are kicked straight away, so a ban takes effect
+within one poll interval on every server. The registry can be imported from
+and exported to Palworld's `banlist.txt` format or CSV, and re-applied to a
+server (e.g. after a wipe) with every `BanPlayer` pipelined over one pooled
+connection.
+"""
+import asyncio
+import csv
+import functools
+import io
+import json
+import os
+from dataclasses import asdict, fields
+from pathlib import Path
+
+from data import Ban, CommandResult, Player, RosterEvent
+from fleet import Fleet
+import logger
+
+log = logger.get_logger(__name__)
+
+DEFAULT_PATH = "bans.json"
+# Palworld's banlist.txt has one `steam_<Steam ID>` per line
+PALWORLD_PREFIX = "steam_"
+CSV_FIELDS = ("steam_id", "name", "reason", "banned_by", "banned_at")
+BAN_FIELDS = {field.name for field in fields(Ban)}
+
+
+def parse_palworld(text: str) -> list[Ban]:
+    bans = []
+    for line in text.splitlines():
+        steam_id = line.strip().removeprefix(PALWORLD_PREFIX)
+        if steam_id and not steam_id.startswith("#"):
+            bans.append(Ban(steam_id))
+    return bans
+
+
+def parse_csv(text: str) -> list[Ban]:
+    """Reads CSV with a header naming at least `steam_id`; without a header, the first column is the Steam ID"""
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+    header = [column.strip().lower() for column in rows[0]]
+    if "steam_id" not in header:
+        return [Ban(row[0].strip().removeprefix(PALWORLD_PREFIX)) for row in rows if row and row[0].strip()]
+    bans = []
+    for row in rows[1:]:
+        values = dict(zip(header, (value.strip() for value in row)))
+        if not values.get("steam_id"):
+            continue
+        try:
+            banned_at = float(values.get("banned_at") or 0)
+        except ValueError:
+            banned_at = 0.0
+        bans.append(Ban(
+            values["steam_id"].removeprefix(PALWORLD_PREFIX),
+            name=values.get("name", ""),
+            reason=values.get("reason", ""),
+            banned_by=values.get("banned_by", ""),
+            banned_at=banned_at,
+        ))
+    return bans
+
+
+class BanList:
+    def __init__(self, fleet: Fleet, path: str = DEFAULT_PATH, enforce: bool = True):
+        self.FLEET = fleet
+        self.PATH = Path(path)
+        self.ENFORCE = enforce
+        self.bans: dict[str, Ban] = {}  # { Key (Steam ID): Value (Ban) }
+        # (server, Steam ID) pairs with a kick in flight, so a slow kick isn't repeated by the next poll
+        self.kicking: set[tuple[str, str]] = set()
+        self.running: set[asyncio.Task] = set()
+
+    @classmethod
+    def from_config(cls, fleet: Fleet, config: dict) -> "BanList":
+        return cls(
+            fleet,
+            path=config.get("banlist_path", DEFAULT_PATH),
+            enforce=config.get("banlist_enforce", True),
+        )
+
+    def __contains__(self, steam_id: str) -> bool:
+        return steam_id in self.bans
+
+    def __len__(self) -> int:
+        return len(self.bans)
+
+    # Registry ---------------------------------------------------------------------
+    async def add(self, bans: list[Ban]) -> int:
+        """Adds (or updates) bans; returns how many players weren't banned before"""
+        added = sum(1 for ban in bans if ban.steam_id not in self.bans)
+        for ban in bans:
+            previous = self.bans.get(ban.steam_id)
+            # Imports often carry less detail than what is already known
+            if previous and not ban.name:
+                ban.name = previous.name
+            if previous and not ban.banned_at:
+                ban.banned_at = previous.banned_at
+            self.bans[ban.steam_id] = ban
+        await self.save()
+        return added
+
+    async def remove(self, steam_id: str) -> bool:
+        if not self.bans.pop(steam_id, None):
+            return False
+        await self.save()
+        return True
+
+    def export_palworld(self) -> str:
+        return "".join(f"{PALWORLD_PREFIX}{steam_id}\n" for steam_id in self.bans)
+
+    def export_csv(self) -> str:
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(asdict(ban) for ban in self.bans.values())
+        return output.getvalue()
+
+    # Enforcement ------------------------------------------------------------------
+    def observe(self, server_name: str, players: dict[str, Player], events: list[RosterEvent]) -> None:
+        """Roster observer; one dict lookup per player online"""
+        if not self.ENFORCE or not self.bans:
+            return
+        banned = [
+            steam_id for steam_id in players
+            if steam_id in self.bans and (server_name, steam_id) not in self.kicking
+        ]
+        if banned:
+            self.kicking.update((server_name, steam_id) for steam_id in banned)
+            self.spawn(self.kick(server_name, banned))
+
+    def spawn(self, coroutine) -> None:
+        # Keeps a reference, so the task isn't garbage collected mid-run
+        task = asyncio.create_task(coroutine)
+        self.running.add(task)
+        task.add_done_callback(self.finished)
+
+    def finished(self, task: asyncio.Task) -> None:
+        self.running.discard(task)
+        if not task.cancelled() and (error := task.exception()):
+            log.error(f"Unable to kick banned players: {type(error).__name__}: {error}")
+
+    async def kick(self, server_name: str, steam_ids: list[str]) -> None:
+        try:
+            log.info(f"Kicking {len(steam_ids)} banned player(s) from {server_name}: {', '.join(steam_ids)}")
+            results = await self.FLEET.get(server_name).kick_many(steam_ids)
+            for result in results:
+                if result.error:
+                    log.error(f"Unable to kick banned player ({result.command}) from {server_name}: {result.error}")
+        finally:
+            self.kicking.difference_update((server_name, steam_id) for steam_id in steam_ids)
+
+    async def apply(self, server_name: str) -> list[CommandResult]:
+        """Bans every player in the registry on the server, pipelined over one connection"""
+        return await self.FLEET.get(server_name).ban_many(list(self.bans))
+
+    # Persistence ------------------------------------------------------------------
+    async def start(self) -> None:
+        await asyncio.to_thread(self.load)
+        for server_name, rcon_client in self.FLEET.clients.items():
+            rcon_client.ROSTER.add_observer(functools.partial(self.observe, server_name))
+
+    def load(self) -> None:
+        try:
+            state = json.loads(self.PATH.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.error(f"Unable to read the ban list from {self.PATH}: {e}")
+            return
+        entries = state.get("bans", []) if isinstance(state, dict) else None
+        if not isinstance(entries, list):
+            log.error(f"Unable to read the ban list from {self.PATH}: expected a list of bans under `bans`")
+            return
+        for number, entry in enumerate(entries, 1):
+            # A hand-edited file shouldn't cost every other ban
+            valid = isinstance(entry, dict) and isinstance(entry.get("steam_id"), str) and entry["steam_id"]
+            if not valid or entry.keys() - BAN_FIELDS:
+                log.warning(f"Skipping ban #{number} in {self.PATH}; it needs a `steam_id` and no keys but {', '.join(sorted(BAN_FIELDS))}")
+                continue
+            ban = Ban(**entry)
+            self.bans[ban.steam_id] = ban
+        log.info(f"Loaded {len(self.bans)} ban(s) from {self.PATH}")
+
+    def write(self, state: dict) -> None:
+        temporary = self.PATH.with_suffix(".tmp")
+        temporary.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        os.replace(temporary, self.PATH)
+
+    async def save(self) -> None:
+        state = {"bans": [asdict(ban) for ban in self.bans.values()]}
+        try:
+            await asyncio.to_thread(self.write, state)
+        except OSError as e:
+            log.error(f"Unable to write the ban list to {self.PATH}: {e}")
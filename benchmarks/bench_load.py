@@ -0,0 +1,246 @@
+"""End-to-end load test against the fake RCON server.
+
+Drives `AsyncClient`, the synchronous `Client` (on worker threads) and the
+slash command handler bodies at a given concurrency, and reports latency
+percentiles and throughput for each scenario.
+
+Run from the project root: `python -m benchmarks.bench_load --requests 500 --concurrency 20`
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Awaitable, Callable
+
+import discord
+from discord import app_commands
+
+from benchmarks.fake_server import FakeServer, add_server_arguments
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SCENARIOS = (
+    "AsyncClient.info",
+    "AsyncClient.online",
+    "AsyncClient.online (cache_ttl=1)",
+    "AsyncClient.save",
+    "Client.info (threads)",
+    "Client.online (threads)",
+    "/info handler",
+    "/online handler",
+)
+GENERIC_BOT_ERROR = "error"
+INTERACTION_LIFETIME = timedelta(minutes=15)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_load(operation: Callable[[int], Awaitable], requests: int, concurrency: int) -> tuple[list[float], int, float]:
+    """Runs `operation(i)` for i in range(requests), `concurrency` at a time
+
+    Returns (sorted latencies, error count, wall time).
+    """
+    latencies = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while (index := next(counter)) < requests:
+            start = time.perf_counter()
+            try:
+                await operation(index)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return sorted(latencies), errors, time.perf_counter() - start
+
+
+def report(label: str, latencies: list[float], errors: int, elapsed: float) -> bool:
+    """Prints a scenario's results; returns whether any of its requests succeeded"""
+    print(
+        f"{label:<34} p50 {percentile(latencies, 0.50) * 1000:8.2f} ms"
+        f"  p95 {percentile(latencies, 0.95) * 1000:8.2f} ms"
+        f"  p99 {percentile(latencies, 0.99) * 1000:8.2f} ms"
+        f"  {len(latencies) / elapsed:9.1f} req/s  errors {errors}"
+    )
+    return errors < len(latencies)
+
+
+def check_result(rcon_client, result):
+    """Raises if a client call reported a failure instead of raising one
+
+    Calls that return `(value, error message)` failed if the message is set;
+    calls that return a string failed if it is empty or one of the client's errors.
+    """
+    if isinstance(result, tuple):
+        failed = bool(result[1])
+    else:
+        failed = result in ("", rcon_client.GENERIC_ERROR, getattr(rcon_client, "OFFLINE_ERROR", None))
+    if failed:
+        raise RuntimeError(f"the call failed: {result!r}")
+    return result
+
+
+async def checked(rcon_client, call: Awaitable):
+    return check_result(rcon_client, await call)
+
+
+# Slash command handlers --------------------------------------------------------
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+        self.sent: list[dict] = []
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def defer(self, *args, **kwargs):
+        self.done = True
+
+    async def send_message(self, *args, **kwargs):
+        self.done = True
+        self.sent.append(kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, response: FakeResponse):
+        self.response = response
+
+    async def send(self, *args, **kwargs):
+        self.response.sent.append(kwargs)
+        return None
+
+
+def make_interaction(user_id: int, command_name: str) -> SimpleNamespace:
+    """Just enough of `discord.Interaction` for the dispatcher and the handler bodies"""
+    created_at = discord.utils.utcnow()
+    response = FakeResponse()
+    return SimpleNamespace(
+        user=SimpleNamespace(id=user_id),
+        guild_id=None,
+        command=SimpleNamespace(name=command_name),
+        permissions=discord.Permissions(administrator=True),
+        created_at=created_at,
+        expires_at=created_at + INTERACTION_LIFETIME,
+        response=response,
+        followup=FakeFollowup(response),
+    )
+
+
+async def call_handler(command: app_commands.Command, user_id: int) -> None:
+    """Runs a slash command through the dispatcher; raises if it answered with the generic error"""
+    interaction = make_interaction(user_id, command.name)
+    await command.callback(interaction)
+    # The dispatcher answers a failed handler instead of raising, so look at what it sent
+    if any(message.get("content") == GENERIC_BOT_ERROR for message in interaction.response.sent):
+        raise RuntimeError(f"/{command.name} answered with the generic error")
+
+
+def import_bot(port: int, password: str, timeout: float):
+    """Imports `main` against a throwaway config pointing at the fake server"""
+    work_dir = Path(tempfile.mkdtemp(prefix="palcon-bench-"))
+    (work_dir / "logs").mkdir()
+    (work_dir / "config.toml").write_text(
+        f'ip = "127.0.0.1"\nport = {port}\npassword = "{password}"\ntimeout_duration = {timeout}\n'
+        f'discord_bot_token = ""\nembed_footer = ""\nembed_thumbnail = ""\n'
+        f'generic_bot_error = "{GENERIC_BOT_ERROR}"\nroster_poll_interval = 0\ncache_ttl = 0\nlog_level = "ERROR"\n'
+    )
+    os.chdir(work_dir)
+    sys.path.insert(0, str(PROJECT_ROOT))
+    import main
+    return main
+
+
+# ------------------------------------------------------------------------------
+async def benchmark(args: argparse.Namespace) -> bool:
+    """Runs the selected scenarios; returns False if any of them failed every request"""
+    server = await FakeServer(
+        password=args.password,
+        players=args.players,
+        latency=args.latency,
+        jitter=args.jitter,
+        fragment=args.fragment,
+        drop_rate=args.drop_rate,
+        echo_sentinel=not args.no_echo,
+    ).start()
+    print(
+        f"Fake server on port {server.port}: {args.players} players, latency {args.latency}s (+{args.jitter}s jitter), "
+        f"fragment {args.fragment or 'off'}, drop rate {args.drop_rate}"
+    )
+    print(f"{args.requests} requests per scenario at concurrency {args.concurrency}\n")
+
+    labels = [label for label in SCENARIOS if args.only in label]
+    # Importing the bot moves into a scratch directory (for its config and logs), so only do it when needed
+    main = import_bot(server.port, args.password, args.timeout) if any("handler" in label for label in labels) else None
+    logging.disable(logging.CRITICAL)
+    from client import AsyncClient, Client
+
+    base_config = {
+        "ip": "127.0.0.1",
+        "port": server.port,
+        "password": args.password,
+        "timeout_duration": args.timeout,
+        "pool_size": args.pool_size,
+        "max_concurrent_commands": args.concurrency,
+        "roster_poll_interval": 0,
+    }
+    # cache_ttl = 0 still coalesces identical in-flight queries; `save` shows raw per-command cost
+    uncached = AsyncClient(config=base_config | {"cache_ttl": 0}, name="uncached")
+    cached = AsyncClient(config=base_config | {"cache_ttl": 1}, name="cached")
+    sync_client = Client(config=base_config)
+    sync_slots = asyncio.Semaphore(args.concurrency)
+
+    async def sync_call(method: Callable):
+        async with sync_slots:
+            return check_result(sync_client, await asyncio.to_thread(method))
+
+    scenarios = {
+        "AsyncClient.info": lambda i: checked(uncached, uncached.info()),
+        "AsyncClient.online": lambda i: checked(uncached, uncached.online()),
+        "AsyncClient.online (cache_ttl=1)": lambda i: checked(cached, cached.online()),
+        "AsyncClient.save": lambda i: checked(uncached, uncached.save()),
+        "Client.info (threads)": lambda i: sync_call(sync_client.info),
+        "Client.online (threads)": lambda i: sync_call(sync_client.online),
+        "/info handler": lambda i: call_handler(main.info, i),
+        "/online handler": lambda i: call_handler(main.online, i),
+    }
+    failed = [
+        label for label in labels
+        if not report(label, *await run_load(scenarios[label], args.requests, args.concurrency))
+    ]
+
+    print(f"\nServer saw {server.connections} connection(s) and {server.commands} command(s)")
+    await uncached.close()
+    await cached.close()
+    if main:
+        await main.fleet.close()
+    await server.close()
+    if failed:
+        print(f"\nEvery request failed in: {', '.join(failed)}", file=sys.stderr)
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="requests in flight at once")
+    parser.add_argument("--pool-size", type=int, default=4, help="AsyncClient connection pool size")
+    parser.add_argument("--timeout", type=float, default=3, help="RCON timeout, in seconds")
+    parser.add_argument("--only", default="", help="only run scenarios whose label contains this")
+    add_server_arguments(parser)
+    sys.exit(0 if asyncio.run(benchmark(parser.parse_args())) else 1)
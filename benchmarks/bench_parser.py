@@ -0,0 +1,85 @@
+"""Micro-benchmark for the RCON response parsers.
+
+Run from the project root: `python -m benchmarks.bench_parser [rows]`
+"""
+import logging
+import random
+import string
+import sys
+import timeit
+
+from parsing import PLAYERS_HEADER, get_indices_from_info, iter_players
+
+DEFAULT_ROWS = 10_000
+REPEAT = 5
+
+
+def make_show_players(rows: int, seed: int = 0) -> str:
+    """Synthetic `ShowPlayers` payload; ~5% of names contain commas, ~1% of rows are malformed"""
+    rng = random.Random(seed)
+    lines = [PLAYERS_HEADER]
+    for index in range(rows):
+        name = "".join(rng.choices(string.ascii_letters + "ぱるワールド", k=rng.randint(3, 16)))
+        if rng.random() < 0.05:
+            name = f"{name},{name[:3]}"
+        if rng.random() < 0.01:
+            lines.append(name)
+            continue
+        lines.append(f"{name},{rng.getrandbits(32):010d},7656119{index:010d}")
+    return "\n".join(lines) + "\n"
+
+
+def legacy_parse_players(res: str, stop_at_bad_row: bool = True) -> dict[str, str]:
+    """The original `Client.online()` parsing loop (minus logging), kept as a baseline"""
+    players = {}
+    for line in res.split("\n")[1:-1]:
+        words = line.split(",")
+        if len(words) < 3:
+            if stop_at_bad_row:
+                break
+            continue
+        ign = words[0]
+        steam_id = words[2]
+        if len(words) > 3:
+            ign = ",".join(words[0:-2])
+            steam_id = words[-1]
+        players[steam_id] = ign
+    return players
+
+
+def legacy_get_indices_from_info(res: str) -> tuple[int, int, int]:
+    version_number_start_index = -1
+    version_number_end_index = -1
+    name_index = -1
+    for index, char in enumerate(res):
+        if char == "[":
+            version_number_start_index = index + 1
+        if char == "]":
+            version_number_end_index = index
+            name_index = version_number_end_index + 2
+            break
+    return version_number_start_index, version_number_end_index, name_index
+
+
+def report(label: str, function, number: int) -> None:
+    best = min(timeit.repeat(function, number=number, repeat=REPEAT)) / number
+    print(f"{label:<36} {best * 1_000_000:12.1f} µs")
+
+
+def main(rows: int) -> None:
+    # Keep log I/O out of the measurements
+    logging.disable(logging.CRITICAL)
+    payload = make_show_players(rows)
+    info = "Welcome to Pal Server[v0.1.4.1] " + "Relaxasarus Sanctuary " * 4
+    parsed = sum(1 for _ in iter_players(payload))
+    legacy = len(legacy_parse_players(payload))
+    print(f"ShowPlayers: {rows} rows, {len(payload)} chars; parsed {parsed} players (legacy: {legacy})")
+
+    report("iter_players", lambda: {p.steam_id: p for p in iter_players(payload)}, 10)
+    report("legacy parse (skipping bad rows)", lambda: legacy_parse_players(payload, stop_at_bad_row=False), 10)
+    report("get_indices_from_info", lambda: get_indices_from_info(info), 100_000)
+    report("legacy get_indices_from_info", lambda: legacy_get_indices_from_info(info), 100_000)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS)
@@ -0,0 +1,171 @@
+"""Stand-in Palworld RCON server, for benchmarks and manual testing.
+
+Speaks the Source RCON protocol with canned responses, and can simulate
+latency, jitter, TCP fragmentation, dropped connections and large rosters.
+
+Run from the project root: `python -m benchmarks.fake_server --port 25575 --players 32`
+"""
+import argparse
+import asyncio
+import random
+
+from transport import (
+    SERVERDATA_AUTH, SERVERDATA_AUTH_RESPONSE, SERVERDATA_EXECCOMMAND, SERVERDATA_RESPONSE_VALUE,
+    HEADER, MULTI_PACKET_THRESHOLD, read_packet,
+)
+from parsing import PLAYERS_HEADER
+
+SERVER_VERSION = "v0.1.5.0"
+SERVER_NAME = "Fake Palworld Server"
+
+
+def make_roster(players: int, seed: int = 0) -> list[tuple[str, str, str]]:
+    rng = random.Random(seed)
+    return [
+        (f"Player{index}{rng.choice(['', ',Jr', 'ぱる'])}", f"{rng.getrandbits(32):010d}", f"7656119{index:010d}")
+        for index in range(players)
+    ]
+
+
+def encode_response(request_id: int, body: bytes) -> bytes:
+    return HEADER.pack(len(body) + 10, request_id, SERVERDATA_RESPONSE_VALUE) + body + b"\x00\x00"
+
+
+class FakeServer:
+    def __init__(
+        self,
+        password: str = "",
+        players: int = 32,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        fragment: int = 0,
+        drop_rate: float = 0.0,
+        echo_sentinel: bool = True,
+        seed: int = 0,
+    ):
+        self.PASSWORD = password
+        self.LATENCY = latency
+        self.JITTER = jitter
+        self.FRAGMENT = fragment  # Max bytes per write; 0 writes whole packets
+        self.DROP_RATE = drop_rate
+        self.ECHO_SENTINEL = echo_sentinel
+        self.rng = random.Random(seed)
+        self.roster = make_roster(players, seed)
+        self.server: asyncio.Server | None = None
+        self.connections = 0
+        self.commands = 0
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "FakeServer":
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self
+
+    async def close(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    def respond(self, command: str) -> str:
+        name, _, argument = command.partition(" ")
+        match name:
+            case "Info":
+                return f"Welcome to Pal Server[{SERVER_VERSION}] {SERVER_NAME}"
+            case "ShowPlayers":
+                rows = "".join(f"{ign},{uid},{steam_id}\n" for ign, uid, steam_id in self.roster)
+                return f"{PLAYERS_HEADER}\n{rows}"
+            case "Save":
+                return "Complete Save"
+            case "Broadcast":
+                return f"Broadcasted: {argument}"
+            case "KickPlayer":
+                return f"Kicked: {argument}"
+            case "BanPlayer":
+                return f"Baned: {argument}"
+            case "Shutdown":
+                return f"The server will shut down in {argument.split(' ', 1)[0]} seconds."
+            case "DoExit":
+                return "Shutdown server..."
+        return f"Unknown command: {name}"
+
+    async def write(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        if not self.FRAGMENT:
+            writer.write(data)
+        else:
+            for start in range(0, len(data), self.FRAGMENT):
+                writer.write(data[start:start + self.FRAGMENT])
+                await writer.drain()
+                await asyncio.sleep(0)
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_id, packet_type, body = await read_packet(reader)
+                if packet_type == SERVERDATA_AUTH:
+                    accepted = body.decode("utf-8", errors="replace") == self.PASSWORD
+                    await self.write(
+                        writer,
+                        encode_response(request_id, b"")
+                        + HEADER.pack(10, request_id if accepted else -1, SERVERDATA_AUTH_RESPONSE) + b"\x00\x00",
+                    )
+                elif packet_type == SERVERDATA_EXECCOMMAND:
+                    self.commands += 1
+                    if self.rng.random() < self.DROP_RATE:
+                        return
+                    delay = self.LATENCY + self.rng.uniform(0, self.JITTER)
+                    if delay:
+                        await asyncio.sleep(delay)
+                    payload = self.respond(body.decode("utf-8", errors="replace")).encode("utf-8")
+                    packets = [
+                        encode_response(request_id, payload[start:start + MULTI_PACKET_THRESHOLD])
+                        for start in range(0, max(len(payload), 1), MULTI_PACKET_THRESHOLD)
+                    ]
+                    await self.write(writer, b"".join(packets))
+                elif packet_type == SERVERDATA_RESPONSE_VALUE and self.ECHO_SENTINEL:
+                    # Mirrors the empty packet, followed by the extra packet real Source servers send
+                    await self.write(
+                        writer,
+                        encode_response(request_id, b"") + encode_response(request_id, b"\x00\x00\x00\x01\x00\x00\x00\x00"),
+                    )
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = await FakeServer(
+        password=args.password,
+        players=args.players,
+        latency=args.latency,
+        jitter=args.jitter,
+        fragment=args.fragment,
+        drop_rate=args.drop_rate,
+        echo_sentinel=not args.no_echo,
+    ).start(args.host, args.port)
+    print(f"Fake RCON server listening on {args.host}:{server.port} ({args.players} players)")
+    await server.server.serve_forever()
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--password", default="", help="RCON password")
+    parser.add_argument("--players", type=int, default=32, help="number of players in the roster")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds per response")
+    parser.add_argument("--fragment", type=int, default=0, help="write responses in chunks of this many bytes")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="chance of dropping the connection per command")
+    parser.add_argument("--no-echo", action="store_true", help="don't mirror the empty end-of-response packet")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=25575)
+    add_server_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,101 @@
+"""Per-server circuit breaker, so an unreachable server fails commands fast.
+
+After `threshold` consecutive failed commands the breaker opens, and every
+command fails immediately instead of waiting out `timeout_duration`. Once
+`reset_timeout` seconds have passed, the next command is let through as a
+probe: if it succeeds the breaker closes, otherwise it opens again.
+"""
+import time
+from typing import Callable
+
+import logger
+
+log = logger.get_logger(__name__)
+
+DEFAULT_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 30
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, threshold: int = DEFAULT_THRESHOLD, reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self.NAME = name
+        self.THRESHOLD = max(1, threshold)
+        self.RESET_TIMEOUT = reset_timeout
+        self.state = CLOSED
+        self.failures = 0  # Consecutive failed commands
+        self.opened_at = 0.0  # time.monotonic() when the breaker last opened
+        self.last_success = 0.0  # time.time() of the last successful command; 0 if never
+        self.last_failure = 0.0
+        self.listeners: list[Callable[[str, str], None]] = []
+
+    @classmethod
+    def from_config(cls, name: str, config: dict) -> "CircuitBreaker":
+        return cls(
+            name,
+            threshold=config.get("breaker_threshold", DEFAULT_THRESHOLD),
+            reset_timeout=config.get("breaker_reset_timeout", DEFAULT_RESET_TIMEOUT),
+        )
+
+    def add_listener(self, listener: Callable[[str, str], None]) -> None:
+        """Calls `listener(server name, new state)` on every state change; it must not block"""
+        self.listeners.append(listener)
+
+    def transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        log.info(f"Circuit breaker for {self.NAME}: {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        for listener in self.listeners:
+            listener(self.NAME, state)
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is allowed through; 0 if it is now"""
+        return max(0.0, self.opened_at + self.RESET_TIMEOUT - time.monotonic())
+
+    def is_open(self) -> bool:
+        """Whether a command sent now would be failed fast"""
+        if self.state == OPEN:
+            return self.retry_in() > 0
+        # Only one probe at a time
+        return self.state == HALF_OPEN
+
+    def allow(self) -> bool:
+        """Whether a command may go to the server; the first one after the reset timeout is the probe"""
+        if self.is_open():
+            return False
+        if self.state == OPEN:
+            self.transition(HALF_OPEN)
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.last_success = time.time()
+        self.transition(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.last_failure = time.time()
+        if self.state == HALF_OPEN or self.failures >= self.THRESHOLD:
+            if self.state == HALF_OPEN:
+                # A failed probe restarts the reset timeout
+                self.opened_at = time.monotonic()
+            self.transition(OPEN)
+
+    def abandon(self) -> None:
+        """A command finished without an outcome (e.g. it was cancelled); the next one may probe instead"""
+        if self.state == HALF_OPEN:
+            self.state = OPEN
+            self.opened_at = time.monotonic() - self.RESET_TIMEOUT
+
+    def reset(self) -> None:
+        self.failures = 0
+        self.transition(CLOSED)
+
+    def stats(self) -> dict[str, int]:
+        return {"open": int(self.state != CLOSED), "failures": self.failures}
@@ -0,0 +1,94 @@
+"""Short-lived response cache for read-only RCON queries.
+
+Concurrent callers asking for the same key while a request is already in
+flight wait on that request instead of sending their own (single-flight).
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+import logger
+
+log = logger.get_logger(__name__)
+
+DEFAULT_TTL = 5
+
+
+class TTLCache:
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        self.TTL = ttl
+        self.entries: dict[str, tuple[float, Any]] = {}  # key: (expiry, value)
+        self.in_flight: dict[str, asyncio.Task] = {}
+        self.waiters: dict[asyncio.Task, int] = {}  # Callers awaiting each in-flight load
+        # Bumped on invalidation, so results fetched before a mutation are never stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        task = self.in_flight.get(key)
+        if task:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self.load(key, loader, cacheable))
+            self.in_flight[key] = task
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        try:
+            # Shielded, so one caller giving up doesn't cancel the request for everyone else
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.waiters[task] == 1 and not task.done():
+                # Nobody else wants the result
+                if self.in_flight.get(key) is task:
+                    del self.in_flight[key]
+                task.cancel()
+            raise
+        finally:
+            self.waiters[task] -= 1
+            if not self.waiters[task]:
+                del self.waiters[task]
+
+    async def load(self, key: str, loader: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool]) -> Any:
+        """Runs in a task of its own, shared by every caller waiting on `key`"""
+        generation = self.generation
+        try:
+            value = await loader()
+        finally:
+            if self.in_flight.get(key) is asyncio.current_task():
+                del self.in_flight[key]
+        if self.TTL > 0 and generation == self.generation and cacheable(value):
+            self.entries[key] = (time.monotonic() + self.TTL, value)
+        return value
+
+    def peek(self, key: str) -> Any | None:
+        """Returns the last cached value, even if it has expired (None if never cached)"""
+        entry = self.entries.get(key)
+        return entry[1] if entry else None
+
+    def invalidate(self, key: str = None) -> None:
+        log.debug(f"Invalidating cached responses: {key or 'all'}")
+        self.generation += 1
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self.entries),
+        }
@@ -0,0 +1,125 @@
+"""Minimal line chart renderer, writing PNGs with nothing but zlib.
+
+Charts are small (a few hundred pixels across) and drawn into a flat RGB
+bytearray, so rendering takes a few milliseconds; callers still run it in a
+worker thread to keep it off the event loop.
+"""
+import math
+import struct
+import zlib
+
+WIDTH = 600
+HEIGHT = 200
+PADDING = 8
+BACKGROUND = (43, 45, 49)  # Discord's dark theme embed background
+GRID = (64, 66, 73)
+LINE = (88, 101, 242)  # Discord blurple
+FILL = (56, 63, 120)
+GRID_LINES = 4
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+# PNG encoding -----------------------------------------------------------------
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def encode_png(width: int, height: int, pixels: bytes | bytearray) -> bytes:
+    """Encodes 8-bit RGB pixels (row-major, no padding) as a PNG"""
+    stride = width * 3
+    # Every scanline is prefixed with its filter type; 0 (none) compresses well enough for flat charts
+    raw = b"".join(b"\x00" + pixels[row * stride:(row + 1) * stride] for row in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8-bit RGB, no interlacing
+    return PNG_SIGNATURE + png_chunk(b"IHDR", header) + png_chunk(b"IDAT", zlib.compress(raw, 6)) + png_chunk(b"IEND", b"")
+
+
+# Drawing ----------------------------------------------------------------------
+class Canvas:
+    def __init__(self, width: int, height: int, background: tuple[int, int, int]):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(background) * (width * height))
+
+    def set_pixel(self, x: int, y: int, colour: tuple[int, int, int]) -> None:
+        if 0 <= x < self.width and 0 <= y < self.height:
+            offset = (y * self.width + x) * 3
+            self.pixels[offset:offset + 3] = bytes(colour)
+
+    def hline(self, x0: int, x1: int, y: int, colour: tuple[int, int, int]) -> None:
+        if not 0 <= y < self.height:
+            return
+        x0, x1 = max(0, min(x0, x1)), min(self.width - 1, max(x0, x1))
+        start = (y * self.width + x0) * 3
+        self.pixels[start:start + (x1 - x0 + 1) * 3] = bytes(colour) * (x1 - x0 + 1)
+
+    def vline(self, x: int, y0: int, y1: int, colour: tuple[int, int, int]) -> None:
+        top, bottom = max(0, min(y0, y1)), min(self.height - 1, max(y0, y1))
+        if not 0 <= x < self.width or top > bottom:
+            return
+        stride = self.width * 3
+        start = top * stride + x * 3
+        end = bottom * stride + x * 3 + 1
+        # One strided slice per channel, rather than a Python loop per pixel
+        for channel, value in enumerate(colour):
+            self.pixels[start + channel:end + channel:stride] = bytes((value,)) * (bottom - top + 1)
+
+    def line(self, x0: int, y0: int, x1: int, y1: int, colour: tuple[int, int, int]) -> None:
+        """Bresenham's line, two pixels thick so it stays visible once Discord scales the image"""
+        dx, dy = abs(x1 - x0), -abs(y1 - y0)
+        sx, sy = (1 if x0 < x1 else -1), (1 if y0 < y1 else -1)
+        error = dx + dy
+        while True:
+            self.set_pixel(x0, y0, colour)
+            self.set_pixel(x0, y0 + 1, colour)
+            if x0 == x1 and y0 == y1:
+                return
+            doubled = 2 * error
+            if doubled >= dy:
+                error += dy
+                x0 += sx
+            if doubled <= dx:
+                error += dx
+                y0 += sy
+
+    def to_png(self) -> bytes:
+        return encode_png(self.width, self.height, self.pixels)
+
+
+def render_line_chart(values: list[float], low: float = None, high: float = None,
+                      width: int = WIDTH, height: int = HEIGHT) -> bytes:
+    """Renders `values` (oldest first) left to right; NaN values leave gaps in the line"""
+    canvas = Canvas(width, height, BACKGROUND)
+    plot_height = height - 2 * PADDING
+    for index in range(GRID_LINES + 1):
+        canvas.hline(0, width - 1, PADDING + round(index * plot_height / GRID_LINES), GRID)
+
+    known = [value for value in values if not math.isnan(value)]
+    if not known or len(values) < 2:
+        return canvas.to_png()
+    low = min(known) if low is None else low
+    high = max(known) if high is None else high
+    span = (high - low) or 1
+
+    def point(index: int, value: float) -> tuple[int, int]:
+        x = round(index * (width - 1) / (len(values) - 1))
+        y = PADDING + round((1 - (value - low) / span) * plot_height)
+        return x, y
+
+    baseline = PADDING + plot_height
+    previous = None
+    for index, value in enumerate(values):
+        if math.isnan(value):
+            previous = None
+            continue
+        x, y = point(index, value)
+        if previous:
+            # Shade under the segment first, so the line is drawn on top
+            for column in range(previous[0], x + 1):
+                fraction = (column - previous[0]) / ((x - previous[0]) or 1)
+                canvas.vline(column, round(previous[1] + fraction * (y - previous[1])) + 2, baseline, FILL)
+            canvas.line(previous[0], previous[1], x, y, LINE)
+        else:
+            canvas.set_pixel(x, y, LINE)
+        previous = (x, y)
+    return canvas.to_png()
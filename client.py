@@ -1,18 +1,26 @@
-import tomllib
-
-from rcon import Console
-from rcon.async_support import Console as AsyncConsole
-
-from data import ServerInfo
+import asyncio
+
+from breaker import CircuitBreaker
+from cache import TTLCache, DEFAULT_TTL
+from data import CommandResult, Player, ServerInfo
+from parsing import iter_players, parse_server_info
+from poller import RosterPoller
+from pool import CONNECTION_SETTINGS, ConnectionPool
+from priority import DEFAULT_MAX_DEPTH, CommandDropped, CommandQueue, command_priority
+from transport import AuthenticationError, RCONError
+import metrics
 import logger
+import settings
 
 log = logger.get_logger(__name__)
 
+DEFAULT_MAX_CONCURRENT_COMMANDS = 4
+
 
 def fetch_config():
-    log.info("Fetching configuration file")
-    with open("config.toml", "rb") as file:
-        data = tomllib.load(file)
+    """Returns the parsed `config.toml`; only re-read from disk when it has changed"""
+    log.debug("Fetching configuration file")
+    data = settings.MANAGER.get()
     if data:
         return data
     log.error("Unable to read configuration file!")
@@ -25,9 +33,10 @@ def send_command_fallback(command: str):
     This is only to manually check if the RCON side works, independently
     of the Discord bot. It is not and should not be called by the bot.
     """
+    from rcon import Console
     log.info("Testing RCON connection")
     config = fetch_config()
-    log.debug(f'IP: {config["ip"]}, Port: {config["port"]}')
+    log.debug(f"IP: {config['ip']}, Port: {config['port']}")
     con = Console(
         host=config["ip"],
         password=config["password"],
@@ -42,19 +51,30 @@ def send_command_fallback(command: str):
 
 
 # Helper functions; RCON client output parsing --------------------------------
-def get_indices_from_info(res: str) -> tuple[int, int, int]:
-    version_number_start_index = -1
-    version_number_end_index = -1
-    name_index = -1
-    for index, char in enumerate(res):
-        if char == "[":
-            version_number_start_index = index + 1
-        if char == "]":
-            version_number_end_index = index
-            name_index = version_number_end_index + 2
-            break
+def parse_info(res: str, generic_error: str) -> tuple[ServerInfo | None, str]:
+    if not res:
+        return None, generic_error
+    server_info = parse_server_info(res)
+    if not server_info:
+        log.error("Unable to parse server info!")
+        return None, "Unable to process your request (server response in unexpected format)"
+    return server_info, ""
+
 
-    return version_number_start_index, version_number_end_index, name_index
+def parse_players(res: str, generic_error: str) -> tuple[dict[str, Player], str]:
+    if not res:
+        return {}, generic_error
+    return {player.steam_id: player for player in iter_players(res)}, ""
+
+
+def classify_error(error: Exception) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, AuthenticationError):
+        return "auth"
+    if isinstance(error, RCONError):
+        return "protocol"
+    return "connection"
 
 
 # ------------------------------------------------------------------------------
@@ -68,7 +88,9 @@ class Client:
         else:
             self.CONFIG = fetch_config()
 
-    def open(self) -> Console:
+    def open(self):
+        # Imported on first use; the bot itself only uses `AsyncClient`
+        from rcon import Console
         return Console(
             host=self.CONFIG["ip"],
             password=self.CONFIG["password"],
@@ -83,23 +105,7 @@ class Client:
         console = self.open()
         res = console.command("Info")
         console.close()
-
-        server_info = None
-        error_message = ""
-        if res:
-            version_start_index, version_end_index, name_index = get_indices_from_info(res)
-            if version_start_index < 0 or version_end_index < 0 or name_index < 0:
-                log.error("Unable to parse server info!")
-                error_message = "Unable to process your request (server response in unexpected format)"
-            else:
-                server_info = ServerInfo(
-                    version=res[version_start_index:version_end_index],
-                    name=res[name_index:],
-                )
-        else:
-            error_message = self.GENERIC_ERROR
-
-        return server_info, error_message
+        return parse_info(res, self.GENERIC_ERROR)
 
     def save(self) -> str:
         log.debug("Saving world")
@@ -108,48 +114,21 @@ class Client:
         console.close()
         return res if res else self.GENERIC_ERROR
     
-    def online(self) -> tuple[dict[str, str], str]:
+    def online(self) -> tuple[dict[str, Player], str]:
         """Returns dict of online players, and error message (if any)
-        { Key (Steam ID): Value (IGN) }
+        { Key (Steam ID): Value (Player) }
         """
-        # Response is of format `name,playerid,steamid\n`
         log.debug("Fetching online players")
         console = self.open()
         res = console.command("ShowPlayers")
         console.close()
-
-        players = {}
-        error_message = ""
-        # format output
-        if res: # "name,playeruid,steamid\n" this is the header
-            lines = res.split('\n')[1:-1] # remove the header and last elemement which is always an empty string
-            log.debug(f'Lines: {lines}')
-            for line in lines:
-                log.debug(f'Line: {line}')
-                words = line.split(",")
-                if len(words) < 3:
-                    log.error(f'Unable to parse player info for player, player is missing some information: {words}')
-                    break
-
-                ign = words[0]
-                steam_id = words[2]
-
-                if len(words) > 3:
-                    log.debug(f'Ran into a player with more than 3 points of data during parsing: {words}')
-                    # If the player name has a comma, the split will produce more than 3 words
-                    ign = ",".join(words[0:-2])
-                    steam_id = words[-1]
-
-                players[steam_id] = ign
-        else:
-            error_message = self.GENERIC_ERROR
-
-        return players, error_message
+        return parse_players(res, self.GENERIC_ERROR)
 
     def get_ign_from_steam_id(self, steam_id: str) -> str:
         """Fetches player name from Steam ID, if player is online"""
         players, _ = self.online()
-        return players.get(steam_id, "")
+        player = players.get(steam_id)
+        return player.name if player else ""
 
     def announce(self, message: str):
         log.debug("Broadcasting message to world")
@@ -173,6 +152,24 @@ class Client:
         console.close()
         return res if res else self.GENERIC_ERROR
 
+    def batch(self, commands: list[str]) -> list[CommandResult]:
+        """Runs several commands over a single connection, in order"""
+        log.debug(f"Running a batch of {len(commands)} commands")
+        results = []
+        console = self.open()
+        try:
+            for command in commands:
+                try:
+                    res = console.command(command)
+                except Exception as e:
+                    log.error(f"RCON command failed: {type(e).__name__}: {e}")
+                    results.append(CommandResult(command, "", self.GENERIC_ERROR))
+                    continue
+                results.append(CommandResult(command, res, "" if res else self.GENERIC_ERROR))
+        finally:
+            console.close()
+        return results
+
     def shutdown(self, seconds: str, message: str):
         log.debug(f"Schedule server shutdown in {seconds} seconds")
         console = self.open()
@@ -190,73 +187,242 @@ class Client:
 
 
 # ------------------------------------------------------------------------------
-# Async implementation; connection remains open throughout lifetime
-# This is listed as experimental on the library's docs, for use with Discord bots
-# In my testing, it doesn't receive the correct number of bytes as of 28th Jan 2024
+# Async implementation; connections are pooled and remain open between commands
+# Uses our own Source RCON framing (see `transport.py`), so nothing blocks the event loop
 class AsyncClient:
-    def __init__(self):
+    def __init__(self, config: dict = None, name: str = "default"):
         self.GENERIC_ERROR = "Unable to process your request (server did not respond)"
-        log.info("Setting up RCON connection")
-        config = fetch_config()
-        self.CONSOLE = AsyncConsole(
-            host=config["ip"],
-            password=config["password"],
-            port=config["port"],
-            timeout=config["timeout_duration"]
-        )
-
-    async def check_console_ready(self):
-        if not self.CONSOLE.is_open():
-            await self.CONSOLE.open()
+        self.OFFLINE_ERROR = "Server is offline (not responding to RCON)"
+        self.NAME = name
+        log.info(f"Setting up RCON connection ({name})")
+        if config:
+            self.CONFIG = config
+        else:
+            self.CONFIG = fetch_config()
+        self.POOL = ConnectionPool.from_config(self.CONFIG)
+        self.CACHE = TTLCache(self.CONFIG.get("cache_ttl", DEFAULT_TTL))
+        self.ROSTER = RosterPoller.from_config(self.fetch_online, self.CONFIG)
+        self.BREAKER = CircuitBreaker.from_config(name, self.CONFIG)
+        # Caps in-flight commands, so a burst of users can't pile work onto the game server;
+        # when they are all busy, urgent commands go first
+        self.QUEUE = CommandQueue(name, self.command_slots(), self.CONFIG.get("queue_max_depth", DEFAULT_MAX_DEPTH))
+        # Replaced pools still finishing their commands; referenced so they aren't garbage collected mid-drain
+        self.draining: set[asyncio.Task] = set()
+
+    def command_slots(self) -> int:
+        """Never more than the pool has connections, so commands only ever wait (in priority order) in the queue"""
+        return min(self.CONFIG.get("max_concurrent_commands", DEFAULT_MAX_CONCURRENT_COMMANDS), self.POOL.SIZE)
+
+    def reconfigure(self, config: dict) -> None:
+        """Swaps in a new config; the connection pool is only rebuilt if its settings changed"""
+        changed = [key for key in CONNECTION_SETTINGS if config.get(key) != self.CONFIG.get(key)]
+        self.CONFIG = config
+        if not changed:
+            self.QUEUE.resize(self.command_slots())
+            return
+        log.info(f"Connection settings of {self.NAME} changed ({', '.join(changed)}); reconnecting")
+        old_pool, self.POOL = self.POOL, ConnectionPool.from_config(config)
+        self.QUEUE.resize(self.command_slots())
+        self.CACHE.invalidate()
+        # The old settings' failures say nothing about the new ones
+        self.BREAKER.reset()
+        task = asyncio.create_task(old_pool.drain())
+        self.draining.add(task)
+        task.add_done_callback(self.draining.discard)
 
     async def close(self):
-        log.info("Closing RCON connection")
-        await self.CONSOLE.close()
+        log.info("Closing RCON connections")
+        await self.ROSTER.stop()
+        await asyncio.gather(*self.draining, return_exceptions=True)
+        await self.POOL.close()
+
+    def is_offline(self) -> bool:
+        """Whether commands are currently failed fast by the circuit breaker"""
+        return self.BREAKER.is_open()
+
+    async def command(self, command: str) -> str:
+        """Runs a command, returning an empty string if the server did not respond
+
+        Returns immediately (also with an empty string) while the circuit breaker is open.
+        """
+        command_name = command.split(" ", 1)[0]
+        if not self.BREAKER.allow():
+            metrics.RCON_ERRORS.inc(server=self.NAME, command=command_name, kind="offline")
+            return ""
+        try:
+            timer = metrics.Timer()
+            async with self.QUEUE.slot(command_priority(command)):
+                res = await self.POOL.command(command, timer)
+        except CommandDropped as e:
+            log.warning(f"RCON command {command_name} not sent to {self.NAME}: {e}")
+            self.BREAKER.abandon()
+            return ""
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, RCONError) as e:
+            log.error(f"RCON command failed: {type(e).__name__}: {e}")
+            metrics.RCON_ERRORS.inc(server=self.NAME, command=command_name, kind=classify_error(e))
+            self.BREAKER.record_failure()
+            return ""
+        except BaseException:
+            self.BREAKER.abandon()
+            raise
+        self.BREAKER.record_success()
+        metrics.RCON_LATENCY.observe(timer.elapsed, server=self.NAME, command=command_name)
+        if not res:
+            metrics.RCON_EMPTY_RESPONSES.inc(server=self.NAME, command=command_name)
+        return res
+
+    async def batch(self, commands: list[str]) -> list[CommandResult]:
+        """Runs several commands over one pooled connection, pipelined
+
+        Takes a single `max_concurrent_commands` slot for the whole batch.
+        """
+        if not self.BREAKER.allow():
+            return [CommandResult(command, "", self.OFFLINE_ERROR) for command in commands]
+        try:
+            timer = metrics.Timer()
+            async with self.QUEUE.slot(min(command_priority(command) for command in commands)):
+                results = await self.POOL.batch(commands, timer)
+            metrics.RCON_LATENCY.observe(timer.elapsed, server=self.NAME, command="batch")
+        except CommandDropped as e:
+            log.warning(f"RCON batch not sent to {self.NAME}: {e}")
+            self.BREAKER.abandon()
+            return [CommandResult(command, "", self.GENERIC_ERROR) for command in commands]
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, RCONError) as e:
+            # Failed before anything was sent, e.g. while connecting
+            log.error(f"RCON batch failed: {type(e).__name__}: {e}")
+            results = [e] * len(commands)
+        except BaseException:
+            self.BREAKER.abandon()
+            raise
+        if all(isinstance(res, Exception) for res in results):
+            self.BREAKER.record_failure()
+        else:
+            self.BREAKER.record_success()
+        command_results = []
+        for command, res in zip(commands, results):
+            command_name = command.split(" ", 1)[0]
+            if isinstance(res, Exception):
+                metrics.RCON_ERRORS.inc(server=self.NAME, command=command_name, kind=classify_error(res))
+                command_results.append(CommandResult(command, "", self.GENERIC_ERROR))
+                continue
+            if not res:
+                metrics.RCON_EMPTY_RESPONSES.inc(server=self.NAME, command=command_name)
+            command_results.append(CommandResult(command, res, "" if res else self.GENERIC_ERROR))
+        return command_results
 
     # Admin Commands:
-    async def info(self):
-        await self.check_console_ready()
-        res = await self.CONSOLE.command("Info")
-        return res if res else self.GENERIC_ERROR
+    async def info(self) -> tuple[ServerInfo | None, str]:
+        """Returns the game server name and version number"""
+        return await self.CACHE.get("Info", self.fetch_info, cacheable=lambda result: not result[1])
 
-    async def save(self):
-        await self.check_console_ready()
-        res = await self.CONSOLE.command("Save")
+    async def fetch_info(self) -> tuple[ServerInfo | None, str]:
+        log.debug("Fetching server info")
+        res = await self.command("Info")
+        return parse_info(res, self.GENERIC_ERROR)
+
+    async def save(self) -> str:
+        log.debug("Saving world")
+        res = await self.command("Save")
         return res if res else self.GENERIC_ERROR
 
-    async def online(self):
-        # Response is of format `name,playerid,steamid`
-        await self.check_console_ready()
-        res = await self.CONSOLE.command("ShowPlayers")
-        # TODO: REFORMAT INTO MORE READABLE OUTPUT
+    async def online(self) -> tuple[dict[str, Player], str]:
+        """Returns dict of online players, and error message (if any)
+        { Key (Steam ID): Value (Player) }
+
+        Served from the roster poller's snapshot while it is fresh, otherwise
+        from the cache if fetched within the last `cache_ttl` seconds.
+        """
+        if self.ROSTER.is_fresh():
+            return self.ROSTER.snapshot, ""
+        return await self.CACHE.get("ShowPlayers", self.fetch_online, cacheable=lambda result: not result[1])
+
+    async def fetch_online(self) -> tuple[dict[str, Player], str]:
+        log.debug("Fetching online players")
+        generation = self.ROSTER.generation
+        res = await self.command("ShowPlayers")
+        players, error_message = parse_players(res, self.GENERIC_ERROR)
+        if not error_message:
+            self.ROSTER.update(players, generation)
+        return players, error_message
+
+    def invalidate(self) -> None:
+        """After a command that changes who is online: the next query asks the server, not the cache or the roster"""
+        self.CACHE.invalidate()
+        self.ROSTER.invalidate()
+
+    def peek_info(self) -> tuple[ServerInfo | None, str] | None:
+        """Last known server info, without querying the server (None if never fetched)"""
+        return self.CACHE.peek("Info")
+
+    def peek_online(self) -> tuple[dict[str, Player], str] | None:
+        """Last known online players, without querying the server (None if never fetched)"""
+        if self.ROSTER.updated_at and not self.ROSTER.stale:
+            return self.ROSTER.snapshot, ""
+        return self.CACHE.peek("ShowPlayers")
+
+    async def get_ign_from_steam_id(self, steam_id: str) -> str:
+        """Fetches player name from Steam ID, if player is online"""
+        players, _ = await self.online()
+        player = players.get(steam_id)
+        return player.name if player else ""
+
+    async def announce(self, message: str) -> str:
+        log.debug("Broadcasting message to world")
+        res = await self.command(f"Broadcast {message}")
+        # TODO: Consider reformatting server's response
         return res if res else self.GENERIC_ERROR
 
-    async def announce(self, message: str):
-        await self.check_console_ready()
-        res = await self.CONSOLE.command(f"Broadcast {message}")
-        # TODO: Consider reformatting reply
+    async def kick(self, steam_id: str) -> str:
+        log.debug("Kicking player from server")
+        res = await self.command(f"KickPlayer {steam_id}")
+        self.invalidate()
         return res if res else self.GENERIC_ERROR
 
-    async def kick(self, steam_id: str):
-        await self.check_console_ready()
-        res = await self.CONSOLE.command(f"KickPlayer {steam_id}")
+    async def ban(self, steam_id: str) -> str:
+        log.debug("Banning player from server")
+        res = await self.command(f"BanPlayer {steam_id}")
+        self.invalidate()
         return res if res else self.GENERIC_ERROR
 
-    async def ban(self, steam_id: str):
-        await self.check_console_ready()
-        res = await self.CONSOLE.command(f"BanPlayer {steam_id}")
+    async def kick_many(self, steam_ids: list[str]) -> list[CommandResult]:
+        log.debug(f"Kicking {len(steam_ids)} players from server")
+        results = await self.batch([f"KickPlayer {steam_id}" for steam_id in steam_ids])
+        self.invalidate()
+        return results
+
+    async def ban_many(self, steam_ids: list[str]) -> list[CommandResult]:
+        log.debug(f"Banning {len(steam_ids)} players from server")
+        results = await self.batch([f"BanPlayer {steam_id}" for steam_id in steam_ids])
+        self.invalidate()
+        return results
+
+    async def unban(self, steam_id: str) -> str:
+        log.debug("Unbanning player")
+        res = await self.command(f"UnBanPlayer {steam_id}")
         return res if res else self.GENERIC_ERROR
 
-    async def shutdown(self, seconds: str, message: str):
-        await self.check_console_ready()
-        res = await self.CONSOLE.command(f"Shutdown {seconds} {message}")
+    async def shutdown(self, seconds: str, message: str) -> str:
+        log.debug(f"Schedule server shutdown in {seconds} seconds")
+        res = await self.command(f"Shutdown {seconds} {message}")
+        self.invalidate()
         return res if res else self.GENERIC_ERROR
 
-    async def force_stop(self):
-        await self.check_console_ready()
-        res = await self.CONSOLE.command("DoExit")
+    async def force_stop(self) -> str:
+        log.debug("Terminating the server forcefully")
+        res = await self.command("DoExit")
+        self.invalidate()
+        # TODO: Check if this is supposed to give a response (and alter accordingly)
         return res if res else self.GENERIC_ERROR
 
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            "cache": self.CACHE.stats(),
+            "pool": self.POOL.stats(),
+            "breaker": self.BREAKER.stats(),
+            "queue": self.QUEUE.stats(),
+        }
+
+
 if __name__ == "__main__":
     client = Client()
     players, error = client.online()
@@ -5,3 +5,34 @@ from dataclasses import dataclass
 class ServerInfo:
     version: str
     name: str
+
+
+@dataclass(slots=True)
+class Player:
+    name: str
+    player_uid: str
+    steam_id: str
+
+
+@dataclass
+class RosterEvent:
+    kind: str  # "join" or "leave"
+    steam_id: str
+    name: str
+    timestamp: float
+
+
+@dataclass
+class CommandResult:
+    command: str
+    response: str
+    error: str = ""  # Empty if the server responded
+
+
+@dataclass
+class Ban:
+    steam_id: str
+    name: str = ""
+    reason: str = ""
+    banned_by: str = ""
+    banned_at: float = 0.0  # time.time(); 0 if unknown (e.g. imported from a Palworld banlist)
@@ -0,0 +1,291 @@
+"""Declarative slash commands, all run through one shared pipeline.
+
+A command is an async handler plus a few flags (`CommandSpec`);
+`Dispatcher.command()` registers it with the command tree, and every call
+goes through the same stages, in order:
+
+1. auth: admin-only commands are refused to anyone but administrators
+2. server: the `server` option is resolved to its (long-lived, pooled)
+   client; unknown and offline servers are answered without deferring
+3. check: cheap validation of the options, answered without deferring
+4. rate limit: over-limit calls are answered from the client's cache
+   (`peek`) if the command has one, and refused otherwise
+5. the handler runs, after deferring if the command talks to a server; its
+   read-only RCON queries are dropped if they can't start before
+   `queue_max_wait`, or before the interaction is about to expire
+6. rendering: embeds get the footer, thumbnail and server name; a handler
+   that raised is answered with `generic_bot_error`; output too large for one
+   message is split across several, or attached as a file (see `output`)
+7. metrics: end-to-end latency and outcome, per command, and an entry in
+   the audit journal for commands declared with `audit=True`
+"""
+import asyncio
+import functools
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+import discord
+from discord import app_commands
+
+from audit import AuditJournal
+from client import AsyncClient
+from fleet import Fleet, FLEET_WIDE
+from priority import DEADLINE
+from ratelimit import RateLimiter, THROTTLED
+import logger
+import metrics
+import output
+
+log = logger.get_logger(__name__)
+
+PERMISSION_ERROR = "You do not have the required permissions to use this command."
+DEFAULT_QUEUE_MAX_WAIT = 10
+# Seconds kept back from the interaction's expiry to send the followup
+EXPIRY_MARGIN = 5
+
+COMMAND_OUTCOMES = metrics.REGISTRY.register(metrics.Counter(
+    "palcon_slash_commands",
+    "Slash commands handled, by outcome (ok, cached, error, forbidden, unknown_server, offline, invalid, throttled)",
+    ("command", "outcome"),
+))
+
+
+def format_timestamp(timestamp: float) -> str:
+    return f"<t:{int(timestamp)}:R>" if timestamp else "never"
+
+
+def audit_value(value: Any) -> Any:
+    """An option's value as the audit journal stores it"""
+    if isinstance(value, app_commands.Choice):
+        return value.value
+    if isinstance(value, discord.Attachment):
+        # The file itself isn't kept; what was uploaded is enough to trace an import
+        return {"filename": value.filename, "size": value.size}
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    # Members, channels, roles and the like, by their mention-free name
+    return str(value)
+
+
+@dataclass
+class Reply:
+    content: str | None = None
+    embed: discord.Embed | None = None
+    view: discord.ui.View | None = None
+    file: discord.File | None = None
+
+
+@dataclass
+class Context:
+    """What a handler gets in place of the interaction"""
+    dispatcher: "Dispatcher"
+    interaction: discord.Interaction
+    client: AsyncClient | None = None  # None for fleet-wide calls, and commands without a `server` option
+    cached: Any = None  # The cached response, if the call was over its rate limit
+    response: str = ""  # What the reply said, for the audit journal
+    elapsed: float = 0.0  # Seconds spent in the handler (RCON round trips included)
+
+    def format_embed(self, embed_message: discord.Embed) -> discord.Embed:
+        self.dispatcher.format_embed(embed_message, self.client.NAME if self.client else None)
+        return embed_message
+
+
+@dataclass
+class CommandSpec:
+    name: str
+    description: str
+    handler: Callable[..., Awaitable[Reply | discord.Embed | str]]
+    admin: bool = False
+    server: bool = True  # Whether the command has a `server` option to resolve
+    fleet_wide: bool = False  # Whether `server` may be FLEET_WIDE
+    offline: bool = False  # Whether the command still runs while its server is offline
+    check: Callable[..., str | None] | None = None  # Given the options; returns why they are refused, if they are
+    rate_limited: bool = False
+    peek: Callable[[AsyncClient], Any] | None = None  # Cached response to fall back on when rate limited
+    defer: bool = True
+    ephemeral: bool = False
+    audit: bool = False  # Whether calls are recorded in the audit journal
+    error: str = "Unable to run command"  # Logged, with the exception, when the handler raises
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        tree: app_commands.CommandTree,
+        fleet: Fleet,
+        rate_limiter: RateLimiter,
+        config: dict,
+        journal: AuditJournal | None = None,
+    ):
+        self.TREE = tree
+        self.FLEET = fleet
+        self.RATE_LIMITER = rate_limiter
+        self.JOURNAL = journal
+        self.config = config
+        self.specs: dict[str, CommandSpec] = {}
+
+    def reconfigure(self, config: dict) -> None:
+        self.config = config
+
+    def command(self, name: str, description: str, **options) -> Callable:
+        """Decorator registering `handler(context, **options)`; its parameters after the first become the command's options"""
+        def decorator(handler: Callable[..., Awaitable[Reply | discord.Embed | str]]) -> app_commands.Command:
+            spec = CommandSpec(name, description, handler, **options)
+            self.specs[name] = spec
+
+            # `wraps` also exposes the handler's signature (and any autocomplete/choices) to discord.py
+            @functools.wraps(handler)
+            async def callback(interaction: discord.Interaction, **arguments):
+                await self.dispatch(spec, interaction, arguments)
+
+            return self.TREE.command(name=name, description=description)(callback)
+        return decorator
+
+    def format_embed(self, embed_message: discord.Embed, server_name: str = None) -> None:
+        embed_message.set_footer(text=self.config["embed_footer"])
+        embed_message.set_thumbnail(url=self.config["embed_thumbnail"])
+        if len(self.FLEET) > 1 and server_name:
+            embed_message.set_author(name=server_name)
+
+    # Pipeline ---------------------------------------------------------------------
+    async def dispatch(self, spec: CommandSpec, interaction: discord.Interaction, arguments: dict) -> None:
+        context = Context(self, interaction)
+        outcome = "error"
+        try:
+            outcome = await self.run(spec, context, arguments)
+        finally:
+            # Measured from when Discord created the interaction, so it spans defer through followup
+            elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+            metrics.COMMAND_LATENCY.observe(elapsed, command=spec.name)
+            COMMAND_OUTCOMES.inc(command=spec.name, outcome=outcome)
+            if spec.audit and self.JOURNAL:
+                self.JOURNAL.record(
+                    user=str(interaction.user),
+                    user_id=interaction.user.id,
+                    guild_id=interaction.guild_id,
+                    command=spec.name,
+                    server=context.client.NAME if context.client else arguments.get("server"),
+                    arguments={name: audit_value(value) for name, value in arguments.items() if value is not None},
+                    outcome=outcome,
+                    response=context.response,
+                    latency=round(context.elapsed, 4),
+                )
+
+    async def run(self, spec: CommandSpec, context: Context, arguments: dict) -> str:
+        """Every stage of the pipeline; returns the outcome"""
+        interaction = context.interaction
+        if spec.admin and not interaction.permissions.administrator:
+            await interaction.response.send_message(PERMISSION_ERROR)
+            return "forbidden"
+
+        server = arguments.get("server")
+        if spec.server and not (spec.fleet_wide and server == FLEET_WIDE):
+            context.client = self.FLEET.get(server)
+            if not context.client:
+                await self.send_unknown_server(interaction, server)
+                return "unknown_server"
+            if not spec.offline and context.client.is_offline():
+                await self.send_server_offline(interaction, context.client)
+                return "offline"
+
+        if spec.check and (problem := spec.check(**arguments)):
+            await interaction.response.send_message(problem, ephemeral=True)
+            return "invalid"
+
+        if spec.rate_limited and (throttled := self.RATE_LIMITER.check(interaction.user.id, interaction.guild_id)):
+            context.cached = spec.peek(context.client) if spec.peek and context.client else None
+            if not context.cached:
+                await self.send_rate_limited(interaction, throttled)
+                return "throttled"
+            THROTTLED.inc(command=spec.name, scope=throttled, outcome="cached")
+
+        if spec.defer:
+            await interaction.response.defer(ephemeral=spec.ephemeral)
+        token = DEADLINE.set(self.deadline(interaction))
+        try:
+            with metrics.Timer() as timer:
+                reply = await spec.handler(context, **arguments)
+            outcome = "cached" if context.cached else "ok"
+        except Exception as e:
+            log.error(f"{spec.error}: {e}")
+            reply = self.config["generic_bot_error"]
+            outcome = "error"
+        finally:
+            DEADLINE.reset(token)
+        context.elapsed = timer.elapsed
+        try:
+            await self.send(context, reply, spec.ephemeral, spec.name)
+        except discord.HTTPException as e:
+            # Discord refused the reply (e.g. something the output stage doesn't know to split); still answer
+            log.error(f"Unable to send the reply to /{spec.name}: {e}")
+            await self.send(context, self.config["generic_bot_error"], spec.ephemeral, spec.name)
+            return "error"
+        return outcome
+
+    def deadline(self, interaction: discord.Interaction) -> float:
+        """Event loop time after which nobody would see the answer to a query made for the interaction"""
+        remaining = (interaction.expires_at - discord.utils.utcnow()).total_seconds() - EXPIRY_MARGIN
+        max_wait = self.config.get("queue_max_wait", DEFAULT_QUEUE_MAX_WAIT)
+        return asyncio.get_running_loop().time() + min(max_wait, remaining)
+
+    async def send(self, context: Context, reply: Reply | discord.Embed | str, ephemeral: bool, name: str) -> None:
+        if isinstance(reply, str):
+            reply = Reply(content=reply)
+        elif isinstance(reply, discord.Embed):
+            reply = Reply(embed=reply)
+        if reply.embed:
+            context.format_embed(reply.embed)
+        context.response = reply.content or (reply.embed.description if reply.embed else None) or ""
+        # Usually a single message; oversized output is split, or attached, by the output stage
+        for index, (content, embeds, attachment) in enumerate(output.fit(reply.content, reply.embed, name)):
+            files = [file for file in (reply.file if index == 0 else None, attachment) if file]
+            view = reply.view if index == 0 else None
+            message = await self.send_message(context.interaction, content, embeds, files, view, ephemeral)
+            if view:
+                view.message = message
+
+    async def send_message(
+        self,
+        interaction: discord.Interaction,
+        content: str | None,
+        embeds: list[discord.Embed],
+        files: list[discord.File],
+        view: discord.ui.View | None,
+        ephemeral: bool,
+    ) -> discord.Message | None:
+        # discord.py distinguishes "not given" from None, so only what was set is passed on
+        fields = {key: value for key, value in (("content", content), ("embeds", embeds), ("files", files), ("view", view)) if value}
+        if interaction.response.is_done():
+            return await interaction.followup.send(**fields, ephemeral=ephemeral, wait=view is not None)
+        await interaction.response.send_message(**fields, ephemeral=ephemeral)
+        return await interaction.original_response() if view else None
+
+    # Early answers ----------------------------------------------------------------
+    async def send_rate_limited(self, interaction: discord.Interaction, scope: str) -> None:
+        THROTTLED.inc(command=interaction.command.name, scope=scope, outcome="rejected")
+        who = "You are" if scope == "user" else "This server is"
+        await interaction.response.send_message(
+            f"{who} using this command too often; please try again in a few seconds.",
+            ephemeral=True,
+        )
+
+    def unknown_server(self, server: str) -> str:
+        return f"Unknown server `{server}`; choose one of: {', '.join(self.FLEET.names())}"
+
+    async def send_unknown_server(self, interaction: discord.Interaction, server: str) -> None:
+        await interaction.response.send_message(self.unknown_server(server), ephemeral=True)
+
+    async def send_server_offline(self, interaction: discord.Interaction, rcon_client: AsyncClient) -> None:
+        """Answered straight away, without deferring, since no RCON command is sent"""
+        embed_message = discord.Embed(
+            title="Server Offline",
+            colour=discord.Colour.red(),
+            description=(
+                f"{rcon_client.OFFLINE_ERROR}; it will be retried "
+                f"{format_timestamp(time.time() + rcon_client.BREAKER.retry_in())}.\n"
+                f"Last reached: {format_timestamp(rcon_client.BREAKER.last_success)}"
+            ),
+        )
+        self.format_embed(embed_message, rcon_client.NAME)
+        await interaction.response.send_message(embed=embed_message)
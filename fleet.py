@@ -0,0 +1,121 @@
+"""Manages one `AsyncClient` (pool, cache and roster poller) per game server.
+
+Servers are configured as named tables in `config.toml`:
+
+    [servers.main]
+    ip = "127.0.0.1"
+    port = 25575
+    password = ""
+
+Any top-level setting (e.g. `timeout_duration`, `pool_size`) acts as a default
+for every server. Configs without a `[servers]` table are treated as a single
+server named "default", using the top-level `ip`/`port`/`password`.
+"""
+import asyncio
+
+from client import AsyncClient
+from data import Player
+import logger
+import metrics
+
+log = logger.get_logger(__name__)
+
+DEFAULT_SERVER_NAME = "default"
+FLEET_WIDE = "all"
+# (section of `AsyncClient.stats()`, stat): (metric type, documentation)
+FLEET_STATS = {
+    ("pool", "size"): ("gauge", "Maximum number of RCON connections"),
+    ("pool", "idle"): ("gauge", "Open RCON connections waiting to be reused"),
+    ("pool", "in_use"): ("gauge", "RCON connections currently running a command"),
+    ("pool", "created"): ("counter", "RCON connections opened"),
+    ("pool", "evicted"): ("counter", "RCON connections closed as dead or idle"),
+    ("pool", "failures"): ("gauge", "Consecutive failed connection attempts"),
+    ("cache", "hits"): ("counter", "Responses served from the cache"),
+    ("cache", "misses"): ("counter", "Responses fetched from the server"),
+    ("cache", "coalesced"): ("counter", "Requests that waited on an identical in-flight request"),
+    ("cache", "entries"): ("gauge", "Responses currently cached"),
+    ("breaker", "open"): ("gauge", "1 while the circuit breaker is failing commands fast"),
+    ("breaker", "failures"): ("gauge", "Consecutive failed RCON commands"),
+    ("queue", "depth"): ("gauge", "RCON commands waiting for a free slot"),
+}
+
+
+def get_server_configs(config: dict) -> dict[str, dict]:
+    """Returns the effective config of every server, keyed by server name"""
+    defaults = {key: value for key, value in config.items() if key != "servers"}
+    servers = config.get("servers")
+    if not servers:
+        return {DEFAULT_SERVER_NAME: defaults}
+    return {name: defaults | table for name, table in servers.items()}
+
+
+class Fleet:
+    def __init__(self, config: dict):
+        self.clients: dict[str, AsyncClient] = {
+            name: AsyncClient(config=server_config, name=name)
+            for name, server_config in get_server_configs(config).items()
+        }
+        self.DEFAULT = next(iter(self.clients))
+        log.info(f"Managing {len(self.clients)} server(s): {', '.join(self.clients)}")
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def names(self) -> list[str]:
+        return list(self.clients)
+
+    def get(self, name: str = None) -> AsyncClient | None:
+        """Returns the client for the named server (or the first one), or None if unknown"""
+        return self.clients.get(name or self.DEFAULT)
+
+    def reconfigure(self, config: dict) -> None:
+        """Applies a reloaded config to every server; adding or removing servers needs a restart"""
+        server_configs = get_server_configs(config)
+        added = server_configs.keys() - self.clients.keys()
+        removed = self.clients.keys() - server_configs.keys()
+        if added or removed:
+            log.warning(f"Servers added ({', '.join(added) or 'none'}) or removed ({', '.join(removed) or 'none'}) "
+                        f"take effect after a restart")
+        for name, client in self.clients.items():
+            if name in server_configs:
+                client.reconfigure(server_configs[name])
+
+    def start(self) -> None:
+        for client in self.clients.values():
+            client.ROSTER.start()
+
+    def collect_metrics(self) -> None:
+        """Exposes every server's pool, cache and roster state on the metrics endpoint"""
+        def collect(section: str, stat: str, suffix: str):
+            def samples():
+                for server_name, client in self.clients.items():
+                    yield f"palcon_{section}_{stat}{suffix}", {"server": server_name}, client.stats()[section][stat]
+            return samples
+
+        for (section, stat), (metric_type, documentation) in FLEET_STATS.items():
+            suffix = "_total" if metric_type == "counter" else ""
+            metrics.register_collector(f"palcon_{section}_{stat}", documentation, metric_type, collect(section, stat, suffix))
+
+        def players_online():
+            for server_name, client in self.clients.items():
+                yield "palcon_players_online", {"server": server_name}, len(client.ROSTER.snapshot)
+
+        metrics.register_collector(
+            "palcon_players_online", "Players online, as of the latest roster snapshot", "gauge", players_online,
+        )
+
+    async def close(self) -> None:
+        await asyncio.gather(*(client.close() for client in self.clients.values()))
+
+    async def online(self) -> dict[str, tuple[dict[str, Player], str]]:
+        """Queries every server concurrently; each server is bounded by its own timeout"""
+        async def query(client: AsyncClient) -> tuple[dict[str, Player], str]:
+            if client.is_offline():
+                return {}, client.OFFLINE_ERROR
+            try:
+                return await asyncio.wait_for(client.online(), timeout=client.CONFIG["timeout_duration"])
+            except asyncio.TimeoutError:
+                return {}, client.GENERIC_ERROR
+
+        results = await asyncio.gather(*(query(client) for client in self.clients.values()))
+        return dict(zip(self.clients, results))
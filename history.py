@@ -0,0 +1,249 @@
+"""Persistent history of every player seen through `ShowPlayers`.
+
+Backed by SQLite in WAL mode. Roster snapshots and join/leave events are
+buffered in memory and written in batches on a dedicated writer thread;
+lookups run on a separate reader thread, so neither touches the event loop.
+"""
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from data import Player, RosterEvent
+import logger
+
+log = logger.get_logger(__name__)
+
+DEFAULT_PATH = "history.sqlite3"
+DEFAULT_FLUSH_INTERVAL = 5
+SEARCH_LIMIT = 25
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    server TEXT NOT NULL,
+    steam_id TEXT NOT NULL,
+    player_uid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    total_session_seconds REAL NOT NULL DEFAULT 0,
+    session_started REAL,
+    PRIMARY KEY (server, steam_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS players_by_name ON players (server, name_lower);
+CREATE INDEX IF NOT EXISTS players_by_last_seen ON players (server, last_seen);
+
+CREATE TABLE IF NOT EXISTS player_names (
+    server TEXT NOT NULL,
+    steam_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (server, steam_id, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS player_names_by_name ON player_names (server, name_lower);
+"""
+
+UPSERT_PLAYER = """
+INSERT INTO players (server, steam_id, player_uid, name, name_lower, first_seen, last_seen, session_started)
+VALUES (:server, :steam_id, :player_uid, :name, :name_lower, :seen, :seen, :seen)
+ON CONFLICT (server, steam_id) DO UPDATE SET
+    player_uid = excluded.player_uid,
+    name = excluded.name,
+    name_lower = excluded.name_lower,
+    last_seen = excluded.last_seen,
+    session_started = COALESCE(players.session_started, excluded.session_started)
+"""
+UPSERT_NAME = """
+INSERT INTO player_names (server, steam_id, name, name_lower, first_seen, last_seen)
+VALUES (:server, :steam_id, :name, :name_lower, :seen, :seen)
+ON CONFLICT (server, steam_id, name) DO UPDATE SET last_seen = excluded.last_seen
+"""
+END_SESSION = """
+UPDATE players SET
+    total_session_seconds = total_session_seconds + MAX(0, :seen - session_started),
+    last_seen = :seen,
+    session_started = NULL
+WHERE server = :server AND steam_id = :steam_id AND session_started IS NOT NULL
+"""
+# Sessions left open by a previous run end when the player was last seen
+END_STALE_SESSIONS = """
+UPDATE players SET
+    total_session_seconds = total_session_seconds + MAX(0, last_seen - session_started),
+    session_started = NULL
+WHERE session_started IS NOT NULL
+"""
+
+
+def prefix_bounds(prefix: str) -> tuple[str, str]:
+    """Range that matches every string starting with `prefix`, usable by an index"""
+    return prefix, prefix + "\U0010ffff"
+
+
+class PlayerHistory:
+    def __init__(self, path: str = DEFAULT_PATH, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.PATH = path
+        self.FLUSH_INTERVAL = flush_interval
+        # One thread each, since SQLite connections stay on the thread that opened them
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-writer")
+        self.reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-reader")
+        self.write_connection: sqlite3.Connection | None = None
+        self.read_connection: sqlite3.Connection | None = None
+        # Buffered until the next flush: server -> (latest snapshot, its timestamp), and events in order
+        self.pending_snapshots: dict[str, tuple[dict[str, Player], float]] = {}
+        self.pending_events: list[tuple[str, RosterEvent]] = []
+        self.task: asyncio.Task | None = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "PlayerHistory":
+        return cls(
+            path=config.get("history_path", DEFAULT_PATH),
+            flush_interval=config.get("history_flush_interval", DEFAULT_FLUSH_INTERVAL),
+        )
+
+    # Lifecycle --------------------------------------------------------------------
+    async def open(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.writer, self._open_writer)
+        await loop.run_in_executor(self.reader, self._open_reader)
+        log.info(f"Player history stored in {self.PATH}")
+
+    def _open_writer(self) -> None:
+        Path(self.PATH).parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.PATH)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        with connection:
+            connection.execute(END_STALE_SESSIONS)
+        self.write_connection = connection
+
+    def _open_reader(self) -> None:
+        self.read_connection = sqlite3.connect(f"file:{self.PATH}?mode=ro", uri=True)
+
+    def start(self) -> None:
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                log.error(f"Unable to write player history: {e}")
+
+    async def close(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.write_connection:
+            await self.flush()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.writer, self._close_connection, "write_connection")
+        await loop.run_in_executor(self.reader, self._close_connection, "read_connection")
+        self.writer.shutdown()
+        self.reader.shutdown()
+
+    def _close_connection(self, attribute: str) -> None:
+        connection = getattr(self, attribute)
+        if connection:
+            connection.close()
+            setattr(self, attribute, None)
+
+    # Writes -----------------------------------------------------------------------
+    def observe(self, server: str, players: dict[str, Player], events: list[RosterEvent]) -> None:
+        """Roster observer; only buffers, so it is cheap enough to call on every poll"""
+        self.pending_snapshots[server] = (players, time.time())
+        self.pending_events.extend((server, event) for event in events)
+
+    async def flush(self) -> None:
+        if not self.pending_snapshots and not self.pending_events:
+            return
+        snapshots, self.pending_snapshots = self.pending_snapshots, {}
+        events, self.pending_events = self.pending_events, []
+        await asyncio.get_running_loop().run_in_executor(self.writer, self._write, snapshots, events)
+
+    def _write(self, snapshots: dict[str, tuple[dict[str, Player], float]], events: list[tuple[str, RosterEvent]]) -> None:
+        leaves = [
+            {"server": server, "steam_id": event.steam_id, "seen": event.timestamp}
+            for server, event in events if event.kind == "leave"
+        ]
+        rows = [
+            {
+                "server": server,
+                "steam_id": player.steam_id,
+                "player_uid": player.player_uid,
+                "name": player.name,
+                "name_lower": player.name.lower(),
+                "seen": seen,
+            }
+            for server, (players, seen) in snapshots.items()
+            for player in players.values()
+        ]
+        with self.write_connection:
+            self.write_connection.executemany(END_SESSION, leaves)
+            self.write_connection.executemany(UPSERT_PLAYER, rows)
+            self.write_connection.executemany(UPSERT_NAME, rows)
+
+    # Reads ------------------------------------------------------------------------
+    async def search(self, server: str, prefix: str, limit: int = SEARCH_LIMIT) -> list[tuple[str, str]]:
+        """Returns up to `limit` (Steam ID, current name) pairs matching a name or Steam ID prefix
+
+        Past names are matched too. An empty prefix returns the most recently seen players.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.reader, self._search, server, prefix, limit)
+
+    def _search(self, server: str, prefix: str, limit: int) -> list[tuple[str, str]]:
+        if not self.read_connection:
+            return []
+        if not prefix:
+            return self.read_connection.execute(
+                "SELECT steam_id, name FROM players WHERE server = ? ORDER BY last_seen DESC LIMIT ?",
+                (server, limit),
+            ).fetchall()
+
+        low, high = prefix_bounds(prefix.lower())
+        results = dict(self.read_connection.execute(
+            "SELECT steam_id, name FROM players WHERE server = ? AND name_lower >= ? AND name_lower < ? LIMIT ?",
+            (server, low, high, limit),
+        ).fetchall())
+        if len(results) < limit:
+            low, high = prefix_bounds(prefix)
+            results.update(self.read_connection.execute(
+                "SELECT steam_id, name FROM players WHERE server = ? AND steam_id >= ? AND steam_id < ? LIMIT ?",
+                (server, low, high, limit - len(results)),
+            ).fetchall())
+        if len(results) < limit:
+            low, high = prefix_bounds(prefix.lower())
+            results.update(self.read_connection.execute(
+                "SELECT players.steam_id, players.name FROM player_names "
+                "JOIN players USING (server, steam_id) "
+                "WHERE player_names.server = ? AND player_names.name_lower >= ? AND player_names.name_lower < ? "
+                "LIMIT ?",
+                (server, low, high, limit),
+            ).fetchall())
+        return list(results.items())[:limit]
+
+    async def get(self, server: str, steam_id: str) -> dict | None:
+        """Returns everything known about a player, or None if they were never seen"""
+        return await asyncio.get_running_loop().run_in_executor(self.reader, self._get, server, steam_id)
+
+    def _get(self, server: str, steam_id: str) -> dict | None:
+        if not self.read_connection:
+            return None
+        cursor = self.read_connection.execute(
+            "SELECT * FROM players WHERE server = ? AND steam_id = ?", (server, steam_id),
+        )
+        row = cursor.fetchone()
+        if not row:
+            return None
+        player = dict(zip((column[0] for column in cursor.description), row))
+        player["names"] = [name for (name,) in self.read_connection.execute(
+            "SELECT name FROM player_names WHERE server = ? AND steam_id = ? ORDER BY first_seen",
+            (server, steam_id),
+        )]
+        return player
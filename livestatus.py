@@ -0,0 +1,255 @@
+"""Live status messages: one message per channel and server, kept up to date by editing it.
+
+Roster polls and circuit breaker changes mark a server dirty. Changes are
+debounced, so a burst of joins becomes one update, and each server's embed is
+then rendered once from what is already in memory (the roster snapshot and
+the cached `Info`), so no RCON command is sent per message. Every message
+showing that server shares the render, and is only edited if the embed's
+content hash differs from what the message last showed. Edits go through a
+token bucket per channel, and an edit still waiting for its bucket is
+replaced by a newer render rather than queued behind it.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import discord
+
+from fleet import Fleet
+from ratelimit import TokenBucket
+from views import format_player_preview
+import logger
+
+log = logger.get_logger(__name__)
+
+DEFAULT_PATH = "status_messages.json"
+DEFAULT_DEBOUNCE = 5
+DEFAULT_EDIT_INTERVAL = 2
+# Edits a channel may make back to back before `status_edit_interval` applies
+EDIT_BURST = 3
+MORE_PLAYERS_SUFFIX = "\n...and {count} more"
+
+
+@dataclass
+class StatusMessage:
+    server: str
+    channel_id: int
+    message_id: int
+    digest: str = ""  # Content hash of the embed the message currently shows
+
+
+def digest_embed(embed_message: discord.Embed) -> str:
+    return hashlib.sha256(json.dumps(embed_message.to_dict(), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ChannelEditor:
+    """Applies edits to one channel's status messages, within its rate limit"""
+    def __init__(self, board: "StatusBoard", channel_id: int, edit_interval: float):
+        self.BOARD = board
+        self.CHANNEL_ID = channel_id
+        self.bucket = TokenBucket(1 / edit_interval, EDIT_BURST)
+        # { Key (message ID): Value (message, embed, digest) }; only the newest render of each message is kept
+        self.pending: dict[int, tuple[StatusMessage, discord.Embed, str]] = {}
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def push(self, message: StatusMessage, embed_message: discord.Embed, digest: str) -> None:
+        self.pending[message.message_id] = (message, embed_message, digest)
+        self.wakeup.set()
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self) -> None:
+        while True:
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            self.bucket.refill()
+            if self.bucket.tokens < 1:
+                await asyncio.sleep((1 - self.bucket.tokens) / self.bucket.rate)
+                continue
+            self.bucket.tokens -= 1
+            message_id = next(iter(self.pending))
+            message, embed_message, digest = self.pending.pop(message_id)
+            if message.digest != digest:
+                await self.BOARD.edit(message, embed_message, digest)
+
+
+class StatusBoard:
+    def __init__(
+        self,
+        fleet: Fleet,
+        format_embed: Callable[[discord.Embed, str], None],
+        path: str = DEFAULT_PATH,
+        debounce: float = DEFAULT_DEBOUNCE,
+        edit_interval: float = DEFAULT_EDIT_INTERVAL,
+    ):
+        self.FLEET = fleet
+        self.FORMAT_EMBED = format_embed
+        self.PATH = Path(path)
+        self.DEBOUNCE = debounce
+        self.EDIT_INTERVAL = max(0.1, edit_interval)
+        self.messages: dict[int, StatusMessage] = {}  # { Key (message ID): Value (StatusMessage) }
+        self.editors: dict[int, ChannelEditor] = {}  # { Key (channel ID): Value (ChannelEditor) }
+        self.refreshes: dict[str, asyncio.Task] = {}  # Debounced renders waiting to run, by server
+        self.discord_client: discord.Client | None = None
+
+    @classmethod
+    def from_config(cls, fleet: Fleet, format_embed: Callable[[discord.Embed, str], None], config: dict) -> "StatusBoard":
+        return cls(
+            fleet,
+            format_embed,
+            path=config.get("status_path", DEFAULT_PATH),
+            debounce=config.get("status_debounce", DEFAULT_DEBOUNCE),
+            edit_interval=config.get("status_edit_interval", DEFAULT_EDIT_INTERVAL),
+        )
+
+    # Rendering --------------------------------------------------------------------
+    def render(self, server_name: str) -> discord.Embed:
+        """The server's status, from memory only; nothing in it changes unless the status does"""
+        rcon_client = self.FLEET.get(server_name)
+        if rcon_client.is_offline():
+            embed_message = discord.Embed(
+                title="Server Offline",
+                colour=discord.Colour.red(),
+                description=f"{rcon_client.OFFLINE_ERROR}; this message updates once it responds again",
+            )
+            self.FORMAT_EMBED(embed_message, server_name)
+            return embed_message
+        cached = rcon_client.peek_info()
+        server_info = cached[0] if cached else None
+        players = list(rcon_client.ROSTER.snapshot.values())
+        embed_message = discord.Embed(
+            title=server_info.name if server_info else server_name,
+            colour=discord.Colour.blurple(),
+            description=(
+                (f"Server Version: {server_info.version}\n" if server_info else "")
+                + f"Player(s) Online: {len(players)}"
+            ),
+        )
+        if players:
+            embed_message.add_field(
+                name="Players",
+                value=format_player_preview(players, lambda count: MORE_PLAYERS_SUFFIX.format(count=count)),
+                inline=False,
+            )
+        self.FORMAT_EMBED(embed_message, server_name)
+        return embed_message
+
+    def mark_dirty(self, server_name: str) -> None:
+        """Schedules a render of the server's messages, unless one is already waiting"""
+        if server_name in self.refreshes or not self.discord_client:
+            return
+        if not any(message.server == server_name for message in self.messages.values()):
+            return
+        self.refreshes[server_name] = asyncio.create_task(self.refresh(server_name))
+
+    async def refresh(self, server_name: str) -> None:
+        try:
+            await asyncio.sleep(self.DEBOUNCE)
+        finally:
+            del self.refreshes[server_name]
+        rcon_client = self.FLEET.get(server_name)
+        if not rcon_client.peek_info() and not rcon_client.is_offline():
+            # The name and version rarely change, so `Info` is only fetched until it has been once
+            await rcon_client.info()
+        embed_message = self.render(server_name)
+        digest = digest_embed(embed_message)
+        for message in self.messages.values():
+            if message.server == server_name and message.digest != digest:
+                self.editor(message.channel_id).push(message, embed_message, digest)
+
+    # Messages ---------------------------------------------------------------------
+    def editor(self, channel_id: int) -> ChannelEditor:
+        if channel_id not in self.editors:
+            self.editors[channel_id] = ChannelEditor(self, channel_id, self.EDIT_INTERVAL)
+        return self.editors[channel_id]
+
+    async def edit(self, message: StatusMessage, embed_message: discord.Embed, digest: str) -> None:
+        channel = self.discord_client.get_partial_messageable(message.channel_id)
+        try:
+            await channel.get_partial_message(message.message_id).edit(embed=embed_message)
+        except discord.NotFound:
+            log.info(f"Status message {message.message_id} for {message.server} was deleted; no longer updating it")
+            await self.remove(message.message_id)
+            return
+        except discord.DiscordException as e:
+            log.error(f"Unable to update status message {message.message_id}: {e}")
+            return
+        message.digest = digest
+
+    async def post(self, channel: discord.abc.Messageable, server_name: str) -> None:
+        """Posts a status message to the channel, replacing any the channel already had for the server"""
+        embed_message = self.render(server_name)
+        sent = await channel.send(embed=embed_message)
+        for message in list(self.messages.values()):
+            if message.server == server_name and message.channel_id == sent.channel.id:
+                await self.remove(message.message_id)
+                try:
+                    await sent.channel.get_partial_message(message.message_id).delete()
+                except discord.DiscordException:
+                    pass
+        self.messages[sent.id] = StatusMessage(server_name, sent.channel.id, sent.id, digest_embed(embed_message))
+        await self.save_state()
+        self.mark_dirty(server_name)
+
+    async def remove(self, message_id: int) -> None:
+        if self.messages.pop(message_id, None):
+            await self.save_state()
+
+    # Lifecycle --------------------------------------------------------------------
+    async def start(self, discord_client: discord.Client) -> None:
+        await asyncio.to_thread(self.load_state)
+        for server_name, rcon_client in self.FLEET.clients.items():
+            rcon_client.ROSTER.add_observer(lambda players, events, server_name=server_name: self.mark_dirty(server_name))
+            rcon_client.BREAKER.add_listener(lambda server_name, state: self.mark_dirty(server_name))
+        self.discord_client = discord_client
+        # Whatever changed while the bot was down is picked up by the first render
+        for server_name in self.FLEET.names():
+            self.mark_dirty(server_name)
+
+    async def stop(self) -> None:
+        for task in list(self.refreshes.values()):
+            task.cancel()
+        for editor in self.editors.values():
+            await editor.stop()
+
+    # Persistence ------------------------------------------------------------------
+    def load_state(self) -> None:
+        try:
+            state = json.loads(self.PATH.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.error(f"Unable to read status messages from {self.PATH}: {e}")
+            return
+        for entry in state.get("messages", []):
+            if entry.get("server") in self.FLEET.names():
+                message = StatusMessage(entry["server"], entry["channel_id"], entry["message_id"])
+                self.messages[message.message_id] = message
+
+    def write_state(self, state: dict) -> None:
+        temporary = self.PATH.with_suffix(".tmp")
+        temporary.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        os.replace(temporary, self.PATH)
+
+    async def save_state(self) -> None:
+        state = {
+            "messages": [
+                {"server": message.server, "channel_id": message.channel_id, "message_id": message.message_id}
+                for message in self.messages.values()
+            ]
+        }
+        try:
+            await asyncio.to_thread(self.write_state, state)
+        except OSError as e:
+            log.error(f"Unable to write status messages to {self.PATH}: {e}")
@@ -1,14 +1,45 @@
 """Generic logger module that wraps around Python's built-in logger.
+
+Loggers only put records on a queue; a `QueueListener` thread does the actual
+console and file writes, so logging never blocks the event loop on disk I/O.
 """
 from pathlib import Path
+import copy
+import json
+import queue
 import sys
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 # Use a config file for these, in larger projects:
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 FORMATTER = logging.Formatter(LOG_FORMAT)
 LOG_DIR = Path("logs")
 ACTIVE_LOG_NAME = "logger.log"
+DEFAULT_LEVEL = logging.INFO
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+
+class RecordQueueHandler(QueueHandler):
+    """Queues records with their exception info intact
+
+    The stock `prepare()` formats the record on the spot, folding any traceback
+    into the message and dropping `exc_info`; formatting is the listener's job
+    here, so `JsonFormatter` can still put the traceback under its own key.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Merged now, while the arguments are still what they were when the call was made
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+LOG_QUEUE = queue.SimpleQueue()
+QUEUE_HANDLER = RecordQueueHandler(LOG_QUEUE)
+listener: QueueListener | None = None
+level = DEFAULT_LEVEL
+# Names of every logger handed out by `get_logger()`, so their level can be changed at runtime
+logger_names: set[str] = set()
 
 
 def get_log_path():
@@ -17,45 +48,100 @@ def get_log_path():
     raise FileNotFoundError(2, "Log output directory could not be found!")
 
 
-def get_console_handler() -> logging.StreamHandler:
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def get_console_handler(formatter: logging.Formatter = FORMATTER) -> logging.StreamHandler:
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(FORMATTER)
+    console_handler.setFormatter(formatter)
     return console_handler
 
 
-def get_file_handler() -> TimedRotatingFileHandler:
-    file_handler = TimedRotatingFileHandler(get_log_path(), when="midnight")
-    file_handler.setFormatter(FORMATTER)
+def get_file_handler(formatter: logging.Formatter = FORMATTER) -> TimedRotatingFileHandler:
+    file_handler = TimedRotatingFileHandler(get_log_path(), when="midnight", encoding="utf-8")
+    file_handler.setFormatter(formatter)
     return file_handler
 
 
 class NullHandler(logging.Handler):
     """Silent handler
-    
+
     Add this in `get_logger()` to silence the logger.
     """
     def emit(self, record):
         pass
 
 
-def get_logger(logger_name: str) -> logging.Logger:
-    logger = logging.getLogger(logger_name)
+def stop_listener() -> None:
+    global listener
+    if listener:
+        # Flushes whatever is still queued before the handlers are closed
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        listener = None
+
+
+def start_listener(json_output: bool = False, to_file: bool = True) -> None:
+    """(Re)starts the background thread that writes queued records out"""
+    global listener
+    stop_listener()
+    formatter = JsonFormatter() if json_output else FORMATTER
+    handlers = [get_console_handler(formatter)]
+    if to_file:
+        handlers.append(get_file_handler(formatter))
+    listener = QueueListener(LOG_QUEUE, *handlers, respect_handler_level=False)
+    listener.start()
+
+
+def configure(config: dict) -> None:
+    """Applies the `log_level` and `log_json` settings from the config file"""
+    start_listener(json_output=config.get("log_json", False))
+    set_level(config.get("log_level", logging.getLevelName(DEFAULT_LEVEL)))
 
-    logger.addHandler(get_console_handler())
-    file_handler = get_file_handler()
-    logger.addHandler(file_handler)
 
-    try:
-        logger.setLevel(logging.DEBUG)
-        logger.debug(f"Fetching logger for {logger_name}")
-    except PermissionError:
-        logger.removeHandler(file_handler)
-        file_handler.doRollover()
-        logger.addHandler(file_handler)
+def set_level(new_level: str | int) -> None:
+    """Raises ValueError, leaving the current level in place, if `new_level` isn't one of `LEVELS`"""
+    global level
+    if isinstance(new_level, str):
+        if new_level.upper() not in LEVELS:
+            raise ValueError(f"Unknown log level: {new_level}")
+        resolved = logging.getLevelName(new_level.upper())
+    else:
+        resolved = new_level
+    level = resolved
+    for name in logger_names:
+        logging.getLogger(name).setLevel(level)
 
-    logger.setLevel(logging.DEBUG)  # Modify this on production!
+
+def get_level() -> str:
+    return logging.getLevelName(level)
+
+
+def get_logger(logger_name: str) -> logging.Logger:
+    if listener is None:
+        start_listener()
+    logger = logging.getLogger(logger_name)
+    if QUEUE_HANDLER not in logger.handlers:
+        logger.addHandler(QUEUE_HANDLER)
+        logger.propagate = False
+    logger.setLevel(level)
+    logger_names.add(logger_name)
+    logger.debug("Fetching logger for %s", logger_name)
     return logger
 
 
 def shutdown_logger() -> None:
+    stop_listener()
     logging.shutdown()
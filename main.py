@@ -1,303 +1,789 @@
+import startup  # First, so that its clock includes every other import
+import asyncio
+import functools
+import io
+import math
 import sys
+import time
 
 import discord
 from discord import app_commands
 
-from client import fetch_config, Client
+from audit import AuditJournal
+from bans import BanList, parse_csv, parse_palworld
+from breaker import CLOSED, OPEN
+from chart import render_line_chart
+from client import AsyncClient, fetch_config
+from data import Ban
+from dispatch import Context, Dispatcher, Reply, format_timestamp
+from fleet import Fleet, FLEET_WIDE
+from history import PlayerHistory
+from livestatus import StatusBoard
+from output import EMBED_DESCRIPTION_LIMIT
+from parsing import parse_steam_ids
+from ratelimit import RateLimiter
+from scheduler import Scheduler
+from shards import ShardCoordinator, collect_metrics as collect_shard_metrics, minimal_intents
+from telemetry import Telemetry, TIERS
+from views import PlayerPages, STEAM_PROFILE_URL, format_player_preview
 import logger
+import metrics
+import settings
 
+startup.mark("imports")
 
 config = fetch_config()
+if not config:
+    logger.shutdown_logger()
+    sys.exit(1)
+logger.configure(config)
+startup.mark("config")
 log = logger.get_logger(__name__)
+fleet = Fleet(config)
+history = PlayerHistory.from_config(config)
+scheduler = Scheduler.from_config(fleet, config)
+telemetry = Telemetry.from_config(fleet, config)
+rate_limiter = RateLimiter.from_config(config)
+journal = AuditJournal.from_config(config)
+ban_list = BanList.from_config(fleet, config)
+startup.mark("services")
+
+MORE_PLAYERS_SUFFIX = "\n...and {count} more (`/online server:{server}`)"
+# Most Steam IDs accepted by `/kick_many` and `/ban_many`, so the results fit in one embed
+MAX_BATCH_PLAYERS = 20
+AUDIT_ENTRIES = 20
+# Largest file `/banlist_import` reads
+MAX_BANLIST_BYTES = 5_000_000
+
 
-STEAM_PROFILE_URL = "https://steamcommunity.com/profiles/{steam_id}/"
+def apply_config(previous: dict, new: dict) -> None:
+    """Reload listener; everything reads the module-level `config`, so swapping it is enough for most settings"""
+    global config
+    config = new
+    fleet.reconfigure(new)
+    dispatcher.reconfigure(new)
+    if previous.get("log_level") != new.get("log_level"):
+        logger.set_level(new.get("log_level", logger.get_level()))
 
 
-class DiscordClient(discord.Client):
+settings.MANAGER.add_listener(apply_config)
+
+
+class DiscordClient(discord.AutoShardedClient):
     def __init__(self, *args, **kwargs):
-        intents = discord.Intents.default()
-        intents.message_content = True
-        super().__init__(*args, **kwargs, intents=intents)
-        self.synced = False
+        super().__init__(*args, **kwargs, intents=minimal_intents(), shard_count=config.get("shard_count") or None)
+        self.started = False
+        # Set when shards run in worker processes; this process then never connects to the gateway itself
+        self.coordinator = ShardCoordinator.from_config(self, config) if config.get("shard_workers") else None
+
+    async def setup_hook(self):
+        startup.mark("login")
+        # Syncing is a rate-limited HTTP round trip, so it doesn't hold up anything else
+        self.loop.create_task(sync_commands())
+        settings.MANAGER.start()
+        await history.open()
+        for server_name, rcon_client in fleet.clients.items():
+            rcon_client.ROSTER.add_observer(functools.partial(history.observe, server_name))
+        history.start()
+        # Before the fleet starts polling, so the first roster is already checked
+        await ban_list.start()
+        await journal.start()
+        fleet.start()
+        scheduler.start()
+        await telemetry.start()
+        await status_board.start(self)
+        if config.get("metrics_port"):
+            fleet.collect_metrics()
+            collect_shard_metrics(self.shard_latencies)
+            self.metrics_server = await metrics.start_server(config.get("metrics_host", "127.0.0.1"), config["metrics_port"])
+        if config.get("admin_channel_id"):
+            self.loop.create_task(relay_breaker_events(config["admin_channel_id"]))
+        for server_name, rcon_client in fleet.clients.items():
+            if rcon_client.CONFIG.get("roster_channel_id"):
+                self.loop.create_task(relay_roster_events(server_name, rcon_client.CONFIG["roster_channel_id"]))
+        startup.mark("setup_hook")
+
+    async def close(self):
+        await settings.MANAGER.stop()
+        await scheduler.stop()
+        await telemetry.stop()
+        await status_board.stop()
+        await fleet.close()
+        await history.close()
+        await journal.close()
+        await super().close()
+
+    async def wait_until_ready(self):
+        if self.coordinator:
+            await self.coordinator.ready.wait()
+        else:
+            await super().wait_until_ready()
+
+    def shard_latencies(self) -> dict[int, float]:
+        return dict(self.coordinator.latencies if self.coordinator else self.latencies)
+
+    async def on_shard_ready(self, shard_id: int):
+        log.info(f"Shard {shard_id} connected")
 
     async def on_ready(self):
-        await self.wait_until_ready()
-        if not self.synced:
-            await tree.sync()
-            self.synced = True
+        if not self.started:
+            self.started = True
+            startup.mark("gateway")
+            startup.report()
         log.info("Bot is online!")
 
 
 discord_client = DiscordClient()
 tree = app_commands.CommandTree(discord_client)
+dispatcher = Dispatcher(tree, fleet, rate_limiter, config, journal)
+status_board = StatusBoard.from_config(fleet, dispatcher.format_embed, config)
 
 
 # Bot helper functions ---------------------------------------------------------
-def format_embed(embedded_message: discord.Embed) -> None:
-    embedded_message.set_footer(text=config["embed_footer"])
-    embedded_message.set_thumbnail(url=config["embed_thumbnail"])
+async def sync_commands() -> None:
+    """Syncs the command tree with Discord, unless it is unchanged since the last sync"""
+    path = config.get("tree_hash_path", startup.DEFAULT_TREE_HASH_PATH)
+    digest = startup.hash_commands([command.to_dict() for command in tree.get_commands()], discord_client.application_id)
+    if startup.is_synced(digest, path):
+        log.info("Slash commands unchanged since the last sync; not syncing")
+        return
+    try:
+        await tree.sync()
+    except discord.DiscordException as e:
+        log.error(f"Unable to sync slash commands: {e}")
+        return
+    startup.record_sync(digest, path)
+    log.info("Slash commands synced")
+
+
+async def server_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    current = current.lower()
+    return [
+        app_commands.Choice(name=server_name, value=server_name)
+        for server_name in fleet.names() if current in server_name.lower()
+    ][:25]
+
+
+async def online_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    choices = await server_autocomplete(interaction, current)
+    if len(fleet) > 1 and current.lower() in FLEET_WIDE:
+        choices.insert(0, app_commands.Choice(name=f"{FLEET_WIDE} (every server)", value=FLEET_WIDE))
+    return choices[:25]
+
+
+async def player_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    """Suggests players ever seen on the chosen server, by name (current or past) or Steam ID prefix"""
+    rcon_client = fleet.get(interaction.namespace.server)
+    if not rcon_client:
+        return []
+    try:
+        players = await history.search(rcon_client.NAME, current.strip())
+    except Exception as e:
+        log.error(f"Unable to search player history: {e}")
+        return []
+    return [
+        app_commands.Choice(name=f"{name} ({steam_id})"[:100], value=steam_id)
+        for steam_id, name in players
+    ]
+
+
+async def job_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    current = current.lower()
+    return [
+        app_commands.Choice(name=job_name, value=job_name)
+        for job_name in scheduler.jobs if current in job_name.lower()
+    ][:25]
+
+
+def check_steam_ids(steam_ids: str, **options) -> str | None:
+    if not 1 <= len(parse_steam_ids(steam_ids)) <= MAX_BATCH_PLAYERS:
+        return f"Give between 1 and {MAX_BATCH_PLAYERS} Steam IDs, separated by spaces or commas"
+    return None
+
+
+async def run_many(context: Context, targets: list[str], action: str) -> discord.Embed:
+    """Shared body of `/kick_many` and `/ban_many`; every command goes over one connection"""
+    rcon_client = context.client
+    players, _ = await rcon_client.online()
+    if action == "kick":
+        results = await rcon_client.kick_many(targets)
+    else:
+        results = await rcon_client.ban_many(targets)
+        await ban_list.add([
+            Ban(steam_id, name=players[steam_id].name if steam_id in players else "",
+                banned_by=str(context.interaction.user), banned_at=time.time())
+            for steam_id, result in zip(targets, results) if not result.error
+        ])
+    lines = []
+    for steam_id, result in zip(targets, results):
+        player = players.get(steam_id)
+        who = f"[{player.name}]({STEAM_PROFILE_URL.format(steam_id=steam_id)})" if player else f"`{steam_id}`"
+        lines.append(f"{who}: {result.error or result.response}")
+    failed = sum(1 for result in results if result.error)
+    return discord.Embed(
+        title=f"{'Kicking' if action == 'kick' else 'Banning'} {len(targets)} player(s)"
+              + (f" ({failed} failed)" if failed else ""),
+        colour=discord.Colour.blurple(),
+        description="\n".join(lines),
+    )
+
+
+async def relay_roster_events(server_name: str, channel_id: int) -> None:
+    """Posts player join/leave events from a server's roster poller to a channel"""
+    rcon_client = fleet.get(server_name)
+    queue = rcon_client.ROSTER.subscribe()
+    await discord_client.wait_until_ready()
+    try:
+        channel = discord_client.get_channel(channel_id) or await discord_client.fetch_channel(channel_id)
+    except discord.DiscordException as e:
+        log.error(f"Unable to find roster channel {channel_id}: {e}")
+        rcon_client.ROSTER.unsubscribe(queue)
+        return
+
+    while True:
+        event = await queue.get()
+        embed_message = discord.Embed(
+            title="Player Joined" if event.kind == "join" else "Player Left",
+            colour=discord.Colour.green() if event.kind == "join" else discord.Colour.red(),
+            description=f"[{event.name}]({STEAM_PROFILE_URL.format(steam_id=event.steam_id)})",
+        )
+        dispatcher.format_embed(embed_message, server_name)
+        try:
+            await channel.send(embed=embed_message)
+        except discord.DiscordException as e:
+            log.error(f"Unable to send roster event: {e}")
+
+
+async def relay_breaker_events(channel_id: int) -> None:
+    """Posts to the admin channel whenever a server goes offline or comes back"""
+    queue = asyncio.Queue()
+    for rcon_client in fleet.clients.values():
+        rcon_client.BREAKER.add_listener(lambda server_name, state: queue.put_nowait((server_name, state)))
+    await discord_client.wait_until_ready()
+    try:
+        channel = discord_client.get_channel(channel_id) or await discord_client.fetch_channel(channel_id)
+    except discord.DiscordException as e:
+        log.error(f"Unable to find admin channel {channel_id}: {e}")
+        return
+
+    while True:
+        server_name, state = await queue.get()
+        if state not in (OPEN, CLOSED):
+            # Probes are too frequent (and too short-lived) to be worth a message
+            continue
+        rcon_client = fleet.get(server_name)
+        embed_message = discord.Embed(
+            title="Server Offline" if state == OPEN else "Server Back Online",
+            colour=discord.Colour.red() if state == OPEN else discord.Colour.green(),
+            description=(
+                f"{rcon_client.BREAKER.failures} RCON commands in a row failed; "
+                f"commands will fail fast until the server responds again"
+                if state == OPEN else "RCON commands are going through again"
+            ),
+        )
+        dispatcher.format_embed(embed_message, server_name)
+        try:
+            await channel.send(embed=embed_message)
+        except discord.DiscordException as e:
+            log.error(f"Unable to send server status change: {e}")
 
 
 # Start of Slash Commands ------------------------------------------------------
-@tree.command(
+@dispatcher.command(
     name="info",
     description="Get server information",
+    rate_limited=True,
+    peek=AsyncClient.peek_info,
+    error="Unable to fetch/send game server info",
 )
-async def info(interaction: discord.Interaction):
-    await interaction.response.defer()
-    embed_message = None
-    error = config["generic_bot_error"]
-    try:
-        rcon_client = Client(config=config)
-        server_info, error_message = rcon_client.info()
-        if error_message:
-            error = error_message
-        if server_info:
-            embed_message = discord.Embed(
-                title=server_info.name,
-                colour=discord.Colour.blurple(),
-                description=f"Server Version: {server_info.version}",
-            )
-            format_embed(embed_message)
-    except Exception as e:
-        log.error(f"Unable to fetch/send game server info: {e}")
-    if embed_message:
-        await interaction.followup.send(embed=embed_message)
-    else:
-        await interaction.followup.send(content=error)
-
-
-@tree.command(
+@app_commands.autocomplete(server=server_autocomplete)
+async def info(context: Context, server: str = None):
+    server_info, error_message = context.cached or await context.client.info()
+    if not server_info:
+        return error_message or config["generic_bot_error"]
+    return discord.Embed(
+        title=server_info.name,
+        colour=discord.Colour.blurple(),
+        description=f"Server Version: {server_info.version}",
+    )
+
+
+@dispatcher.command(
     name="online",
     description="Get information about all online players",
+    fleet_wide=True,
+    rate_limited=True,
+    peek=AsyncClient.peek_online,
+    error="Unable to fetch/send metadata of connected players",
 )
-async def online(interaction: discord.Interaction):
-    await interaction.response.defer()
-    embed_message = None
-    error = config["generic_bot_error"]
-    try:
-        rcon_client = Client(config=config)
-        players, error_message = rcon_client.online()
-        if error_message:
-            error = error_message
-        player_count = len(players)
-        embed_message = discord.Embed(
+@app_commands.autocomplete(server=online_autocomplete)
+async def online(context: Context, server: str = None):
+    if not context.client:
+        return await online_all(context)
+    players, _ = context.cached or await context.client.online()
+
+    def make_embed() -> discord.Embed:
+        return context.format_embed(discord.Embed(
             title="Players Online",
             colour=discord.Colour.blurple(),
-            description=f"Player(s) Online: {player_count}",
-        )
-        format_embed(embed_message)
-
-        # TODO: Add a pagination system for when there are a lot of players online
-        if player_count:
-            buffer = []
-            for key, value in players.items():
-                buffer.append(f"[{value}]({STEAM_PROFILE_URL.format(steam_id=key)})")
-            embed_message.add_field(name="Players", value="\n".join(buffer), inline=False)
-    except Exception as e:
-        log.error(f"Unable to fetch/send metadata of connected players: {e}")
-    if embed_message:
-        await interaction.followup.send(embed=embed_message)
-    else:
-        await interaction.followup.send(content=error)
+            description=f"Player(s) Online: {len(players)}",
+        ))
+
+    view = PlayerPages(players, make_embed)
+    return Reply(embed=view.render(), view=view if view.page_count > 1 else None)
+
+
+async def online_all(context: Context) -> discord.Embed:
+    """Fleet-wide `/online`; every server is queried concurrently"""
+    results = await fleet.online()
+    player_count = sum(len(players) for players, _ in results.values())
+    embed_message = discord.Embed(
+        title="Players Online",
+        colour=discord.Colour.blurple(),
+        description=f"Player(s) Online: {player_count} across {len(results)} server(s)",
+    )
+    for server_name, (players, error_message) in results.items():
+        if error_message:
+            value = error_message
+        elif not players:
+            value = "No players online"
+        else:
+            # Only the first page fits in a shared embed; the rest is a `/online` away
+            value = format_player_preview(
+                list(players.values()),
+                lambda count: MORE_PLAYERS_SUFFIX.format(count=count, server=server_name),
+            )
+        embed_message.add_field(name=f"{server_name} ({len(players)})", value=value, inline=False)
+    return embed_message
 
 
-@tree.command(
+@dispatcher.command(
+    name="status",
+    description="Show whether each server is reachable, without contacting it",
+    server=False,
+    check=lambda server=None: dispatcher.unknown_server(server) if server and not fleet.get(server) else None,
+    defer=False,
+)
+@app_commands.autocomplete(server=server_autocomplete)
+async def status(context: Context, server: str = None):
+    embed_message = discord.Embed(title="Server Status", colour=discord.Colour.blurple())
+    for server_name, rcon_client in fleet.clients.items():
+        if server and server_name != server:
+            continue
+        breaker = rcon_client.BREAKER
+        if rcon_client.is_offline():
+            state = f"Offline (retrying {format_timestamp(time.time() + breaker.retry_in())})"
+        elif breaker.state != CLOSED:
+            state = "Reconnecting"
+        elif breaker.failures:
+            state = f"Online ({breaker.failures} recent failure(s))"
+        else:
+            state = "Online"
+        embed_message.add_field(
+            name=server_name,
+            value=f"{state}\nLast reached: {format_timestamp(breaker.last_success)}",
+            inline=False,
+        )
+    return embed_message
+
+
+@dispatcher.command(
+    name="status_message",
+    description="Post a message here that keeps showing the server's status and online players",
+    admin=True,
+    audit=True,
+    offline=True,
+    defer=False,
+    ephemeral=True,
+    error="Unable to post status message",
+)
+@app_commands.autocomplete(server=server_autocomplete)
+async def status_message(context: Context, server: str = None):
+    await status_board.post(context.interaction.channel, context.client.NAME)
+    return "Posted; it updates itself as players come and go. Delete it to stop the updates"
+
+
+# Series name: (chart title, value format, fixed y-axis range or None to fit the data)
+STATS_SERIES = {
+    "players": ("Players Online", "{:.0f}", (0, None)),
+    "latency": ("RCON Latency", "{:.0f} ms", (0, None)),
+    "availability": ("Availability", "{:.0%}", (0, 1)),
+}
+
+
+@dispatcher.command(
+    name="stats",
+    description="Chart a server's player count, RCON latency or availability over time",
+    offline=True,
+    check=lambda **options: None if telemetry.task else "Telemetry is disabled (`telemetry_interval = 0`)",
+    rate_limited=True,
+    defer=False,
+    error="Unable to chart telemetry",
+)
+@app_commands.choices(
+    metric=[
+        app_commands.Choice(name="Players online", value="players"),
+        app_commands.Choice(name="RCON latency", value="latency"),
+        app_commands.Choice(name="Availability", value="availability"),
+    ],
+    window=[app_commands.Choice(name=f"Last {tier}", value=tier) for tier in TIERS],
+)
+@app_commands.autocomplete(server=server_autocomplete)
+async def stats(
+    context: Context,
+    metric: app_commands.Choice[str],
+    window: app_commands.Choice[str] = None,
+    server: str = None,
+):
+    tier = window.value if window else next(iter(TIERS))
+    title, value_format, (low, high) = STATS_SERIES[metric.value]
+    values = telemetry.series(context.client.NAME, metric.value, tier)
+    known = [value for value in values if not math.isnan(value)]
+    # Rendering is pure Python, so it runs in a worker thread
+    png = await asyncio.to_thread(render_line_chart, values, low, high)
+    embed_message = discord.Embed(
+        title=f"{title} (last {tier})",
+        colour=discord.Colour.blurple(),
+        description=(
+            f"Now: {value_format.format(known[-1])} · Min: {value_format.format(min(known))} · "
+            f"Max: {value_format.format(max(known))} · Average: {value_format.format(sum(known) / len(known))}"
+            if known else "No samples yet"
+        ),
+    )
+    embed_message.set_image(url="attachment://stats.png")
+    return Reply(embed=embed_message, file=discord.File(io.BytesIO(png), filename="stats.png"))
+
+
+@dispatcher.command(
     name="save",
     description="Save the game server state",
+    admin=True,
+    audit=True,
+    error="Unable to save game server state",
 )
-@app_commands.checks.has_permissions(administrator=True)
-async def save(interaction: discord.Interaction):
-    await interaction.response.defer()
-    embed_message = None
-    error = config["generic_bot_error"]
-    try:
-        rcon_client = Client(config=config)
-        response = rcon_client.save()
+@app_commands.autocomplete(server=server_autocomplete)
+async def save(context: Context, server: str = None):
+    response = await context.client.save()
+    return discord.Embed(
+        title="Server Saving",
+        colour=discord.Colour.blurple(),
+        description=response,
+    )
 
-        embed_message = discord.Embed(
-            title="Server Saving",
-            colour=discord.Colour.blurple(),
-            description=response,
-        )
-        format_embed(embed_message)
-    except Exception as e:
-        log.error(f"Unable to save game server state: {e}")
-    if embed_message:
-        await interaction.followup.send(embed=embed_message)
-    else:
-        await interaction.followup.send(content=error)
 
-@save.error
-async def save_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    if isinstance(error, app_commands.MissingPermissions):
-        await interaction.response.send_message("You do not have the required permissions to use this command.")
-
-@tree.command(
+@dispatcher.command(
     name="shutdown",
     description="Shutdown the server, with optional message and delay",
+    admin=True,
+    audit=True,
+    error="Unable to shutdown game server",
 )
-@app_commands.checks.has_permissions(administrator=True)
-async def shutdown(interaction: discord.Interaction, seconds: int, message: str):
-    await interaction.response.defer()
-    embed_message = None
-    error = config["generic_bot_error"]
-    try:
-        rcon_client = Client(config=config)
-
-        # remove spaces
-        formatted_message = message.replace(" ", "_")
+@app_commands.autocomplete(server=server_autocomplete)
+async def shutdown(context: Context, seconds: int, message: str, server: str = None):
+    # remove spaces
+    formatted_message = message.replace(" ", "_")
 
-        response = rcon_client.shutdown(str(seconds), formatted_message)
-        embed_message = discord.Embed(
-            title="Server Shutdown",
-            colour=discord.Colour.blurple(),
-            description=response,
-        )
-        format_embed(embed_message)
-    except Exception as e:
-        log.error(f"Unable to shutdown game server: {e}")
-    if embed_message:
-        await interaction.followup.send(embed=embed_message)
-    else:
-        await interaction.followup.send(content=error)
+    response = await context.client.shutdown(str(seconds), formatted_message)
+    return discord.Embed(
+        title="Server Shutdown",
+        colour=discord.Colour.blurple(),
+        description=response,
+    )
 
-@shutdown.error
-async def shutdown_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    if isinstance(error, app_commands.MissingPermissions):
-        await interaction.response.send_message("You do not have the required permissions to use this command.")
 
-@tree.command(
+@dispatcher.command(
     name="announce",
     description="Make an announcement in-game (spaces replaced with underscores)",
+    admin=True,
+    audit=True,
+    error="Unable to make game announcement",
 )
-@app_commands.checks.has_permissions(administrator=True)
-async def announce(interaction: discord.Interaction, message: str):
-    await interaction.response.defer()
-    embed_message = None
-    error = config["generic_bot_error"]
-    try:
-        rcon_client = Client(config=config)
-
-        # remove spaces
-        formatted_message = message.replace(" ", "_")
-
-        response = rcon_client.announce(formatted_message)
+@app_commands.autocomplete(server=server_autocomplete)
+async def announce(context: Context, message: str, server: str = None):
+    # remove spaces
+    formatted_message = message.replace(" ", "_")
 
-        embed_message = discord.Embed(
-            title="Making In-game Announcement",
-            colour=discord.Colour.blurple(),
-            description=response,
-        )
-        format_embed(embed_message)
-    except Exception as e:
-        log.error(f"Unable to make game announcement: {e}")
-    if embed_message:
-        await interaction.followup.send(embed=embed_message)
-    else:
-        await interaction.followup.send(content=error)
+    response = await context.client.announce(formatted_message)
+    return discord.Embed(
+        title="Making In-game Announcement",
+        colour=discord.Colour.blurple(),
+        description=response,
+    )
 
-@announce.error
-async def announce_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    if isinstance(error, app_commands.MissingPermissions):
-        await interaction.response.send_message("You do not have the required permissions to use this command.")
 
-@tree.command(
+@dispatcher.command(
     name="kick",
     description="Kick a player from the game using Steam ID",
+    admin=True,
+    audit=True,
+    error="Unable to kick player",
 )
-@app_commands.checks.has_permissions(administrator=True)
-async def kick(interaction: discord.Interaction, steam_id: str):
-    await interaction.response.defer()
-    embed_message = None
-    error = config["generic_bot_error"]
-    try:
-        rcon_client = Client(config=config)
-        player_ign = rcon_client.get_ign_from_steam_id(steam_id)
-        formatted_ign = f"[{player_ign}]({STEAM_PROFILE_URL.format(steam_id=steam_id)})" if player_ign else ""
-        response = rcon_client.kick(steam_id)
-
-        embed_message = discord.Embed(
-            title=f"Kicking player {formatted_ign}",
-            colour=discord.Colour.blurple(),
-            description=response,
-        )
-        format_embed(embed_message)
-    except Exception as e:
-        log.error(f"Unable to kick player: {e}")
-    if embed_message:
-        await interaction.followup.send(embed=embed_message)
-    else:
-        await interaction.followup.send(content=error)
-
-@kick.error
-async def kick_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    if isinstance(error, app_commands.MissingPermissions):
-        await interaction.response.send_message("You do not have the required permissions to use this command.")
-
-@tree.command(
+@app_commands.autocomplete(server=server_autocomplete, steam_id=player_autocomplete)
+async def kick(context: Context, steam_id: str, server: str = None):
+    player_ign = await context.client.get_ign_from_steam_id(steam_id)
+    formatted_ign = f"[{player_ign}]({STEAM_PROFILE_URL.format(steam_id=steam_id)})" if player_ign else ""
+    response = await context.client.kick(steam_id)
+    return discord.Embed(
+        title=f"Kicking player {formatted_ign}",
+        colour=discord.Colour.blurple(),
+        description=response,
+    )
+
+
+@dispatcher.command(
     name="ban_player",
     description="Ban a player using Steam ID",
+    admin=True,
+    audit=True,
+    error="Unable to ban player",
 )
-@app_commands.checks.has_permissions(administrator=True)
-async def ban_player(interaction: discord.Interaction, steam_id: str):
-    await interaction.response.defer()
-    embed_message = None
-    error = config["generic_bot_error"]
-    try:
-        rcon_client = Client(config=config)
-        player_ign = rcon_client.get_ign_from_steam_id(steam_id)
-        formatted_ign = f"[{player_ign}]({STEAM_PROFILE_URL.format(steam_id=steam_id)})" if player_ign else ""
-        response = rcon_client.ban(steam_id)
-
-        embed_message = discord.Embed(
-            title=f"Banning player {formatted_ign}",
-            colour=discord.Colour.blurple(),
-            description=response,
-        )
-        format_embed(embed_message)
-    except Exception as e:
-        log.error(f"Unable to ban player: {e}")
-    if embed_message:
-        await interaction.followup.send(embed=embed_message)
+@app_commands.autocomplete(server=server_autocomplete, steam_id=player_autocomplete)
+async def ban_player(context: Context, steam_id: str, server: str = None):
+    player_ign = await context.client.get_ign_from_steam_id(steam_id)
+    formatted_ign = f"[{player_ign}]({STEAM_PROFILE_URL.format(steam_id=steam_id)})" if player_ign else ""
+    response = await context.client.ban(steam_id)
+    if response != context.client.GENERIC_ERROR:
+        await ban_list.add([Ban(steam_id, name=player_ign, banned_by=str(context.interaction.user), banned_at=time.time())])
+    return discord.Embed(
+        title=f"Banning player {formatted_ign}",
+        colour=discord.Colour.blurple(),
+        description=response,
+    )
+
+
+@dispatcher.command(
+    name="kick_many",
+    description="Kick several players at once, using Steam IDs separated by spaces or commas",
+    admin=True,
+    audit=True,
+    check=check_steam_ids,
+    error="Unable to kick players",
+)
+@app_commands.autocomplete(server=server_autocomplete)
+async def kick_many(context: Context, steam_ids: str, server: str = None):
+    return await run_many(context, parse_steam_ids(steam_ids), "kick")
+
+
+@dispatcher.command(
+    name="ban_many",
+    description="Ban several players at once, using Steam IDs separated by spaces or commas",
+    admin=True,
+    audit=True,
+    check=check_steam_ids,
+    error="Unable to ban players",
+)
+@app_commands.autocomplete(server=server_autocomplete)
+async def ban_many(context: Context, steam_ids: str, server: str = None):
+    return await run_many(context, parse_steam_ids(steam_ids), "ban")
+
+
+@dispatcher.command(
+    name="unban",
+    description="Remove a player from the ban list, and unban them on every server",
+    admin=True,
+    audit=True,
+    server=False,
+    error="Unable to unban player",
+)
+async def unban(context: Context, steam_id: str):
+    removed = await ban_list.remove(steam_id)
+    online_clients = [rcon_client for rcon_client in fleet.clients.values() if not rcon_client.is_offline()]
+    responses = await asyncio.gather(*(rcon_client.unban(steam_id) for rcon_client in online_clients))
+    return discord.Embed(
+        title=f"Unbanning {steam_id}",
+        colour=discord.Colour.blurple(),
+        description="\n".join(
+            ["Removed from the ban list" if removed else "Not on the ban list"]
+            + [f"{rcon_client.NAME}: {response}" for rcon_client, response in zip(online_clients, responses)]
+        ),
+    )
+
+
+@dispatcher.command(
+    name="banlist_import",
+    description="Add bans from a Palworld banlist.txt, or a CSV file with a steam_id column",
+    admin=True,
+    audit=True,
+    server=False,
+    error="Unable to import bans",
+)
+async def banlist_import(context: Context, file: discord.Attachment):
+    if file.size > MAX_BANLIST_BYTES:
+        return f"That file is too large; the limit is {MAX_BANLIST_BYTES // 1_000_000} MB"
+    text = (await file.read()).decode("utf-8-sig", errors="replace")
+    parse = parse_csv if file.filename.lower().endswith(".csv") else parse_palworld
+    bans = await asyncio.to_thread(parse, text)
+    added = await ban_list.add(bans)
+    return discord.Embed(
+        title="Ban List Imported",
+        colour=discord.Colour.blurple(),
+        description=(
+            f"{added} new ban(s), {len(bans) - added} already known; {len(ban_list)} in total.\n"
+            f"Banned players are kicked when next seen; `/banlist_sync` also bans them on a server"
+        ),
+    )
+
+
+@dispatcher.command(
+    name="banlist_export",
+    description="Download the ban list, as a Palworld banlist.txt or as CSV",
+    admin=True,
+    server=False,
+    ephemeral=True,
+    error="Unable to export bans",
+)
+@app_commands.choices(format=[
+    app_commands.Choice(name="Palworld banlist.txt", value="palworld"),
+    app_commands.Choice(name="CSV", value="csv"),
+])
+async def banlist_export(context: Context, format: app_commands.Choice[str]):
+    if format.value == "csv":
+        data, filename = ban_list.export_csv(), "bans.csv"
     else:
-        await interaction.followup.send(content=error)
-
-@ban_player.error
-async def ban_player_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    if isinstance(error, app_commands.MissingPermissions):
-        await interaction.response.send_message("You do not have the required permissions to use this command.")
-
-@tree.command(
+        data, filename = ban_list.export_palworld(), "banlist.txt"
+    return Reply(
+        content=f"{len(ban_list)} ban(s)",
+        file=discord.File(io.BytesIO(data.encode("utf-8")), filename=filename),
+    )
+
+
+@dispatcher.command(
+    name="banlist_sync",
+    description="Ban everyone on the ban list on a server, e.g. after a wipe",
+    admin=True,
+    audit=True,
+    error="Unable to apply the ban list",
+)
+@app_commands.autocomplete(server=server_autocomplete)
+async def banlist_sync(context: Context, server: str = None):
+    if not len(ban_list):
+        return "The ban list is empty"
+    results = await ban_list.apply(context.client.NAME)
+    failed = [result for result in results if result.error]
+    return discord.Embed(
+        title="Ban List Applied",
+        colour=discord.Colour.blurple(),
+        description=f"Banned {len(results) - len(failed)} of {len(results)} player(s)"
+                    + (f"; {len(failed)} failed (e.g. `{failed[0].command}`: {failed[0].error})" if failed else ""),
+    )
+
+
+@dispatcher.command(
     name="kill",
     description="Force-kill the server immediately",
+    admin=True,
+    audit=True,
+    error="Unable to forcibly terminate game server",
 )
-@app_commands.checks.has_permissions(administrator=True)
-async def kill(interaction: discord.Interaction):
-    await interaction.response.defer()
-    embed_message = None
-    error = config["generic_bot_error"]
-    try:
-        rcon_client = Client(config=config)
-
-        response = rcon_client.force_stop()
-        embed_message = discord.Embed(
-            title="Forcing Server Termination",
-            colour=discord.Colour.blurple(),
-            description=response,
+@app_commands.autocomplete(server=server_autocomplete)
+async def kill(context: Context, server: str = None):
+    response = await context.client.force_stop()
+    return discord.Embed(
+        title="Forcing Server Termination",
+        colour=discord.Colour.blurple(),
+        description=response,
+    )
+
+
+@dispatcher.command(
+    name="log_level",
+    description="Change how verbose the bot's logs are",
+    admin=True,
+    audit=True,
+    server=False,
+    defer=False,
+    ephemeral=True,
+)
+@app_commands.choices(level=[app_commands.Choice(name=name, value=name) for name in logger.LEVELS])
+async def log_level(context: Context, level: app_commands.Choice[str]):
+    previous_level = logger.get_level()
+    logger.set_level(level.value)
+    log.info(f"Log level changed from {previous_level} to {level.value} by {context.interaction.user}")
+    return f"Log level changed from {previous_level} to {level.value}"
+
+
+@dispatcher.command(
+    name="schedule",
+    description="List scheduled saves, announcements and shutdowns",
+    admin=True,
+    server=False,
+    defer=False,
+    ephemeral=True,
+)
+async def schedule(context: Context):
+    embed_message = discord.Embed(
+        title="Scheduled Jobs",
+        colour=discord.Colour.blurple(),
+        description=None if scheduler.jobs else "No jobs are scheduled",
+    )
+    for job in list(scheduler.jobs.values())[:25]:
+        embed_message.add_field(name=job.NAME, value=job.describe(), inline=False)
+    return embed_message
+
+
+@dispatcher.command(
+    name="schedule_cancel",
+    description="Cancel a scheduled job, including a shutdown countdown in progress",
+    admin=True,
+    audit=True,
+    server=False,
+    defer=False,
+    ephemeral=True,
+)
+@app_commands.autocomplete(job=job_autocomplete)
+async def schedule_cancel(context: Context, job: str):
+    if not await scheduler.cancel(job):
+        return f"No active job named `{job}`"
+    log.info(f"Scheduled job {job} cancelled by {context.interaction.user}")
+    return f"Cancelled `{job}`; `/schedule_resume` puts it back"
+
+
+@dispatcher.command(
+    name="schedule_resume",
+    description="Put a cancelled job back on the schedule",
+    admin=True,
+    audit=True,
+    server=False,
+    defer=False,
+    ephemeral=True,
+)
+@app_commands.autocomplete(job=job_autocomplete)
+async def schedule_resume(context: Context, job: str):
+    if not await scheduler.resume(job):
+        return f"No cancelled job named `{job}`"
+    log.info(f"Scheduled job {job} resumed by {context.interaction.user}")
+    return f"Resumed `{job}`"
+
+
+@dispatcher.command(
+    name="audit",
+    description="Show recent admin commands, optionally only those about one player",
+    admin=True,
+    server=False,
+    ephemeral=True,
+    error="Unable to search the audit journal",
+)
+@app_commands.autocomplete(steam_id=player_autocomplete)
+async def audit(context: Context, steam_id: str = None, hours: app_commands.Range[float, 0] = 24):
+    entries = await journal.search(steam_id=steam_id, since=time.time() - hours * 3600, limit=AUDIT_ENTRIES)
+    embed_message = discord.Embed(
+        title="Audit Journal" + (f" for {steam_id}" if steam_id else ""),
+        colour=discord.Colour.blurple(),
+        description=None if entries else f"No admin commands in the last {hours:g} hour(s)",
+    )
+    # Newest first; whatever doesn't fit is left off the end
+    for entry in entries:
+        invocation = " ".join([f"/{entry['command']}"] + [f"{name}:{value}" for name, value in entry["arguments"].items()])
+        response = entry["response"].split("\n", 1)[0][:100]
+        line = (
+            f"<t:{int(entry['timestamp'])}:f> **{entry['user']}** `{invocation}`\n"
+            f"> {entry['outcome']} in {entry['latency'] * 1000:.0f} ms" + (f": {response}" if response else "") + "\n"
         )
-        format_embed(embed_message)
-    except Exception as e:
-        log.error(f"Unable to forcibly terminate game server: {e}")
-    if embed_message:
-        await interaction.followup.send(embed=embed_message)
-    else:
-        await interaction.followup.send(content=error)
+        if len(embed_message.description or "") + len(line) > EMBED_DESCRIPTION_LIMIT:
+            break
+        embed_message.description = (embed_message.description or "") + line
+    return embed_message
 
-@kill.error
-async def kill_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    if isinstance(error, app_commands.MissingPermissions):
-        await interaction.response.send_message("You do not have the required permissions to use this command.")
 
 # End of Slash Commands --------------------------------------------------------
 def main(discord_bot_token):
@@ -308,7 +794,14 @@ def main(discord_bot_token):
     log.info("Configuration files loaded")
 
     log.info("Starting PalCON Discord Bot...")
-    discord_client.run(discord_bot_token)
+    if discord_client.coordinator:
+        discord.utils.setup_logging()
+        try:
+            asyncio.run(discord_client.coordinator.serve(discord_bot_token))
+        except KeyboardInterrupt:
+            pass
+    else:
+        discord_client.run(discord_bot_token)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+"""Minimal Prometheus-style metrics, served in the text exposition format.
+
+Only what the bot needs is implemented: counters, gauges and histograms with
+labels, plus collectors (callbacks) for values that already live elsewhere,
+such as pool and cache statistics. Enable the endpoint with `metrics_port`.
+"""
+import asyncio
+import bisect
+import time
+from typing import Callable, Iterable
+
+import logger
+
+log = logger.get_logger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (metric name, label values, value)
+Sample = tuple[str, dict[str, str], float]
+
+
+def escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in labels.items()) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    TYPE = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.NAME = name
+        self.DOCUMENTATION = documentation
+        self.LABELNAMES = labelnames
+
+    def key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.LABELNAMES)
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[Sample]:
+        for key, value in self.values.items():
+            yield f"{self.NAME}_total", dict(zip(self.LABELNAMES, key)), value
+
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self.key(labels)] = value
+
+    def samples(self) -> Iterable[Sample]:
+        for key, value in self.values.items():
+            yield self.NAME, dict(zip(self.LABELNAMES, key)), value
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.BUCKETS = tuple(sorted(buckets))
+        # key: (per-bucket counts, incl. +Inf; sum)
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.key(labels)
+        if key not in self.values:
+            self.values[key] = ([0] * (len(self.BUCKETS) + 1), [0.0])
+        counts, total = self.values[key]
+        counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        total[0] += value
+
+    def samples(self) -> Iterable[Sample]:
+        for key, (counts, total) in self.values.items():
+            labels = dict(zip(self.LABELNAMES, key))
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.NAME}_bucket", labels | {"le": format_value(bound)}, cumulative
+            yield f"{self.NAME}_count", labels, cumulative
+            yield f"{self.NAME}_sum", labels, total[0]
+
+
+class CollectedMetric(Metric):
+    """A metric whose samples are produced by a callback at scrape time"""
+    def __init__(self, name: str, documentation: str, metric_type: str, collect: Callable[[], Iterable[Sample]]):
+        super().__init__(name, documentation)
+        self.TYPE = metric_type
+        self.COLLECT = collect
+
+    def samples(self) -> Iterable[Sample]:
+        return self.COLLECT()
+
+
+# ------------------------------------------------------------------------------
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.NAME] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                log.error(f"Unable to collect metric {metric.NAME}: {e}")
+                continue
+            family = f"{metric.NAME}_total" if metric.TYPE == "counter" else metric.NAME
+            lines.append(f"# HELP {family} {metric.DOCUMENTATION}")
+            lines.append(f"# TYPE {family} {metric.TYPE}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+RCON_LATENCY = REGISTRY.register(Histogram(
+    "palcon_rcon_request_duration_seconds",
+    "RCON round-trip time per command",
+    ("server", "command"),
+))
+RCON_ERRORS = REGISTRY.register(Counter(
+    "palcon_rcon_errors",
+    "Failed RCON commands, by kind (timeout, auth, connection, protocol)",
+    ("server", "command", "kind"),
+))
+RCON_EMPTY_RESPONSES = REGISTRY.register(Counter(
+    "palcon_rcon_empty_responses",
+    "RCON commands that completed with an empty response",
+    ("server", "command"),
+))
+COMMAND_LATENCY = REGISTRY.register(Histogram(
+    "palcon_slash_command_duration_seconds",
+    "Slash command end-to-end latency, from the interaction to the followup being sent",
+    ("command",),
+))
+
+
+def register_collector(name: str, documentation: str, metric_type: str, collect: Callable[[], Iterable[Sample]]) -> None:
+    REGISTRY.register(CollectedMetric(name, documentation, metric_type, collect))
+
+
+class Timer:
+    """Context manager measuring elapsed wall time with `time.perf_counter()`"""
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.elapsed = time.perf_counter() - self.start
+
+
+# HTTP endpoint ----------------------------------------------------------------
+async def handle_scrape(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Drain the headers; nothing in them matters to us
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/metrics", "/"):
+            status, body = "200 OK", REGISTRY.render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"Not Found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError) as e:
+        log.debug(f"Metrics scrape aborted: {e}")
+    finally:
+        writer.close()
+
+
+async def start_server(host: str, port: int) -> asyncio.Server:
+    server = await asyncio.start_server(handle_scrape, host, port)
+    log.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
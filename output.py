@@ -0,0 +1,206 @@
+"""Output stage: fits replies into Discord's message limits.
+
+Sizes are measured from string lengths alone, so a reply that fits is sent
+as it is at no extra cost. An oversized embed has its description split (at
+line breaks where possible) and its fields spread across several embeds,
+each message staying within 10 embeds and 6000 characters; oversized message
+content is split across several messages. Text too long for
+`MAX_SPLIT_MESSAGES` messages is attached as a file instead, gzip-compressed
+beyond `GZIP_THRESHOLD`.
+
+Nothing copies the raw output whole: each message's chunks are sliced off
+as that message is built, just before it is sent, and a file is encoded
+(and compressed) piece by piece as it is uploaded. Only an embed with fields
+is joined into one string before it is attached.
+"""
+import io
+import zlib
+from typing import Iterator
+
+import discord
+
+import logger
+
+log = logger.get_logger(__name__)
+
+CONTENT_LIMIT = 2000
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_TOTAL_LIMIT = 6000
+FIELD_NAME_LIMIT = 256
+FIELD_VALUE_LIMIT = 1024
+MAX_FIELDS = 25
+MAX_EMBEDS = 10
+# Name of the fields a long field's value continues in
+CONTINUED = "\u200b"
+# Messages a long output may be split across before it is attached as a file instead
+MAX_SPLIT_MESSAGES = 3
+# A message isn't given another embed for fewer characters than this
+MIN_CHUNK = 500
+# Characters beyond which an attached output is gzip-compressed
+GZIP_THRESHOLD = 1_000_000
+# Characters encoded at a time while a file is uploaded
+STREAM_CHUNK = 65536
+ATTACHED_NOTE = "The output is {length:,} characters long; see the attached `{filename}`"
+
+# (content, embeds, file) for one message
+Message = tuple[str | None, list[discord.Embed], discord.File | None]
+
+
+def cut(text: str, start: int, limit: int) -> tuple[int, int]:
+    """Where the chunk starting at `start` ends, and where the next begins; breaks at a newline if there is one"""
+    if len(text) - start <= limit:
+        return len(text), len(text)
+    end = text.rfind("\n", start, start + limit)
+    if end <= start:
+        return start + limit, start + limit
+    return end, end + 1
+
+
+def fits(content: str | None, embed_message: discord.Embed | None) -> bool:
+    if content and len(content) > CONTENT_LIMIT:
+        return False
+    if embed_message and (
+        len(embed_message.description or "") > EMBED_DESCRIPTION_LIMIT
+        or len(embed_message) > EMBED_TOTAL_LIMIT
+        or len(embed_message.fields) > MAX_FIELDS
+        or any(len(field.name) > FIELD_NAME_LIMIT or len(field.value) > FIELD_VALUE_LIMIT for field in embed_message.fields)
+    ):
+        return False
+    return True
+
+
+class TextStream(io.RawIOBase):
+    """Reads a string as UTF-8, optionally gzip-compressed, encoding it `STREAM_CHUNK` characters at a time"""
+    def __init__(self, text: str, compress: bool = False):
+        self.text = text
+        self.compress = compress
+        self.seek(0)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        # Only to rewind, which is all a retried upload needs
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if offset != 0 or whence not in (io.SEEK_SET, io.SEEK_CUR):
+            raise io.UnsupportedOperation("TextStream can only be rewound")
+        if whence == io.SEEK_SET:
+            self.offset = 0  # Characters of `text` encoded so far
+            self.position = 0  # Bytes read so far
+            self.pending = bytearray()
+            # wbits=31 writes a gzip header and trailer
+            self.compressor = zlib.compressobj(wbits=31) if self.compress else None
+            self.finished = False
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        while len(self.pending) < len(buffer) and not self.finished:
+            data = self.text[self.offset:self.offset + STREAM_CHUNK].encode("utf-8")
+            self.offset += STREAM_CHUNK
+            self.finished = self.offset >= len(self.text)
+            if self.compressor:
+                data = self.compressor.compress(data) + (self.compressor.flush() if self.finished else b"")
+            self.pending += data
+        count = min(len(buffer), len(self.pending))
+        buffer[:count] = self.pending[:count]
+        del self.pending[:count]
+        self.position += count
+        return count
+
+
+def attach(text: str, name: str) -> discord.File:
+    compress = len(text) > GZIP_THRESHOLD
+    filename = f"{name}.txt.gz" if compress else f"{name}.txt"
+    return discord.File(TextStream(text, compress), filename=filename)
+
+
+def split_text(text: str, limit: int) -> Iterator[str]:
+    start = 0
+    while start < len(text):
+        end, start_next = cut(text, start, limit)
+        yield text[start:end]
+        start = start_next
+
+
+def room(embeds: list[discord.Embed]) -> int:
+    """Characters a message holding `embeds` has left"""
+    return EMBED_TOTAL_LIMIT - sum(len(embed_message) for embed_message in embeds)
+
+
+def split_embed(embed_message: discord.Embed) -> Iterator[list[discord.Embed]]:
+    """The embed's description, then its fields, spread over as many embeds as it takes, grouped into messages"""
+    text = embed_message.description or ""
+    fields = [(field.name, field.value, field.inline) for field in embed_message.fields]
+    embed_message.description = None
+    embed_message.clear_fields()
+    # The title, author and footer stay with the first embed
+    current = embed_message
+    message = [current]
+    start = 0
+    while start < len(text):
+        if current.description:
+            if len(message) == MAX_EMBEDS or room(message) < MIN_CHUNK:
+                yield message
+                message = []
+            current = discord.Embed(colour=embed_message.colour)
+            message.append(current)
+        # Max, so the text still makes progress past a title or footer too long for any description to fit
+        end, start_next = cut(text, start, min(EMBED_DESCRIPTION_LIMIT, max(MIN_CHUNK, room(message))))
+        current.description = text[start:end]
+        start = start_next
+    for name, value, inline in fields:
+        for index, piece in enumerate(list(split_text(value, FIELD_VALUE_LIMIT)) or [value]):
+            field_name = (name if index == 0 else CONTINUED)[:FIELD_NAME_LIMIT]
+            size = len(field_name) + len(piece)
+            if len(current.fields) == MAX_FIELDS or size > room(message):
+                if len(message) == MAX_EMBEDS or size > room(message):
+                    yield message
+                    message = []
+                current = discord.Embed(colour=embed_message.colour)
+                message.append(current)
+            current.add_field(name=field_name, value=piece, inline=inline)
+    yield message
+
+
+def flatten(embed_message: discord.Embed) -> str:
+    """The embed's text, for attaching; a description on its own is used as it is, without a copy"""
+    if not embed_message.fields:
+        return embed_message.description or ""
+    return "\n\n".join(
+        ([embed_message.description] if embed_message.description else [])
+        + [f"{field.name}\n{field.value}" for field in embed_message.fields]
+    )
+
+
+def fit(content: str | None, embed_message: discord.Embed | None, name: str) -> Iterator[Message]:
+    """The messages to send in place of one reply; each is only built once the previous one has been sent"""
+    if fits(content, embed_message):
+        yield content, [embed_message] if embed_message else [], None
+        return
+    if content and len(content) > CONTENT_LIMIT:
+        if len(content) > MAX_SPLIT_MESSAGES * CONTENT_LIMIT:
+            log.debug(f"Attaching {len(content)} characters of /{name} output as a file")
+            file = attach(content, name)
+            yield ATTACHED_NOTE.format(length=len(content), filename=file.filename), [], file
+        else:
+            yield from ((chunk, [], None) for chunk in split_text(content, CONTENT_LIMIT))
+        content = None
+    if not embed_message:
+        return
+    if len(embed_message) > MAX_SPLIT_MESSAGES * EMBED_TOTAL_LIMIT:
+        text = flatten(embed_message)
+        log.debug(f"Attaching {len(text)} characters of /{name} output as a file")
+        file = attach(text, name)
+        embed_message.clear_fields()
+        embed_message.description = ATTACHED_NOTE.format(length=len(text), filename=file.filename)
+        yield content, [embed_message], file
+    elif not fits(None, embed_message):
+        for index, embeds in enumerate(split_embed(embed_message)):
+            yield (content if index == 0 else None), embeds, None
+    else:
+        yield content, [embed_message], None
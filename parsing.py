@@ -0,0 +1,77 @@
+"""Parsers for raw RCON responses, and for Steam IDs typed into commands.
+
+`ShowPlayers` responses are of the format:
+    name,playeruid,steamid
+    <name>,<player uid>,<steam id>
+    ...
+
+Player names may themselves contain commas, so rows are split from the right.
+"""
+import re
+from typing import Iterator
+
+from data import Player, ServerInfo
+import logger
+
+log = logger.get_logger(__name__)
+
+PLAYERS_HEADER = "name,playeruid,steamid"
+
+
+def iter_players(res: str) -> Iterator[Player]:
+    """Yields a `Player` per row, without splitting the whole response up front
+
+    Malformed rows are skipped (and logged); the rows after them are still parsed.
+    """
+    start = 0
+    length = len(res)
+    skipped = 0
+    while start < length:
+        end = res.find("\n", start)
+        if end < 0:
+            end = length
+        line = res[start:end].rstrip("\r")
+        is_first_line = start == 0
+        start = end + 1
+
+        if not line or (is_first_line and line == PLAYERS_HEADER):
+            continue
+        fields = line.rsplit(",", 2)
+        if len(fields) < 3 or not fields[2]:
+            skipped += 1
+            log.debug(f"Skipping malformed player row: {line!r}")
+            continue
+        yield Player(fields[0], fields[1], fields[2])
+
+    if skipped:
+        log.error(f"Unable to parse {skipped} player row(s), players are missing some information")
+
+
+def get_indices_from_info(res: str) -> tuple[int, int, int]:
+    """Returns the (version start, version end, name start) indices of an `Info` response
+
+    The response looks like `Welcome to Pal Server[v0.1.4.1] <server name>`;
+    every index is -1 if no bracketed version could be found.
+    """
+    version_number_end_index = res.find("]")
+    if version_number_end_index < 0:
+        return -1, -1, -1
+    version_number_start_index = res.rfind("[", 0, version_number_end_index)
+    if version_number_start_index < 0:
+        return -1, -1, -1
+    return version_number_start_index + 1, version_number_end_index, version_number_end_index + 2
+
+
+def parse_server_info(res: str) -> ServerInfo | None:
+    version_start_index, version_end_index, name_index = get_indices_from_info(res)
+    if version_start_index < 0:
+        return None
+    return ServerInfo(
+        version=res[version_start_index:version_end_index],
+        name=res[name_index:],
+    )
+
+
+def parse_steam_ids(text: str) -> list[str]:
+    """Splits a space or comma separated list of Steam IDs, dropping duplicates"""
+    return list(dict.fromkeys(steam_id for steam_id in re.split(r"[\s,]+", text) if steam_id))
@@ -0,0 +1,144 @@
+"""Background roster poller; keeps an in-memory snapshot of online players.
+
+Every successful `ShowPlayers` response (whether from the poll loop or a
+live query) is diffed against the previous snapshot by Steam ID, and
+join/leave events are published to every subscriber queue. Observers are
+called synchronously with every snapshot and its events.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from data import Player, RosterEvent
+import logger
+
+log = logger.get_logger(__name__)
+
+DEFAULT_INTERVAL = 10
+DEFAULT_MAX_INTERVAL = 60
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class RosterPoller:
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[tuple[dict[str, Player], str]]],
+        interval: float = DEFAULT_INTERVAL,
+        max_interval: float = DEFAULT_MAX_INTERVAL,
+    ):
+        self.FETCH = fetch
+        self.INTERVAL = interval
+        self.MAX_INTERVAL = max(interval, max_interval)
+        self.current_interval = interval
+        self.snapshot: dict[str, Player] = {}  # { Key (Steam ID): Value (Player) }
+        self.updated_at = 0.0  # time.monotonic() of the last successful update
+        self.stale = False  # Set when a command (e.g. a kick) changed the roster; cleared by the next update
+        self.generation = 0  # Bumped by `invalidate()`, so a fetch that started before it can't clear `stale`
+        self.subscribers: list[asyncio.Queue] = []
+        self.observers: list[Callable[[dict[str, Player], list[RosterEvent]], None]] = []
+        self.task: asyncio.Task | None = None
+
+    @classmethod
+    def from_config(cls, fetch, config: dict) -> "RosterPoller":
+        return cls(
+            fetch,
+            interval=config.get("roster_poll_interval", DEFAULT_INTERVAL),
+            max_interval=config.get("roster_poll_max_interval", DEFAULT_MAX_INTERVAL),
+        )
+
+    # Snapshot ---------------------------------------------------------------------
+    def is_fresh(self) -> bool:
+        """Whether the snapshot is recent enough to answer queries without RCON
+
+        While polling is backed off (empty server), the snapshot goes stale on
+        purpose, so queries fall through to a live `ShowPlayers`; so does it
+        once `invalidate()` has been called.
+        """
+        if not self.updated_at or self.stale:
+            return False
+        return time.monotonic() - self.updated_at <= self.INTERVAL * 2
+
+    def invalidate(self) -> None:
+        """Marks the snapshot out of date until the next update; it is kept, so that update still diffs against it"""
+        self.stale = True
+        self.generation += 1
+
+    def update(self, players: dict[str, Player], generation: int | None = None) -> list[RosterEvent]:
+        """Swaps in a new snapshot, publishing the differences as events
+
+        `generation` is `self.generation` from when the fetch started, if known.
+        """
+        now = time.time()
+        previous = self.snapshot
+        if not self.updated_at:
+            # The first snapshot is only a baseline; everyone in it was already online
+            previous = players
+        events = [
+            RosterEvent(kind="join", steam_id=steam_id, name=player.name, timestamp=now)
+            for steam_id, player in players.items() if steam_id not in previous
+        ]
+        events.extend(
+            RosterEvent(kind="leave", steam_id=steam_id, name=player.name, timestamp=now)
+            for steam_id, player in previous.items() if steam_id not in players
+        )
+        self.snapshot = players
+        self.updated_at = time.monotonic()
+        if generation is None or generation == self.generation:
+            self.stale = False
+        if players:
+            self.current_interval = self.INTERVAL
+        for event in events:
+            self.publish(event)
+        for observer in self.observers:
+            observer(players, events)
+        return events
+
+    # Subscribers ------------------------------------------------------------------
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        if queue in self.subscribers:
+            self.subscribers.remove(queue)
+
+    def add_observer(self, observer: Callable[[dict[str, Player], list[RosterEvent]], None]) -> None:
+        """Calls `observer(players, events)` after every update; it must not block"""
+        self.observers.append(observer)
+
+    def publish(self, event: RosterEvent) -> None:
+        for queue in self.subscribers:
+            if queue.full():
+                # A slow subscriber loses its oldest event rather than stalling the poller
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    # Poll loop --------------------------------------------------------------------
+    def start(self) -> None:
+        if self.INTERVAL <= 0 or self.task:
+            return
+        log.info(f"Starting roster poller (every {self.INTERVAL}s)")
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if not self.task:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def run(self) -> None:
+        while True:
+            try:
+                # Successful fetches call back into `update()`
+                _, error_message = await self.FETCH()
+                if error_message or not self.snapshot:
+                    # Back off while the server is empty or unreachable
+                    self.current_interval = min(self.current_interval * 2, self.MAX_INTERVAL)
+            except Exception as e:
+                log.error(f"Roster poll failed: {e}")
+            await asyncio.sleep(self.current_interval)
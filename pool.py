@@ -0,0 +1,217 @@
+"""Pool of persistent, authenticated RCON connections.
+
+Connections are handed out one command at a time and returned afterwards, so
+consecutive commands (e.g. `ShowPlayers` then `KickPlayer`) reuse the same
+socket instead of paying for a TCP handshake and RCON auth every time.
+"""
+import asyncio
+import collections
+import contextlib
+import time
+
+from priority import QUERY, command_priority
+from transport import AsyncConsole
+import logger
+import metrics
+
+log = logger.get_logger(__name__)
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_IDLE_TIMEOUT = 300
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+# Settings that a pool's connections are made with; changing any of them needs a new pool
+CONNECTION_SETTINGS = ("ip", "port", "password", "timeout_duration", "pool_size", "pool_idle_timeout")
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        password: str,
+        timeout: float,
+        size: int = DEFAULT_POOL_SIZE,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    ):
+        self.HOST = host
+        self.PORT = port
+        self.PASSWORD = password
+        self.TIMEOUT = timeout
+        self.SIZE = max(1, size)
+        self.IDLE_TIMEOUT = idle_timeout
+        # (console, time it was returned to the pool); most recently used on the right
+        self.idle: collections.deque[tuple[AsyncConsole, float]] = collections.deque()
+        self.slots = asyncio.Semaphore(self.SIZE)
+        self.in_use = 0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.created = 0
+        self.evicted = 0
+        # Set once the pool is being replaced; returned connections are then retired instead of reused
+        self.draining = False
+        self.retired: list[AsyncConsole] = []
+        self.drained = asyncio.Event()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ConnectionPool":
+        return cls(
+            host=config["ip"],
+            port=config["port"],
+            password=config["password"],
+            timeout=config["timeout_duration"],
+            size=config.get("pool_size", DEFAULT_POOL_SIZE),
+            idle_timeout=config.get("pool_idle_timeout", DEFAULT_IDLE_TIMEOUT),
+        )
+
+    # Health checks ----------------------------------------------------------------
+    def is_healthy(self, console: AsyncConsole, last_used: float) -> bool:
+        """Cheap, local check; no packets are sent
+
+        Dead peers are detected by TCP keepalive (enabled on every socket), and
+        a peer that closed its end shows up as EOF on the reader.
+        """
+        if time.monotonic() - last_used > self.IDLE_TIMEOUT:
+            return False
+        return console.is_open() and not console.reader.at_eof()
+
+    async def evict(self, console: AsyncConsole) -> None:
+        self.evicted += 1
+        await console.close()
+
+    # Connection lifecycle ---------------------------------------------------------
+    async def connect(self) -> AsyncConsole:
+        now = time.monotonic()
+        if now < self.retry_at:
+            # Fail fast rather than hammering a server that just refused us
+            raise ConnectionError(f"Reconnect backing off for another {self.retry_at - now:.1f}s")
+        console = AsyncConsole(
+            host=self.HOST,
+            port=self.PORT,
+            password=self.PASSWORD,
+            timeout=self.TIMEOUT,
+        )
+        try:
+            await console.open()
+        except BaseException:
+            self.failures += 1
+            self.retry_at = time.monotonic() + min(BACKOFF_BASE * 2 ** (self.failures - 1), BACKOFF_MAX)
+            raise
+        self.failures = 0
+        self.retry_at = 0.0
+        self.created += 1
+        return console
+
+    async def acquire(self) -> tuple[AsyncConsole, bool]:
+        """Returns a connection, and whether it was reused from the pool"""
+        await self.slots.acquire()
+        try:
+            while self.idle:
+                console, last_used = self.idle.pop()
+                if self.is_healthy(console, last_used):
+                    self.in_use += 1
+                    return console, True
+                log.debug("Evicting stale RCON connection")
+                await self.evict(console)
+            console = await self.connect()
+        except BaseException:
+            self.slots.release()
+            raise
+        self.in_use += 1
+        return console, False
+
+    def release(self, console: AsyncConsole) -> None:
+        self.in_use -= 1
+        if not console.is_open():
+            self.evicted += 1
+        elif self.draining:
+            self.retired.append(console)
+        else:
+            self.idle.append((console, time.monotonic()))
+        self.slots.release()
+        if self.draining and not self.in_use:
+            self.drained.set()
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        console, _ = await self.acquire()
+        try:
+            yield console
+        finally:
+            self.release(console)
+
+    @staticmethod
+    def retryable(commands: list[str]) -> bool:
+        """Whether running `commands` again is harmless
+
+        A connection dropped mid-command may have delivered it anyway, so
+        only queries are retried; running a kick, ban or save twice isn't.
+        """
+        return all(command_priority(command) == QUERY for command in commands)
+
+    async def command(self, command: str, timer: metrics.Timer | None = None) -> str:
+        """`timer`, if given, times the command once it has a connection (and the retry, if there is one)"""
+        timer = timer or contextlib.nullcontext()
+        console, reused = await self.acquire()
+        try:
+            with timer:
+                return await console.command(command)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            if not (reused and self.retryable([command])):
+                raise
+            # The server may have dropped idle sockets without us noticing (e.g. it restarted);
+            # the rest of the idle connections are likely dead too, so retry a query once on a fresh one
+            log.debug("Pooled RCON connection was dropped, reconnecting")
+        finally:
+            self.release(console)
+        while self.idle:
+            stale, _ = self.idle.pop()
+            await self.evict(stale)
+        async with self.connection() as console:
+            with timer:
+                return await console.command(command)
+
+    async def batch(self, commands: list[str], timer: metrics.Timer | None = None) -> list[str | Exception]:
+        """Runs several commands over one pooled connection (see `AsyncConsole.batch`); `timer` as in `command()`"""
+        timer = timer or contextlib.nullcontext()
+        console, reused = await self.acquire()
+        try:
+            with timer:
+                results = await console.batch(commands)
+        finally:
+            self.release(console)
+        dropped = all(isinstance(result, (ConnectionError, asyncio.IncompleteReadError)) for result in results)
+        if not (reused and dropped and self.retryable(commands)):
+            return results
+        # Nothing was answered on a reused connection, so it was likely dropped while idle; as in `command()`
+        log.debug("Pooled RCON connection was dropped, reconnecting")
+        while self.idle:
+            stale, _ = self.idle.pop()
+            await self.evict(stale)
+        async with self.connection() as console:
+            with timer:
+                return await console.batch(commands)
+
+    async def close(self) -> None:
+        while self.idle:
+            console, _ = self.idle.pop()
+            await console.close()
+
+    async def drain(self) -> None:
+        """Closes every connection once the commands running on them have finished"""
+        self.draining = True
+        await self.close()
+        if self.in_use:
+            await self.drained.wait()
+        while self.retired:
+            await self.retired.pop().close()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": self.SIZE,
+            "idle": len(self.idle),
+            "in_use": self.in_use,
+            "created": self.created,
+            "evicted": self.evicted,
+            "failures": self.failures,
+        }
@@ -0,0 +1,154 @@
+"""Per-server priority queue for RCON command slots.
+
+Each server allows `max_concurrent_commands` commands in flight, but never
+more than its pool has connections, so commands only ever wait here, in
+priority order. When every slot is busy, waiting commands are served by
+class (emergency first, then admin mutations, then read-only queries),
+oldest first within a class.
+
+The queue is bounded by `queue_max_depth`. When it is full, a newcomer
+evicts the newest waiter of a lower class, or is refused if there is none.
+Read-only queries issued on behalf of a slash command carry a deadline (see
+`DEADLINE`), and are dropped rather than run once it has passed, since
+nobody would see their answer. Time spent waiting here is reported as
+`palcon_rcon_queue_wait_seconds`, apart from RCON execution time.
+"""
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator
+
+import logger
+import metrics
+
+log = logger.get_logger(__name__)
+
+DEFAULT_MAX_DEPTH = 32
+
+EMERGENCY = 0
+MUTATION = 1
+QUERY = 2
+PRIORITY_NAMES = {EMERGENCY: "emergency", MUTATION: "mutation", QUERY: "query"}
+# Command name: priority; anything else is an admin mutation
+COMMAND_PRIORITIES = {
+    "DoExit": EMERGENCY,
+    "Shutdown": EMERGENCY,
+    "Info": QUERY,
+    "ShowPlayers": QUERY,
+}
+
+# Event loop time (`loop.time()`) by which a read-only query must have started; set by whoever waits on the answer
+DEADLINE: ContextVar[float | None] = ContextVar("rcon_deadline", default=None)
+
+QUEUE_WAIT = metrics.REGISTRY.register(metrics.Histogram(
+    "palcon_rcon_queue_wait_seconds",
+    "Time RCON commands spent waiting for a free slot, by priority class",
+    ("server", "priority"),
+))
+QUEUE_DROPPED = metrics.REGISTRY.register(metrics.Counter(
+    "palcon_rcon_queue_dropped",
+    "RCON commands dropped before they ran, by reason (full, deadline)",
+    ("server", "priority", "reason"),
+))
+
+
+def command_priority(command: str) -> int:
+    return COMMAND_PRIORITIES.get(command.split(" ", 1)[0], MUTATION)
+
+
+class CommandDropped(Exception):
+    def __init__(self, reason: str):
+        super().__init__(f"dropped from the command queue ({reason})")
+        self.reason = reason
+
+
+class CommandQueue:
+    def __init__(self, name: str, slots: int, max_depth: int = DEFAULT_MAX_DEPTH):
+        self.NAME = name
+        self.MAX_DEPTH = max(1, max_depth)
+        self.SLOTS = max(1, slots)
+        # Invariant: slots are only ever free while nobody is waiting; negative after shrinking, until enough are released
+        self.available = self.SLOTS
+        # (priority, sequence, deadline, future); futures that are already done are skipped lazily
+        self.waiters: list[tuple[int, int, float | None, asyncio.Future]] = []
+        self.sequence = itertools.count()
+
+    def depth(self) -> int:
+        return sum(1 for waiter in self.waiters if not waiter[3].done())
+
+    def drop(self, waiter: tuple[int, int, float | None, asyncio.Future], reason: str) -> None:
+        QUEUE_DROPPED.inc(server=self.NAME, priority=PRIORITY_NAMES[waiter[0]], reason=reason)
+        waiter[3].set_exception(CommandDropped(reason))
+
+    async def acquire(self, priority: int, deadline: float | None = None) -> None:
+        if self.available > 0:
+            self.available -= 1
+            return
+        if priority != QUERY:
+            # Mutations are never dropped for being late; a late save is still a save
+            deadline = None
+        if self.depth() >= self.MAX_DEPTH:
+            victim = max((waiter for waiter in self.waiters if not waiter[3].done()), key=lambda waiter: waiter[:2])
+            if victim[0] <= priority:
+                QUEUE_DROPPED.inc(server=self.NAME, priority=PRIORITY_NAMES[priority], reason="full")
+                raise CommandDropped("full")
+            self.drop(victim, "full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.sequence), deadline, future))
+        try:
+            async with asyncio.timeout_at(deadline):
+                await future
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled() and not future.exception():
+                # Granted just as we gave up; pass the slot on
+                self.release()
+            else:
+                future.cancel()
+            if isinstance(e, TimeoutError):
+                QUEUE_DROPPED.inc(server=self.NAME, priority=PRIORITY_NAMES[priority], reason="deadline")
+                raise CommandDropped("deadline") from None
+            raise
+
+    def release(self) -> None:
+        if self.available < 0:
+            # Shrunk while this slot was in use; it is gone rather than handed on
+            self.available += 1
+            return
+        now = asyncio.get_running_loop().time()
+        while self.waiters:
+            waiter = heapq.heappop(self.waiters)
+            priority, _, deadline, future = waiter
+            if future.done():
+                continue
+            if deadline is not None and deadline <= now:
+                self.drop(waiter, "deadline")
+                continue
+            future.set_result(None)
+            return
+        self.available += 1
+
+    def resize(self, slots: int) -> None:
+        slots = max(1, slots)
+        change, self.SLOTS = slots - self.SLOTS, slots
+        if change < 0:
+            self.available += change
+        for _ in range(change):
+            # Each new slot makes up for a shrink still in use, or goes to a waiter, or becomes free
+            self.release()
+
+    @asynccontextmanager
+    async def slot(self, priority: int) -> AsyncIterator[None]:
+        """Holds a slot for the duration of the block; raises `CommandDropped` if none was granted"""
+        with metrics.Timer() as timer:
+            await self.acquire(priority, DEADLINE.get())
+        QUEUE_WAIT.observe(timer.elapsed, server=self.NAME, priority=PRIORITY_NAMES[priority])
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict[str, int]:
+        return {"depth": self.depth()}
@@ -0,0 +1,100 @@
+"""Token-bucket rate limiting for slash commands, per user and per guild."""
+import time
+
+import logger
+import metrics
+
+log = logger.get_logger(__name__)
+
+DEFAULT_USER_RATE = 0.2
+DEFAULT_USER_BURST = 3
+DEFAULT_GUILD_RATE = 1
+DEFAULT_GUILD_BURST = 10
+# Buckets that have refilled completely are dropped once a scope tracks this many
+MAX_TRACKED_BUCKETS = 10_000
+
+THROTTLED = metrics.REGISTRY.register(metrics.Counter(
+    "palcon_throttled_commands",
+    "Slash commands over a rate limit, by scope (user, guild) and outcome (cached, rejected)",
+    ("command", "scope", "outcome"),
+))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def is_full(self) -> bool:
+        self.refill()
+        return self.tokens >= self.burst
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        user_rate: float = DEFAULT_USER_RATE,
+        user_burst: float = DEFAULT_USER_BURST,
+        guild_rate: float = DEFAULT_GUILD_RATE,
+        guild_burst: float = DEFAULT_GUILD_BURST,
+    ):
+        self.LIMITS = {
+            "user": (user_rate, user_burst),
+            "guild": (guild_rate, guild_burst),
+        }
+        self.buckets: dict[str, dict[int, TokenBucket]] = {"user": {}, "guild": {}}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RateLimiter":
+        return cls(
+            user_rate=config.get("rate_limit_user_rate", DEFAULT_USER_RATE),
+            user_burst=config.get("rate_limit_user_burst", DEFAULT_USER_BURST),
+            guild_rate=config.get("rate_limit_guild_rate", DEFAULT_GUILD_RATE),
+            guild_burst=config.get("rate_limit_guild_burst", DEFAULT_GUILD_BURST),
+        )
+
+    def get_bucket(self, scope: str, key: int) -> TokenBucket:
+        buckets = self.buckets[scope]
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= MAX_TRACKED_BUCKETS:
+                self.prune(scope)
+            bucket = buckets[key] = TokenBucket(*self.LIMITS[scope])
+        else:
+            bucket.refill()
+        return bucket
+
+    def prune(self, scope: str) -> None:
+        buckets = self.buckets[scope]
+        idle = [key for key, bucket in buckets.items() if bucket.is_full()]
+        for key in idle:
+            del buckets[key]
+        log.debug(f"Pruned {len(idle)} idle {scope} rate limit buckets")
+
+    def check(self, user_id: int, guild_id: int | None) -> str | None:
+        """Takes a token from the user's and guild's buckets
+
+        Returns the scope ("user" or "guild") that is over its limit, or None.
+        No token is taken from either bucket if one of them is empty.
+        """
+        taken = [("user", self.get_bucket("user", user_id))]
+        if guild_id is not None:
+            taken.append(("guild", self.get_bucket("guild", guild_id)))
+        for scope, bucket in taken:
+            if bucket.tokens < 1:
+                return scope
+        for _, bucket in taken:
+            bucket.tokens -= 1
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {f"{scope}_buckets": len(buckets) for scope, buckets in self.buckets.items()}
@@ -0,0 +1,409 @@
+"""Scheduled saves, broadcasts and countdown shutdowns.
+
+Jobs are configured as `[[schedule]]` tables in `config.toml`:
+
+    [[schedule]]
+    name = "nightly-restart"
+    action = "shutdown"          # save, broadcast or shutdown
+    cron = "0 4 * * *"           # minute hour day month weekday, in local time
+    message = "Nightly restart"
+    countdown = [600, 300, 60]   # warnings broadcast this many seconds before
+
+    [[schedule]]
+    name = "autosave"
+    action = "save"
+    every = 900                  # seconds, instead of `cron`
+
+Every job (and every warning of a countdown) is an entry in one heap, which a
+single task sleeps on. When each job last ran, and which jobs an admin
+cancelled, is kept in a small JSON state file so both survive restarts.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from client import AsyncClient
+from fleet import Fleet, FLEET_WIDE
+import logger
+
+log = logger.get_logger(__name__)
+
+DEFAULT_STATE_PATH = "schedule_state.json"
+DEFAULT_COUNTDOWN = (600, 300, 60)
+DEFAULT_SHUTDOWN_DELAY = 10
+DEFAULT_WARNING = "Server shutting down in {time}"
+ACTIONS = ("save", "broadcast", "shutdown")
+# Re-checks the heap at least this often, so a wall clock change can't oversleep a job
+MAX_SLEEP = 60
+
+# minute, hour, day of month, month, day of week (0 or 7 = Sunday)
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+# Schedules --------------------------------------------------------------------
+def parse_cron_field(field: str, low: int, high: int) -> frozenset[int]:
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = end = int(part)
+            if step:
+                end = high
+        if not (low <= start <= end <= high):
+            raise ValueError(f"'{field}' is out of range {low}-{high}")
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return frozenset(values)
+
+
+class CronSchedule:
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression '{expression}' needs 5 fields")
+        self.EXPRESSION = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        # As in cron, a day matches either field when both are restricted
+        self.any_day = fields[2] != "*" and fields[4] != "*"
+        self.next_after(time.time())  # Rejects schedules that never fire, e.g. February 31st
+
+    def matches_day(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        return day or weekday if self.any_day else day and weekday
+
+    def next_after(self, timestamp: float) -> float:
+        """First matching minute strictly after `timestamp`"""
+        moment = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 4)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self.matches_day(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+        raise ValueError(f"cron expression '{self.EXPRESSION}' never matches")
+
+    def __str__(self) -> str:
+        return f"cron `{self.EXPRESSION}`"
+
+
+class IntervalSchedule:
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("`every` must be a positive number of seconds")
+        self.SECONDS = seconds
+
+    def next_after(self, timestamp: float) -> float:
+        return timestamp + self.SECONDS
+
+    def __str__(self) -> str:
+        return f"every {format_duration(self.SECONDS)}"
+
+
+def format_duration(seconds: float) -> str:
+    for unit, size in (("hour", 3600), ("minute", 60)):
+        if seconds >= size and seconds % size == 0:
+            count = int(seconds // size)
+            return f"{count} {unit}{'s' if count != 1 else ''}"
+    count = int(seconds)
+    return f"{count} second{'s' if count != 1 else ''}"
+
+
+# Jobs -------------------------------------------------------------------------
+class Job:
+    def __init__(
+        self,
+        name: str,
+        action: str,
+        schedule: CronSchedule | IntervalSchedule,
+        server: str = None,
+        message: str = "",
+        countdown: tuple[int, ...] = (),
+        warning: str = DEFAULT_WARNING,
+        delay: int = DEFAULT_SHUTDOWN_DELAY,
+        catch_up: bool = False,
+    ):
+        self.NAME = name
+        self.ACTION = action
+        self.SCHEDULE = schedule
+        self.SERVER = server
+        self.MESSAGE = message
+        self.WARNING = warning
+        self.DELAY = delay
+        self.CATCH_UP = catch_up
+        # (seconds relative to the scheduled time, step); a countdown warns before shutting down
+        self.STEPS = [(-seconds, "warn") for seconds in sorted(set(countdown), reverse=True)] + [(0, action)]
+        self.last_run = 0.0  # Scheduled time of the last run that completed
+        self.next_run = 0.0  # Scheduled time of the upcoming run
+        self.next_step = 0
+        self.cancelled = False
+        # Bumped on cancel; heap entries from an older generation are ignored
+        self.generation = 0
+
+    @classmethod
+    def from_config(cls, entry: dict) -> "Job":
+        name = entry.get("name")
+        if not name:
+            raise ValueError("every [[schedule]] entry needs a `name`")
+        action = entry.get("action")
+        if action not in ACTIONS:
+            raise ValueError(f"`action` must be one of {', '.join(ACTIONS)}")
+        if ("cron" in entry) == ("every" in entry):
+            raise ValueError("set exactly one of `cron` or `every`")
+        if action == "broadcast" and not entry.get("message"):
+            raise ValueError("broadcasts need a `message`")
+        schedule = CronSchedule(entry["cron"]) if "cron" in entry else IntervalSchedule(entry["every"])
+        return cls(
+            name,
+            action,
+            schedule,
+            server=entry.get("server"),
+            message=entry.get("message", ""),
+            countdown=tuple(entry.get("countdown", DEFAULT_COUNTDOWN)) if action == "shutdown" else (),
+            warning=entry.get("warning", DEFAULT_WARNING),
+            delay=entry.get("delay", DEFAULT_SHUTDOWN_DELAY),
+            # Catching up on a missed save is harmless; a stale broadcast or surprise shutdown is not
+            catch_up=entry.get("catch_up", action == "save"),
+        )
+
+    @property
+    def in_progress(self) -> bool:
+        """Whether a countdown has started but not finished"""
+        return self.next_step > 0
+
+    def describe(self) -> str:
+        target = self.SERVER or "default server"
+        status = "cancelled" if self.cancelled else f"next <t:{int(self.next_run)}:R>"
+        return f"`{self.ACTION}` on {target}, {self.SCHEDULE}; {status}"
+
+
+# Scheduler --------------------------------------------------------------------
+class Scheduler:
+    def __init__(self, fleet: Fleet, jobs: list[Job], state_path: str = DEFAULT_STATE_PATH):
+        self.FLEET = fleet
+        self.STATE_PATH = Path(state_path)
+        self.jobs: dict[str, Job] = {job.NAME: job for job in jobs}
+        self.heap: list[tuple[float, int, Job, int, int]] = []  # (when, sequence, job, step, generation)
+        self.sequence = itertools.count()
+        self.wakeup = asyncio.Event()
+        # Servers with a save in flight; another save on them is skipped rather than queued
+        self.saving: set[str] = set()
+        self.running: set[asyncio.Task] = set()
+        self.task: asyncio.Task | None = None
+
+    @classmethod
+    def from_config(cls, fleet: Fleet, config: dict) -> "Scheduler":
+        jobs = []
+        for entry in config.get("schedule", []):
+            try:
+                job = Job.from_config(entry)
+                if job.SERVER not in (None, FLEET_WIDE) and job.SERVER not in fleet.names():
+                    raise ValueError(f"unknown server `{job.SERVER}`")
+                if job.NAME in (existing.NAME for existing in jobs):
+                    raise ValueError("a job with this name already exists")
+            except (ValueError, TypeError) as e:
+                log.error(f"Ignoring scheduled job {entry.get('name', '(unnamed)')}: {e}")
+                continue
+            jobs.append(job)
+        return cls(fleet, jobs, config.get("schedule_state_path", DEFAULT_STATE_PATH))
+
+    # State file -------------------------------------------------------------------
+    def load_state(self) -> None:
+        try:
+            state = json.loads(self.STATE_PATH.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.error(f"Unable to read scheduler state from {self.STATE_PATH}: {e}")
+            return
+        for name, job_state in state.get("jobs", {}).items():
+            if name in self.jobs:
+                self.jobs[name].last_run = job_state.get("last_run", 0.0)
+                self.jobs[name].cancelled = job_state.get("cancelled", False)
+
+    def write_state(self, state: dict) -> None:
+        # Written beside the real file and swapped in, so a crash can't leave it half-written
+        temporary = self.STATE_PATH.with_suffix(".tmp")
+        temporary.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        os.replace(temporary, self.STATE_PATH)
+
+    async def save_state(self) -> None:
+        state = {
+            "jobs": {
+                name: {"last_run": job.last_run, "cancelled": job.cancelled}
+                for name, job in self.jobs.items()
+            }
+        }
+        try:
+            await asyncio.to_thread(self.write_state, state)
+        except OSError as e:
+            log.error(f"Unable to write scheduler state to {self.STATE_PATH}: {e}")
+
+    # Timer ------------------------------------------------------------------------
+    def push(self, job: Job, step: int) -> None:
+        job.next_step = step
+        when = job.next_run + job.STEPS[step][0]
+        heapq.heappush(self.heap, (when, next(self.sequence), job, step, job.generation))
+        self.wakeup.set()
+
+    def plan(self, job: Job, now: float) -> None:
+        """Queues the first step of the job's next run that is still ahead of `now`"""
+        after = job.last_run or now
+        job.next_run = job.SCHEDULE.next_after(after)
+        if job.next_run < now:
+            missed = job.next_run
+            job.next_run = job.SCHEDULE.next_after(now)
+            if job.CATCH_UP:
+                log.info(f"Scheduled job {job.NAME} missed its run at {datetime.fromtimestamp(missed)}; running it now")
+                # One catch-up run, however many were missed; a countdown still gets its warnings
+                job.next_run = now - job.STEPS[0][0]
+            else:
+                log.info(f"Scheduled job {job.NAME} missed its run at {datetime.fromtimestamp(missed)}; skipping it")
+        # Starting mid-countdown skips the warnings that are already in the past
+        step = next(index for index, (offset, _) in enumerate(job.STEPS) if job.next_run + offset >= now or offset == 0)
+        self.push(job, step)
+
+    def start(self) -> None:
+        if not self.jobs or self.task:
+            return
+        self.load_state()
+        now = time.time()
+        for job in self.jobs.values():
+            if not job.cancelled:
+                self.plan(job, now)
+        log.info(f"Scheduler started with {len(self.jobs)} job(s)")
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self) -> None:
+        while True:
+            self.wakeup.clear()
+            timeout = MAX_SLEEP
+            if self.heap:
+                when, _, job, step, generation = self.heap[0]
+                timeout = when - time.time()
+                if timeout <= 0:
+                    heapq.heappop(self.heap)
+                    if generation == job.generation:
+                        self.advance(job, step)
+                    continue
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=min(timeout, MAX_SLEEP))
+            except asyncio.TimeoutError:
+                pass
+
+    def advance(self, job: Job, step: int) -> None:
+        """Runs a due step in the background, and queues whatever comes after it"""
+        self.spawn(self.fire(job, step))
+        if step + 1 < len(job.STEPS):
+            self.push(job, step + 1)
+        else:
+            job.last_run = job.next_run
+            job.next_step = 0
+            self.plan(job, time.time())
+            self.spawn(self.save_state())
+
+    def spawn(self, coroutine) -> None:
+        # Keeps a reference, so the task isn't garbage collected mid-run
+        task = asyncio.create_task(coroutine)
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    # Actions ----------------------------------------------------------------------
+    def targets(self, job: Job) -> list[AsyncClient]:
+        if job.SERVER == FLEET_WIDE:
+            return list(self.FLEET.clients.values())
+        return [self.FLEET.get(job.SERVER)]
+
+    async def fire(self, job: Job, step: int) -> None:
+        offset, kind = job.STEPS[step]
+        log.info(f"Running scheduled job {job.NAME} ({kind})")
+        clients = self.targets(job)
+        results = await asyncio.gather(
+            *(self.execute(job, kind, -offset, client) for client in clients),
+            return_exceptions=True,
+        )
+        for client, result in zip(clients, results):
+            if isinstance(result, Exception):
+                log.error(f"Scheduled job {job.NAME} failed on {client.NAME}: {result}")
+            elif result == client.GENERIC_ERROR:
+                log.error(f"Scheduled job {job.NAME} got no response from {client.NAME}")
+
+    async def execute(self, job: Job, kind: str, remaining: float, client: AsyncClient) -> str:
+        match kind:
+            case "save":
+                if client.NAME in self.saving:
+                    log.warning(f"Skipping scheduled save of {client.NAME}; the previous save is still running")
+                    return ""
+                self.saving.add(client.NAME)
+                try:
+                    return await client.save()
+                finally:
+                    self.saving.discard(client.NAME)
+            case "broadcast":
+                return await client.announce(job.MESSAGE.replace(" ", "_"))
+            case "warn":
+                warning = job.WARNING.format(time=format_duration(remaining))
+                return await client.announce(warning.replace(" ", "_"))
+            case "shutdown":
+                return await client.shutdown(str(job.DELAY), job.MESSAGE.replace(" ", "_"))
+        raise ValueError(f"Unknown step {kind}")
+
+    # Admin ------------------------------------------------------------------------
+    async def cancel(self, name: str) -> bool:
+        """Stops a job (and any countdown in progress) until it is resumed
+
+        Returns False if there is no such job, or it was already cancelled.
+        """
+        job = self.jobs.get(name)
+        if not job or job.cancelled:
+            return False
+        was_counting_down = job.ACTION == "shutdown" and job.in_progress
+        job.cancelled = True
+        job.generation += 1
+        job.next_step = 0
+        log.info(f"Scheduled job {name} cancelled")
+        if was_counting_down:
+            # In the background: an unreachable server mustn't hold up the answer to the admin who cancelled
+            self.spawn(self.announce_cancellation(job))
+        await self.save_state()
+        return True
+
+    async def announce_cancellation(self, job: Job) -> None:
+        await asyncio.gather(
+            *(client.announce("Scheduled_shutdown_cancelled") for client in self.targets(job)),
+            return_exceptions=True,
+        )
+
+    async def resume(self, name: str) -> bool:
+        """Puts a cancelled job back on the schedule; missed runs are skipped"""
+        job = self.jobs.get(name)
+        if not job or not job.cancelled:
+            return False
+        job.cancelled = False
+        job.last_run = 0.0
+        self.plan(job, time.time())
+        log.info(f"Scheduled job {name} resumed")
+        await self.save_state()
+        return True
@@ -0,0 +1,209 @@
+"""Loads `config.toml`, validates it, and picks up changes while the bot runs.
+
+The parsed file is cached against its stat signature (mtime, size, inode),
+so asking for the config again is a single `os.stat()` unless the file has
+actually changed. A background task polls that signature; when it changes,
+the file is re-parsed off the event loop, validated, and only then swapped in
+and announced to listeners. An invalid edit is logged and ignored, so the
+running bot keeps its last good config.
+"""
+import asyncio
+import os
+import tomllib
+from typing import Callable
+
+import logger
+
+log = logger.get_logger(__name__)
+
+CONFIG_PATH = "config.toml"
+DEFAULT_POLL_INTERVAL = 5
+
+NUMBER = (int, float)
+# Setting: (accepted types, required)
+SCHEMA = {
+    "ip": (str, False),
+    "port": (int, False),
+    "password": (str, False),
+    "timeout_duration": (NUMBER, True),
+    "discord_bot_token": (str, True),
+    "embed_footer": (str, True),
+    "embed_thumbnail": (str, True),
+    "generic_bot_error": (str, True),
+    "pool_size": (int, False),
+    "pool_idle_timeout": (NUMBER, False),
+    "max_concurrent_commands": (int, False),
+    "queue_max_depth": (int, False),
+    "queue_max_wait": (NUMBER, False),
+    "cache_ttl": (NUMBER, False),
+    "roster_poll_interval": (NUMBER, False),
+    "roster_poll_max_interval": (NUMBER, False),
+    "roster_channel_id": (int, False),
+    "admin_channel_id": (int, False),
+    "rate_limit_user_rate": (NUMBER, False),
+    "rate_limit_user_burst": (NUMBER, False),
+    "rate_limit_guild_rate": (NUMBER, False),
+    "rate_limit_guild_burst": (NUMBER, False),
+    "shard_count": (int, False),
+    "shard_workers": (int, False),
+    "log_level": (str, False),
+    "log_json": (bool, False),
+    "metrics_host": (str, False),
+    "metrics_port": (int, False),
+    "history_path": (str, False),
+    "history_flush_interval": (NUMBER, False),
+    "schedule_state_path": (str, False),
+    "breaker_threshold": (int, False),
+    "breaker_reset_timeout": (NUMBER, False),
+    "config_poll_interval": (NUMBER, False),
+    "tree_hash_path": (str, False),
+    "telemetry_interval": (NUMBER, False),
+    "telemetry_path": (str, False),
+    "status_path": (str, False),
+    "status_debounce": (NUMBER, False),
+    "status_edit_interval": (NUMBER, False),
+    "audit_directory": (str, False),
+    "banlist_path": (str, False),
+    "banlist_enforce": (bool, False),
+    "audit_flush_interval": (NUMBER, False),
+    "audit_max_bytes": (int, False),
+    "audit_max_segments": (int, False),
+    "servers": (dict, False),
+    "schedule": (list, False),
+}
+# Every server needs these, either in its own table or at the top level
+SERVER_REQUIRED = ("ip", "port", "password")
+# Settings that are applied without a restart; changes to anything else are logged, and wait for one
+RELOADABLE = {
+    "ip", "port", "password", "timeout_duration", "pool_size", "pool_idle_timeout", "servers",
+    "embed_footer", "embed_thumbnail", "generic_bot_error", "log_level", "config_poll_interval", "queue_max_wait",
+}
+
+
+def check_type(key: str, value, types) -> str | None:
+    # bool is a subclass of int, but `pool_size = true` is still a mistake
+    if isinstance(value, bool) and types is not bool:
+        return f"`{key}` must not be true/false"
+    if not isinstance(value, types):
+        expected = " or ".join(t.__name__ for t in types) if isinstance(types, tuple) else types.__name__
+        return f"`{key}` must be of type {expected}, not {type(value).__name__}"
+    return None
+
+
+def validate(config: dict) -> list[str]:
+    """Returns every problem with the config; an empty list means it is usable"""
+    errors = []
+    for key, value in config.items():
+        if key not in SCHEMA:
+            log.warning(f"Unknown setting `{key}` in {CONFIG_PATH}")
+            continue
+        if error := check_type(key, value, SCHEMA[key][0]):
+            errors.append(error)
+    errors.extend(f"`{key}` is required" for key, (_, required) in SCHEMA.items() if required and key not in config)
+    log_level = config.get("log_level")
+    if isinstance(log_level, str) and log_level.upper() not in logger.LEVELS:
+        errors.append(f"`log_level` must be one of {', '.join(logger.LEVELS)}, not {log_level!r}")
+
+    servers = config.get("servers")
+    tables = servers.items() if isinstance(servers, dict) and servers else [(None, {})]
+    for name, table in tables:
+        where = f" in [servers.{name}]" if name else ""
+        if not isinstance(table, dict):
+            errors.append(f"[servers.{name}] must be a table")
+            continue
+        for key, value in table.items():
+            if key in SCHEMA and (error := check_type(key, value, SCHEMA[key][0])):
+                errors.append(error + where)
+        errors.extend(
+            f"`{key}` is required{where}"
+            for key in SERVER_REQUIRED if key not in table and key not in config
+        )
+    return errors
+
+
+class ConfigManager:
+    def __init__(self, path: str = CONFIG_PATH):
+        self.PATH = path
+        self.current: dict | None = None
+        self.signature: tuple[int, int, int] | None = None
+        self.listeners: list[Callable[[dict, dict], None]] = []
+        self.task: asyncio.Task | None = None
+
+    def stat(self) -> tuple[int, int, int] | None:
+        try:
+            stat = os.stat(self.PATH)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def read(self) -> dict | None:
+        """Parses and validates the file; None (with the reasons logged) if it is unusable"""
+        try:
+            with open(self.PATH, "rb") as file:
+                data = tomllib.load(file)
+        except (OSError, tomllib.TOMLDecodeError) as e:
+            log.error(f"Unable to read {self.PATH}: {e}")
+            return None
+        errors = validate(data)
+        for error in errors:
+            log.error(f"Invalid {self.PATH}: {error}")
+        return None if errors else data
+
+    def get(self) -> dict | None:
+        """The current config, re-read first if the file changed since it was last loaded"""
+        signature = self.stat()
+        if signature != self.signature or self.current is None:
+            data = self.read()
+            if data:
+                self.signature = signature
+                self.swap(data)
+        return self.current
+
+    def swap(self, data: dict) -> None:
+        previous, self.current = self.current, data
+        if previous is None:
+            return
+        changed = sorted(key for key in previous.keys() | data.keys() if previous.get(key) != data.get(key))
+        if not changed:
+            return
+        log.info(f"Reloaded {self.PATH}; changed: {', '.join(changed)}")
+        needs_restart = [key for key in changed if key in SCHEMA and key not in RELOADABLE]
+        if needs_restart:
+            log.warning(f"Changes to {', '.join(needs_restart)} take effect after a restart")
+        for listener in self.listeners:
+            listener(previous, data)
+
+    def add_listener(self, listener: Callable[[dict, dict], None]) -> None:
+        """Calls `listener(old config, new config)` after every reload that changed something"""
+        self.listeners.append(listener)
+
+    # Polling ----------------------------------------------------------------------
+    def start(self) -> None:
+        interval = (self.current or {}).get("config_poll_interval", DEFAULT_POLL_INTERVAL)
+        if interval <= 0 or self.task:
+            return
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.current.get("config_poll_interval", DEFAULT_POLL_INTERVAL) or DEFAULT_POLL_INTERVAL)
+            signature = self.stat()
+            if signature is None or signature == self.signature:
+                continue
+            # Parsing (and validation) stays off the event loop
+            data = await asyncio.to_thread(self.read)
+            # Whatever happens, don't re-read the same broken file every few seconds
+            self.signature = signature
+            if data:
+                try:
+                    self.swap(data)
+                except Exception as e:
+                    log.error(f"Unable to apply the reloaded config: {e}")
+
+
+MANAGER = ConfigManager()
@@ -0,0 +1,211 @@
+"""Gateway sharding, in one process or split across worker processes.
+
+The bot runs as an `AutoShardedClient` with minimal intents (guilds only;
+slash commands need neither message content nor members). `shard_count`
+fixes the number of shards; by default Discord's recommendation is used.
+
+With `shard_workers` above 0, the main process becomes the coordinator: it
+keeps everything stateful (the fleet's RCON pools, caches and pollers, the
+command tree, views and background services), talks to Discord over HTTP
+only, and starts that many worker processes (this module, run as a script).
+Each worker holds the gateway connections of a share of the shards, and
+forwards every interaction it receives to the coordinator over a local
+socket, so nothing is duplicated per process. Workers that exit are
+restarted. Each shard's gateway latency is exported as
+`palcon_gateway_latency_seconds`, whichever process it runs in.
+"""
+import asyncio
+import json
+import os
+import secrets
+import sys
+from pathlib import Path
+from typing import Callable
+
+import discord
+
+import logger
+import metrics
+
+log = logger.get_logger(__name__)
+
+LOCALHOST = "127.0.0.1"
+# Worker settings, passed in the environment so the bot token never shows up in the process list
+ENV_TOKEN = "PALCON_DISCORD_TOKEN"
+ENV_PORT = "PALCON_COORDINATOR_PORT"
+ENV_SECRET = "PALCON_COORDINATOR_SECRET"
+ENV_SHARD_IDS = "PALCON_SHARD_IDS"
+ENV_SHARD_COUNT = "PALCON_SHARD_COUNT"
+# Seconds between a worker's latency reports, and before a worker that exited is restarted
+LATENCY_INTERVAL = 15
+RESTART_DELAY = 5
+# Longest line a worker may send; interactions with many resolved users can be large
+MAX_MESSAGE_BYTES = 2**22
+
+
+def minimal_intents() -> discord.Intents:
+    """Slash commands arrive regardless of intents; guilds keeps channels resolvable"""
+    intents = discord.Intents.none()
+    intents.guilds = True
+    return intents
+
+
+def split_shards(shard_count: int, workers: int) -> list[list[int]]:
+    """Deals shards out round robin, so each worker's shards identify in different buckets"""
+    return [list(range(worker, shard_count, workers)) for worker in range(min(workers, shard_count))]
+
+
+def collect_metrics(latencies: Callable[[], dict[int, float]]) -> None:
+    def samples():
+        for shard_id, latency in sorted(latencies().items()):
+            yield "palcon_gateway_latency_seconds", {"shard": str(shard_id)}, latency
+
+    metrics.register_collector(
+        "palcon_gateway_latency_seconds",
+        "Time between a gateway heartbeat and its acknowledgement, per shard",
+        "gauge",
+        samples,
+    )
+
+
+# Coordinator ------------------------------------------------------------------
+class ShardCoordinator:
+    def __init__(self, discord_client: discord.Client, workers: int, shard_count: int | None = None):
+        self.DISCORD_CLIENT = discord_client
+        self.WORKERS = workers
+        self.SHARD_COUNT = shard_count
+        # Proves to the coordinator that a connection comes from one of its own workers
+        self.SECRET = secrets.token_hex(32)
+        self.latencies: dict[int, float] = {}  # { Key (shard ID): Value (seconds), as last reported }
+        self.ready_workers: set[tuple[int, ...]] = set()
+        self.worker_count = 0
+        self.ready = asyncio.Event()
+
+    @classmethod
+    def from_config(cls, discord_client: discord.Client, config: dict) -> "ShardCoordinator":
+        return cls(discord_client, config["shard_workers"], config.get("shard_count") or None)
+
+    async def serve(self, token: str) -> None:
+        """Logs in over HTTP (which runs `setup_hook`), then runs the workers until cancelled"""
+        async with self.DISCORD_CLIENT:
+            await self.DISCORD_CLIENT.login(token)
+            shard_count = self.SHARD_COUNT or (await self.DISCORD_CLIENT.http.get_bot_gateway())[0]
+            server = await asyncio.start_server(self.handle, LOCALHOST, 0, limit=MAX_MESSAGE_BYTES)
+            port = server.sockets[0].getsockname()[1]
+            assignments = split_shards(shard_count, self.WORKERS)
+            self.worker_count = len(assignments)
+            log.info(f"Running {shard_count} shard(s) in {self.worker_count} worker process(es)")
+            try:
+                await asyncio.gather(*(
+                    self.supervise(shard_ids, shard_count, port, token) for shard_ids in assignments
+                ))
+            finally:
+                server.close()
+
+    async def supervise(self, shard_ids: list[int], shard_count: int, port: int, token: str) -> None:
+        environment = os.environ | {
+            ENV_TOKEN: token,
+            ENV_PORT: str(port),
+            ENV_SECRET: self.SECRET,
+            ENV_SHARD_IDS: ",".join(map(str, shard_ids)),
+            ENV_SHARD_COUNT: str(shard_count),
+        }
+        while True:
+            process = await asyncio.create_subprocess_exec(sys.executable, str(Path(__file__).resolve()), env=environment)
+            try:
+                code = await process.wait()
+            finally:
+                if process.returncode is None:
+                    process.terminate()
+            log.warning(f"Worker for shard(s) {shard_ids} exited with code {code}; restarting in {RESTART_DELAY}s")
+            await asyncio.sleep(RESTART_DELAY)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        shard_ids: tuple[int, ...] = ()
+        try:
+            hello = json.loads(await reader.readline())
+            if not secrets.compare_digest(str(hello.get("secret")), self.SECRET):
+                log.warning("Refused a shard worker connection with the wrong secret")
+                return
+            shard_ids = tuple(hello["shards"])
+            while line := await reader.readline():
+                message = json.loads(line)
+                if message["type"] == "interaction":
+                    self.dispatch_interaction(message["data"])
+                elif message["type"] == "latency":
+                    self.latencies.update((shard_id, latency) for shard_id, latency in message["latencies"])
+                elif message["type"] == "ready":
+                    self.mark_ready(shard_ids)
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            log.error(f"Lost shard worker {list(shard_ids)}: {type(e).__name__}: {e}")
+        finally:
+            for shard_id in shard_ids:
+                self.latencies.pop(shard_id, None)
+            writer.close()
+
+    def dispatch_interaction(self, data: dict) -> None:
+        try:
+            # The same path a gateway event takes, so the tree and views handle it as usual
+            self.DISCORD_CLIENT._connection.parse_interaction_create(data)
+        except Exception as e:
+            # Only this interaction is lost; the worker's other shards keep going
+            log.error(f"Unable to handle interaction {data.get('id')}: {type(e).__name__}: {e}")
+
+    def mark_ready(self, shard_ids: tuple[int, ...]) -> None:
+        self.ready_workers.add(shard_ids)
+        log.info(f"Shard(s) {list(shard_ids)} connected")
+        if len(self.ready_workers) >= self.worker_count and not self.ready.is_set():
+            self.ready.set()
+            self.DISCORD_CLIENT.dispatch("ready")
+
+
+# Worker -----------------------------------------------------------------------
+class ShardWorker(discord.AutoShardedClient):
+    """Holds the gateway connections of some shards; everything else happens in the coordinator"""
+    def __init__(self, port: int, secret: str, shard_ids: list[int], shard_count: int):
+        super().__init__(intents=minimal_intents(), shard_ids=shard_ids, shard_count=shard_count)
+        self.PORT = port
+        self.SECRET = secret
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def setup_hook(self) -> None:
+        reader, self.writer = await asyncio.open_connection(LOCALHOST, self.PORT)
+        self.send({"secret": self.SECRET, "shards": self.shard_ids})
+        # Interactions skip this process's own handling entirely
+        self._connection.parsers["INTERACTION_CREATE"] = lambda data: self.send({"type": "interaction", "data": data})
+        self.loop.create_task(self.report_latency())
+        self.loop.create_task(self.watch_coordinator(reader))
+
+    def send(self, message: dict) -> None:
+        self.writer.write(json.dumps(message).encode("utf-8") + b"\n")
+
+    async def report_latency(self) -> None:
+        while True:
+            self.send({"type": "latency", "latencies": self.latencies})
+            await asyncio.sleep(LATENCY_INTERVAL)
+
+    async def watch_coordinator(self, reader: asyncio.StreamReader) -> None:
+        """The coordinator never writes back; EOF means it is gone, and so is any reason to stay connected"""
+        await reader.read()
+        log.warning("Lost the coordinator; shutting down")
+        await self.close()
+
+    async def on_ready(self) -> None:
+        self.send({"type": "ready"})
+
+
+def run_worker() -> None:
+    # Several processes rotating one log file would clobber each other's logs; workers log to the console only
+    logger.start_listener(to_file=False)
+    worker = ShardWorker(
+        port=int(os.environ[ENV_PORT]),
+        secret=os.environ[ENV_SECRET],
+        shard_ids=[int(shard_id) for shard_id in os.environ[ENV_SHARD_IDS].split(",")],
+        shard_count=int(os.environ[ENV_SHARD_COUNT]),
+    )
+    worker.run(os.environ[ENV_TOKEN])
+    logger.shutdown_logger()
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -0,0 +1,65 @@
+"""Start-up phase timing, and skipping command tree syncs that would change nothing.
+
+Run the bot with `--profile-startup` to log how long each start-up phase
+took; the total is always logged once the bot is ready. The command tree is
+only synced with Discord when its definitions changed since the last sync,
+or when the bot is run with `--sync-commands`.
+"""
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+import logger
+
+log = logger.get_logger(__name__)
+
+PROFILE_FLAG = "--profile-startup"
+FORCE_SYNC_FLAG = "--sync-commands"
+DEFAULT_TREE_HASH_PATH = "command_tree.sha256"
+
+started_at = time.perf_counter()
+last_mark = started_at
+phases: list[tuple[str, float]] = []
+
+
+def mark(phase: str) -> None:
+    """Records that `phase` ended now; it started where the previous phase ended"""
+    global last_mark
+    now = time.perf_counter()
+    phases.append((phase, now - last_mark))
+    last_mark = now
+
+
+def report() -> None:
+    total = time.perf_counter() - started_at
+    log.info(f"Bot ready {total:.2f}s after start-up")
+    if PROFILE_FLAG not in sys.argv:
+        return
+    for phase, elapsed in phases:
+        log.info(f"  {phase:<16} {elapsed * 1000:8.1f} ms")
+
+
+# Command tree -----------------------------------------------------------------
+def hash_commands(payload: list[dict], application_id: int | None) -> str:
+    """Stable digest of the command definitions Discord would be sent"""
+    payload = sorted(payload, key=lambda command: command["name"])
+    data = json.dumps({"application_id": application_id, "commands": payload}, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def is_synced(digest: str, path: str = DEFAULT_TREE_HASH_PATH) -> bool:
+    if FORCE_SYNC_FLAG in sys.argv:
+        return False
+    try:
+        return Path(path).read_text(encoding="utf-8").strip() == digest
+    except OSError:
+        return False
+
+
+def record_sync(digest: str, path: str = DEFAULT_TREE_HASH_PATH) -> None:
+    try:
+        Path(path).write_text(digest, encoding="utf-8")
+    except OSError as e:
+        log.error(f"Unable to record the command tree hash in {path}: {e}")
@@ -0,0 +1,234 @@
+"""Samples server health over time, in fixed-size ring buffers.
+
+Every `telemetry_interval` seconds, each server's player count, `Info`
+round-trip latency and availability are recorded. Each series keeps three
+tiers (1h, 24h and 7d) of fixed length; samples are averaged into each
+tier's buckets, so memory use never grows, however long the bot runs.
+Buffers are `array`s of floats, and are saved to disk as raw bytes.
+"""
+import array
+import asyncio
+import json
+import math
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+from fleet import Fleet
+import logger
+import metrics
+
+log = logger.get_logger(__name__)
+
+DEFAULT_INTERVAL = 30
+DEFAULT_PATH = "telemetry.bin"
+# Samples between saves to disk
+SAVE_EVERY = 10
+# Name: (span, seconds per bucket)
+TIERS = {
+    "1h": (3600, 30),
+    "24h": (86400, 600),
+    "7d": (604800, 3600),
+}
+SERIES = ("players", "latency", "availability")
+
+FILE_MAGIC = b"PCT1"
+HEADER_LENGTH = struct.Struct("<I")
+
+
+class RingBuffer:
+    """Fixed number of time buckets; the newest bucket is the running average of its samples"""
+    def __init__(self, span: int, resolution: int):
+        self.resolution = resolution
+        self.values = array.array("f", [math.nan]) * (span // resolution)
+        self.head = 0  # Index of the newest (current) bucket
+        self.bucket = 0  # Bucket number (timestamp // resolution) of the current bucket
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, timestamp: float, value: float) -> None:
+        bucket = int(timestamp // self.resolution)
+        if bucket > self.bucket:
+            # Buckets with no samples (e.g. while the bot was down) stay NaN
+            for _ in range(min(bucket - self.bucket, len(self.values))):
+                self.head = (self.head + 1) % len(self.values)
+                self.values[self.head] = math.nan
+            self.bucket = bucket
+            self.total = 0.0
+            self.count = 0
+        elif bucket < self.bucket:
+            return
+        if not math.isnan(value):
+            self.total += value
+            self.count += 1
+            self.values[self.head] = self.total / self.count
+
+    def ordered(self, now: float = None) -> list[float]:
+        """Oldest bucket first, aligned so the last value is the bucket for `now`"""
+        if now is not None:
+            self.add(now, math.nan)
+        start = self.head + 1
+        return list(self.values[start:]) + list(self.values[:start])
+
+    def state(self) -> dict:
+        return {"head": self.head, "bucket": self.bucket, "total": self.total, "count": self.count}
+
+    def restore(self, state: dict, values: bytes) -> None:
+        restored = array.array("f")
+        restored.frombytes(values)
+        if sys.byteorder == "big":
+            restored.byteswap()
+        if len(restored) != len(self.values):
+            return
+        self.values = restored
+        self.head = state["head"]
+        self.bucket = state["bucket"]
+        self.total = state["total"]
+        self.count = state["count"]
+
+
+class Telemetry:
+    def __init__(self, fleet: Fleet, interval: float = DEFAULT_INTERVAL, path: str = DEFAULT_PATH):
+        self.FLEET = fleet
+        self.INTERVAL = interval
+        self.PATH = Path(path)
+        self.buffers = self.empty_buffers()
+        self.samples = 0
+        self.task: asyncio.Task | None = None
+
+    @classmethod
+    def from_config(cls, fleet: Fleet, config: dict) -> "Telemetry":
+        return cls(
+            fleet,
+            interval=config.get("telemetry_interval", DEFAULT_INTERVAL),
+            path=config.get("telemetry_path", DEFAULT_PATH),
+        )
+
+    def empty_buffers(self) -> dict[str, dict[str, dict[str, RingBuffer]]]:
+        """{ server: { series: { tier: RingBuffer } } }"""
+        return {
+            server_name: {
+                series: {tier: RingBuffer(span, resolution) for tier, (span, resolution) in TIERS.items()}
+                for series in SERIES
+            }
+            for server_name in self.FLEET.names()
+        }
+
+    def record(self, server_name: str, series: str, timestamp: float, value: float) -> None:
+        for ring in self.buffers[server_name][series].values():
+            ring.add(timestamp, value)
+
+    def series(self, server_name: str, series: str, tier: str) -> list[float]:
+        return self.buffers[server_name][series][tier].ordered(time.time())
+
+    # Sampling ---------------------------------------------------------------------
+    async def sample(self, server_name: str) -> None:
+        client = self.FLEET.get(server_name)
+        now = time.time()
+        if client.is_offline():
+            # Known to be down; don't spend a probe on it
+            self.record(server_name, "availability", now, 0)
+            return
+        with metrics.Timer() as timer:
+            # Bypasses the cache, so the latency is a real round trip
+            server_info, _ = await client.fetch_info()
+        self.record(server_name, "availability", now, 1 if server_info else 0)
+        if server_info:
+            self.record(server_name, "latency", now, timer.elapsed * 1000)
+        if client.ROSTER.is_fresh():
+            self.record(server_name, "players", now, len(client.ROSTER.snapshot))
+        elif server_info:
+            players, error_message = await client.online()
+            if not error_message:
+                self.record(server_name, "players", now, len(players))
+
+    async def run(self) -> None:
+        while True:
+            results = await asyncio.gather(*(self.sample(server_name) for server_name in self.buffers), return_exceptions=True)
+            for server_name, result in zip(self.buffers, results):
+                if isinstance(result, Exception):
+                    log.error(f"Unable to sample {server_name}: {type(result).__name__}: {result}")
+            self.samples += 1
+            if self.samples % SAVE_EVERY == 0:
+                await self.save()
+            await asyncio.sleep(self.INTERVAL)
+
+    async def start(self) -> None:
+        if self.INTERVAL <= 0 or self.task:
+            return
+        await asyncio.to_thread(self.load)
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if not self.task:
+            return
+        self.task.cancel()
+        self.task = None
+        await self.save()
+
+    # Persistence ------------------------------------------------------------------
+    # File layout: magic, header length, JSON header (ring state and position in the blob), raw float32 values
+    def snapshot(self) -> tuple[dict, bytes]:
+        header = []
+        blobs = []
+        offset = 0
+        for server_name, series in self.buffers.items():
+            for series_name, tiers in series.items():
+                for tier, ring in tiers.items():
+                    values = array.array("f", ring.values)
+                    if sys.byteorder == "big":
+                        values.byteswap()
+                    blob = values.tobytes()
+                    header.append({
+                        "server": server_name, "series": series_name, "tier": tier,
+                        "offset": offset, "length": len(blob), **ring.state(),
+                    })
+                    blobs.append(blob)
+                    offset += len(blob)
+        return {"saved_at": time.time(), "rings": header}, b"".join(blobs)
+
+    def write(self, header: dict, blob: bytes) -> None:
+        encoded = json.dumps(header).encode("utf-8")
+        temporary = self.PATH.with_suffix(".tmp")
+        temporary.write_bytes(FILE_MAGIC + HEADER_LENGTH.pack(len(encoded)) + encoded + blob)
+        os.replace(temporary, self.PATH)
+
+    async def save(self) -> None:
+        # Copied on the loop (cheap), written from a thread
+        header, blob = self.snapshot()
+        try:
+            await asyncio.to_thread(self.write, header, blob)
+        except OSError as e:
+            log.error(f"Unable to save telemetry to {self.PATH}: {e}")
+
+    def load(self) -> None:
+        try:
+            data = self.PATH.read_bytes()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            log.error(f"Unable to read telemetry from {self.PATH}: {e}")
+            return
+        if data[:4] != FILE_MAGIC:
+            log.error(f"Ignoring {self.PATH}; it is not a telemetry file")
+            return
+        try:
+            self.buffers = self.parse(data)
+        except (struct.error, KeyError, TypeError, ValueError) as e:
+            # A truncated or corrupt file only costs the history, never the bot's start
+            log.warning(f"Ignoring {self.PATH}; it is truncated or corrupt ({type(e).__name__}: {e})")
+
+    def parse(self, data: bytes) -> dict[str, dict[str, dict[str, RingBuffer]]]:
+        """Fresh buffers holding what the file saved; raises if any of it is unreadable"""
+        buffers = self.empty_buffers()
+        (length,) = HEADER_LENGTH.unpack_from(data, 4)
+        start = 4 + HEADER_LENGTH.size
+        header = json.loads(data[start:start + length])
+        blob = memoryview(data)[start + length:]
+        for entry in header["rings"]:
+            ring = buffers.get(entry["server"], {}).get(entry["series"], {}).get(entry["tier"])
+            if ring:
+                ring.restore(entry, blob[entry["offset"]:entry["offset"] + entry["length"]])
+        return buffers
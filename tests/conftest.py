@@ -0,0 +1,9 @@
+"""Makes the project's flat modules importable, as they are when running `main.py` from the project root."""
+import os
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+# The logger writes to `logs/`, relative to the working directory
+os.chdir(PROJECT_ROOT)
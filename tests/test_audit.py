@@ -0,0 +1,51 @@
+import asyncio
+
+from audit import AuditJournal
+
+
+class Unserializable:
+    def __str__(self):
+        return "Unserializable()"
+
+
+def test_unconverted_argument_does_not_stall_the_journal(tmp_path):
+    async def scenario():
+        journal = AuditJournal(str(tmp_path), flush_interval=60)
+        await journal.start()
+        try:
+            journal.record(command="kick", arguments={"member": Unserializable()})
+            journal.record(command="save", arguments={})
+            await journal.flush()
+            assert not journal.pending and not journal.flushing
+            return await journal.search()
+        finally:
+            await journal.close()
+
+    entries = asyncio.run(scenario())
+    assert sorted(entry["command"] for entry in entries) == ["kick", "save"]
+
+
+def test_failed_write_keeps_the_entries_for_the_next_flush(tmp_path):
+    async def scenario():
+        journal = AuditJournal(str(tmp_path), flush_interval=60)
+        await journal.start()
+        try:
+            journal.record(command="save", arguments={})
+            write = journal._write
+
+            def failing_write(lines):
+                raise RuntimeError("disk on fire")
+
+            journal._write = failing_write
+            try:
+                await journal.flush()
+            except RuntimeError:
+                pass
+            assert len(journal.pending) == 1 and not journal.flushing
+            journal._write = write
+            await journal.flush()
+            return await journal.search()
+        finally:
+            await journal.close()
+
+    assert [entry["command"] for entry in asyncio.run(scenario())] == ["save"]
@@ -0,0 +1,38 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from bans import BanList
+from data import Ban, Player
+
+
+def test_bad_entries_are_skipped(tmp_path):
+    path = tmp_path / "bans.json"
+    path.write_text(json.dumps({"bans": [
+        {"steam_id": "1", "name": "kept"},
+        {"name": "no steam_id"},
+        {"steam_id": "2", "colour": "unknown key"},
+        {"steam_id": 3},
+        "not a ban",
+        {"steam_id": "4", "banned_at": 1.5},
+    ]}))
+    ban_list = BanList(SimpleNamespace(), path=str(path))
+    ban_list.load()
+    assert sorted(ban_list.bans) == ["1", "4"]
+
+
+def test_failed_kick_is_logged_and_released():
+    async def kick_many(steam_ids):
+        raise RuntimeError("server exploded")
+
+    async def scenario():
+        fleet = SimpleNamespace(get=lambda name: SimpleNamespace(kick_many=kick_many))
+        ban_list = BanList(fleet, enforce=True)
+        ban_list.bans["1"] = Ban("1")
+        ban_list.observe("test", {"1": Player("someone", "1", "1")}, [])
+        assert len(ban_list.running) == 1
+        await asyncio.gather(*ban_list.running, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert not ban_list.running and not ban_list.kicking
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+import asyncio
+
+from cache import TTLCache
+
+
+def test_follower_gets_value_when_leader_is_cancelled():
+    async def scenario():
+        cache = TTLCache(ttl=5)
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "value"
+
+        leader = asyncio.create_task(cache.get("key", loader))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get("key", loader))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "value"
+        assert leader.cancelled()
+        assert calls == 1
+        assert cache.peek("key") == "value"
+
+    asyncio.run(scenario())
+
+
+def test_wait_for_timeout_does_not_cancel_other_callers():
+    async def scenario():
+        cache = TTLCache(ttl=5)
+
+        async def loader():
+            await asyncio.sleep(0.05)
+            return "value"
+
+        follower = asyncio.create_task(cache.get("key", loader))
+        await asyncio.sleep(0)
+        try:
+            await asyncio.wait_for(cache.get("key", loader), timeout=0.01)
+        except asyncio.TimeoutError:
+            pass
+        assert await follower == "value"
+
+    asyncio.run(scenario())
+
+
+def test_loader_is_cancelled_once_every_caller_leaves():
+    async def scenario():
+        cache = TTLCache(ttl=5)
+        cancelled = asyncio.Event()
+
+        async def loader():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(cache.get("key", loader)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        assert not cache.in_flight and not cache.waiters
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    async def scenario():
+        cache = TTLCache(ttl=5)
+
+        async def loader():
+            await asyncio.sleep(0.01)
+            raise OSError("unreachable")
+
+        results = await asyncio.gather(*(cache.get("key", loader) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, OSError) for result in results)
+        assert cache.peek("key") is None
+
+    asyncio.run(scenario())
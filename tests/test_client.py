@@ -0,0 +1,58 @@
+import asyncio
+
+from benchmarks.fake_server import FakeServer
+from client import AsyncClient
+
+
+def make_client(port: int) -> AsyncClient:
+    config = {
+        "ip": "127.0.0.1",
+        "port": port,
+        "password": "",
+        "timeout_duration": 5,
+        "cache_ttl": 60,
+        # Never started here; a long interval keeps the snapshot fresh throughout
+        "roster_poll_interval": 60,
+    }
+    return AsyncClient(config=config, name="test")
+
+
+def test_kick_makes_the_next_query_ask_the_server():
+    async def scenario():
+        server = await FakeServer(players=3).start()
+        client = make_client(server.port)
+        try:
+            players, _ = await client.online()
+            commands = server.commands
+            await client.online()
+            assert server.commands == commands and client.peek_online()
+            await client.kick(next(iter(players)))
+            commands = server.commands
+            assert client.peek_online() is None
+            await client.online()
+            assert server.commands == commands + 1
+            # Fresh again once the server has been asked
+            await client.online()
+            assert server.commands == commands + 1
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_query_started_before_a_kick_leaves_the_roster_stale():
+    async def scenario():
+        server = await FakeServer(players=3, latency=0.05).start()
+        client = make_client(server.port)
+        try:
+            query = asyncio.create_task(client.fetch_online())
+            await asyncio.sleep(0.01)
+            client.invalidate()
+            await query
+            assert not client.ROSTER.is_fresh()
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
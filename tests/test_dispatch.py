@@ -0,0 +1,29 @@
+import json
+from types import SimpleNamespace
+
+import discord
+from discord import app_commands
+
+from dispatch import audit_value
+
+
+def make_attachment() -> discord.Attachment:
+    data = {"id": 1, "filename": "banlist.txt", "size": 2048, "url": "https://example.invalid/banlist.txt", "proxy_url": ""}
+    return discord.Attachment(data=data, state=SimpleNamespace(http=None))
+
+
+def test_audited_arguments_are_serializable():
+    arguments = {
+        "file": make_attachment(),
+        "server": app_commands.Choice(name="Main", value="main"),
+        "count": 3,
+        "member": SimpleNamespace(),
+    }
+    recorded = {name: audit_value(value) for name, value in arguments.items()}
+    assert recorded == {
+        "file": {"filename": "banlist.txt", "size": 2048},
+        "server": "main",
+        "count": 3,
+        "member": "namespace()",
+    }
+    json.dumps(recorded)
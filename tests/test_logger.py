@@ -0,0 +1,29 @@
+import json
+import sys
+
+import pytest
+
+import logger
+
+
+def test_unknown_level_keeps_the_current_one():
+    logger.set_level("warning")
+    with pytest.raises(ValueError):
+        logger.set_level("VERBOSE")
+    assert logger.get_level() == "WARNING"
+    # Loggers made afterwards still get a usable level
+    assert logger.get_logger("test_logger").level == logger.logging.WARNING
+    logger.set_level("INFO")
+
+
+def test_queued_records_keep_their_traceback_for_json_output():
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        record = logger.logging.LogRecord("test", logger.logging.ERROR, __file__, 1, "failed %s", ("here",), sys.exc_info())
+    queued = logger.QUEUE_HANDLER.prepare(record)
+    entry = json.loads(logger.JsonFormatter().format(queued))
+    assert entry["message"] == "failed here"
+    assert "RuntimeError: boom" in entry["exception"]
+    # The plain text format still ends with the traceback
+    assert logger.FORMATTER.format(queued).endswith("RuntimeError: boom")
@@ -0,0 +1,56 @@
+import gzip
+
+import discord
+
+import output
+
+
+def check_limits(messages):
+    for content, embeds, _ in messages:
+        assert content is None or len(content) <= output.CONTENT_LIMIT
+        assert len(embeds) <= output.MAX_EMBEDS
+        assert sum(len(embed_message) for embed_message in embeds) <= output.EMBED_TOTAL_LIMIT
+        for embed_message in embeds:
+            assert output.fits(None, embed_message)
+
+
+def test_fitting_reply_is_sent_unchanged():
+    embed_message = discord.Embed(title="Save", description="Complete Save")
+    assert list(output.fit(None, embed_message, "save")) == [(None, [embed_message], None)]
+
+
+def test_long_description_is_split_at_line_breaks():
+    text = "\n".join(f"line {index} " + "x" * 50 for index in range(200))
+    messages = list(output.fit(None, discord.Embed(title="Save", description=text), "save"))
+    check_limits(messages)
+    assert len(messages) > 1
+    assert "\n".join(embed_message.description for _, embeds, _ in messages for embed_message in embeds) == text
+
+
+def test_oversized_fields_are_spread_across_embeds():
+    # Like `/online server:all` on several busy servers
+    embed_message = discord.Embed(title="Players Online", description="Player(s) Online: 400")
+    for index in range(8):
+        embed_message.add_field(name=f"server{index}", value="p" * 1000, inline=False)
+    embed_message.add_field(name="long", value="q" * 3000, inline=False)
+    messages = list(output.fit(None, embed_message, "online"))
+    check_limits(messages)
+    fields = [field for _, embeds, _ in messages for embed_message in embeds for field in embed_message.fields]
+    assert [field.name for field in fields][:8] == [f"server{index}" for index in range(8)]
+    assert "".join(field.value for field in fields[8:]) == "q" * 3000
+
+
+def test_huge_output_is_attached_as_gzip():
+    text = "row\n" * 300_000
+    messages = list(output.fit(None, discord.Embed(title="Save", description=text), "save"))
+    assert len(messages) == 1
+    _, embeds, file = messages[0]
+    assert file.filename == "save.txt.gz"
+    assert f"{len(text):,}" in embeds[0].description
+    assert gzip.decompress(file.fp.read()).decode("utf-8") == text
+
+
+def test_long_content_is_split_across_messages():
+    messages = list(output.fit("z" * 5000, None, "announce"))
+    check_limits(messages)
+    assert "".join(content for content, _, _ in messages) == "z" * 5000
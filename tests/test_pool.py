@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_server import FakeServer
+from pool import ConnectionPool
+
+
+def run_after_drop(commands: list[str], batch: bool = False) -> tuple[object, int]:
+    """Runs `commands` on a reused connection that the server drops once it has read them
+
+    Returns what the pool returned or raised, and how many times the server received them.
+    """
+    async def scenario():
+        server = await FakeServer().start()
+        pool = ConnectionPool("127.0.0.1", server.port, "", timeout=5, size=1)
+        try:
+            await pool.command("Info")
+            before = server.commands
+            server.DROP_RATE = 1.0
+            try:
+                result = await (pool.batch(commands) if batch else pool.command(commands[0]))
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                result = e
+            return result, server.commands - before
+        finally:
+            await pool.close()
+            await server.close()
+
+    return asyncio.run(scenario())
+
+
+def test_dropped_query_is_retried_on_a_fresh_connection():
+    result, received = run_after_drop(["ShowPlayers"])
+    assert isinstance(result, Exception)
+    assert received == 2
+
+
+@pytest.mark.parametrize("command", ["Save", "KickPlayer 76561198000000000", "DoExit"])
+def test_dropped_mutation_is_not_run_twice(command):
+    result, received = run_after_drop([command])
+    assert isinstance(result, Exception)
+    assert received == 1
+
+
+def test_batch_is_only_retried_if_it_only_queries():
+    # The server drops the connection after the first command of each attempt
+    results, received = run_after_drop(["ShowPlayers", "Info"], batch=True)
+    assert all(isinstance(result, Exception) for result in results)
+    assert received == 2
+    results, received = run_after_drop(["ShowPlayers", "Save"], batch=True)
+    assert all(isinstance(result, Exception) for result in results)
+    assert received == 1
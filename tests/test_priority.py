@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from benchmarks.fake_server import FakeServer
+from client import AsyncClient
+from priority import CommandQueue, MUTATION, QUERY
+import metrics
+
+LATENCY = 0.1
+
+
+def make_client(port: int, **overrides) -> AsyncClient:
+    config = {
+        "ip": "127.0.0.1",
+        "port": port,
+        "password": "",
+        "timeout_duration": 5,
+        "pool_size": 2,
+        "max_concurrent_commands": 4,
+        "cache_ttl": 0,
+        "roster_poll_interval": 0,
+    } | overrides
+    return AsyncClient(config=config, name="test")
+
+
+def test_emergency_command_overtakes_queued_queries():
+    async def scenario():
+        server = await FakeServer(latency=LATENCY).start()
+        client = make_client(server.port)
+        try:
+            queries = [asyncio.create_task(client.command("ShowPlayers")) for _ in range(8)]
+            await asyncio.sleep(0.01)
+            started = time.perf_counter()
+            assert await client.command("DoExit") == "Shutdown server..."
+            elapsed = time.perf_counter() - started
+            await asyncio.gather(*queries)
+        finally:
+            await client.close()
+            await server.close()
+        # Only the queries already running on the pool's two connections go first
+        assert elapsed < 2.5 * LATENCY
+
+    asyncio.run(scenario())
+
+
+def test_queue_never_grants_more_slots_than_connections():
+    async def scenario():
+        server = await FakeServer().start()
+        client = make_client(server.port, pool_size=2, max_concurrent_commands=4)
+        try:
+            assert client.QUEUE.SLOTS == 2
+            client.reconfigure(client.CONFIG | {"pool_size": 3})
+            assert client.QUEUE.SLOTS == 3
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_replaced_pool_is_drained_in_a_referenced_task():
+    async def scenario():
+        server = await FakeServer(latency=LATENCY).start()
+        client = make_client(server.port)
+        try:
+            running = asyncio.create_task(client.command("Save"))
+            await asyncio.sleep(0.01)
+            old_pool = client.POOL
+            client.reconfigure(client.CONFIG | {"pool_size": 3})
+            assert len(client.draining) == 1
+            # The command running on the old pool still finishes there
+            assert await running == "Complete Save"
+            await asyncio.gather(*client.draining)
+            assert not client.draining and not old_pool.idle
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_latency_metric_excludes_queue_wait():
+    async def scenario():
+        server = await FakeServer(latency=LATENCY).start()
+        client = make_client(server.port, pool_size=1, max_concurrent_commands=4)
+        try:
+            await asyncio.gather(*(client.command("Save") for _ in range(3)))
+        finally:
+            await client.close()
+            await server.close()
+        counts, sums = metrics.RCON_LATENCY.values[("test", "Save")]
+        # Each waited up to two round trips in the queue, but only its own round trip is recorded
+        assert sums[0] < 3 * 1.5 * LATENCY
+
+    asyncio.run(scenario())
+
+
+def test_shrinking_takes_effect_as_slots_are_released():
+    async def scenario():
+        queue = CommandQueue("test", 2)
+        await queue.acquire(MUTATION)
+        await queue.acquire(MUTATION)
+        queue.resize(1)
+        waiter = asyncio.create_task(queue.acquire(QUERY))
+        queue.release()
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        queue.release()
+        await asyncio.sleep(0)
+        assert waiter.done()
+        queue.resize(2)
+        assert queue.available == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,31 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from scheduler import IntervalSchedule, Job, Scheduler
+
+
+def test_cancel_returns_before_the_cancellation_is_announced(tmp_path):
+    announced = []
+
+    async def announce(message):
+        # An unreachable server, up to its timeout
+        await asyncio.sleep(0.5)
+        announced.append(message)
+        return ""
+
+    async def scenario():
+        client = SimpleNamespace(NAME="main", announce=announce)
+        fleet = SimpleNamespace(get=lambda name: client, clients={"main": client}, names=lambda: ["main"])
+        job = Job("nightly", "shutdown", IntervalSchedule(3600), countdown=(60,))
+        job.next_step = 1  # Mid-countdown
+        scheduler = Scheduler(fleet, [job], state_path=str(tmp_path / "schedule.json"))
+        started = time.perf_counter()
+        assert await scheduler.cancel("nightly")
+        elapsed = time.perf_counter() - started
+        assert job.cancelled and not announced
+        await asyncio.gather(*scheduler.running)
+        return elapsed
+
+    assert asyncio.run(scenario()) < 0.25
+    assert announced == ["Scheduled_shutdown_cancelled"]
@@ -0,0 +1,21 @@
+import os
+
+import settings
+
+CONFIG = 'ip = "127.0.0.1"\nport = 25575\npassword = "pw"\ndiscord_bot_token = ""\nlog_level = "{level}"\n'
+
+
+def test_log_level_is_checked_case_insensitively():
+    assert not [error for error in settings.validate({"log_level": "debug"}) if "log_level" in error]
+    assert [error for error in settings.validate({"log_level": "VERBOSE"}) if "log_level" in error]
+
+
+def test_bad_log_level_reload_keeps_the_previous_config(tmp_path):
+    path = tmp_path / "config.toml"
+    path.write_text(CONFIG.format(level="info"))
+    manager = settings.ConfigManager(str(path))
+    previous = manager.get()
+    path.write_text(CONFIG.format(level="VERBOSE"))
+    # Make sure the signature changes even on filesystems with coarse timestamps
+    os.utime(path, ns=(1, 1))
+    assert manager.get() is previous
@@ -0,0 +1,37 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import telemetry
+
+
+def make_telemetry(path) -> telemetry.Telemetry:
+    return telemetry.Telemetry(SimpleNamespace(names=lambda: ["test"]), path=str(path))
+
+
+def saved_file(path) -> bytes:
+    saved = make_telemetry(path)
+    saved.record("test", "players", time.time(), 7)
+    saved.write(*saved.snapshot())
+    return path.read_bytes()
+
+
+def test_saved_rings_are_restored(tmp_path):
+    saved_file(tmp_path / "telemetry.bin")
+    loaded = make_telemetry(tmp_path / "telemetry.bin")
+    loaded.load()
+    assert 7 in loaded.series("test", "players", "1h")
+
+
+@pytest.mark.parametrize("damage", [
+    lambda data: data[:6],  # Truncated inside the header length
+    lambda data: data[:20],  # Truncated inside the header
+    lambda data: telemetry.FILE_MAGIC + telemetry.HEADER_LENGTH.pack(2) + b"{}",  # No "rings"
+])
+def test_corrupt_file_starts_with_empty_rings(tmp_path, damage):
+    path = tmp_path / "telemetry.bin"
+    path.write_bytes(damage(saved_file(path)))
+    loaded = make_telemetry(path)
+    loaded.load()
+    assert 7 not in loaded.series("test", "players", "1h")
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_server import FakeServer
+from transport import MULTI_PACKET_THRESHOLD, AsyncConsole, AuthenticationError
+
+PASSWORD = "hunter2"
+COMMANDS = ["Info", "ShowPlayers", "Save", "Broadcast Hello", "ShowPlayers", "KickPlayer 76561190000000001"]
+# (fragment, echo_sentinel): whole packets, responses split mid-header and mid-body, servers that don't echo
+VARIANTS = [(0, True), (7, True), (1000, True), (0, False), (7, False)]
+
+
+def run_against(server: FakeServer, exchange) -> object:
+    """Runs `exchange(console)` on a fresh connection to `server`"""
+    async def scenario():
+        await server.start()
+        console = AsyncConsole("127.0.0.1", server.port, server.PASSWORD, timeout=5)
+        try:
+            return await exchange(console)
+        finally:
+            await console.close()
+            await server.close()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("fragment, echo_sentinel", VARIANTS)
+def test_large_roster_is_reassembled(fragment, echo_sentinel):
+    server = FakeServer(PASSWORD, players=500, fragment=fragment, echo_sentinel=echo_sentinel)
+    expected = server.respond("ShowPlayers")
+    # Several packets' worth, so it only comes back whole if the packets are joined in order
+    assert len(expected.encode("utf-8")) > 5 * MULTI_PACKET_THRESHOLD
+
+    async def exchange(console):
+        return [await console.command("ShowPlayers") for _ in range(3)]
+
+    assert run_against(server, exchange) == [expected] * 3
+
+
+@pytest.mark.parametrize("fragment, echo_sentinel", VARIANTS)
+def test_consecutive_commands_get_their_own_responses(fragment, echo_sentinel):
+    server = FakeServer(PASSWORD, players=100, fragment=fragment, echo_sentinel=echo_sentinel)
+
+    async def exchange(console):
+        return [await console.command(command) for command in COMMANDS]
+
+    # Late sentinel echoes (and the extra packet after them) must not leak into the next response
+    assert run_against(server, exchange) == [server.respond(command) for command in COMMANDS]
+
+
+@pytest.mark.parametrize("fragment, echo_sentinel", VARIANTS)
+@pytest.mark.parametrize("window", [1, 3, 8])
+def test_batch_results_match_their_commands(fragment, echo_sentinel, window):
+    server = FakeServer(PASSWORD, players=500, fragment=fragment, echo_sentinel=echo_sentinel)
+    commands = COMMANDS * 3
+
+    async def exchange(console):
+        results = await console.batch(commands, window=window)
+        # The connection is still in sync afterwards
+        return results, await console.command("Info")
+
+    results, info = run_against(server, exchange)
+    assert results == [server.respond(command) for command in commands]
+    assert info == server.respond("Info")
+
+
+def test_wrong_password_is_rejected():
+    server = FakeServer(PASSWORD)
+
+    async def exchange(console):
+        console.PASSWORD = "wrong"
+        with pytest.raises(AuthenticationError):
+            await console.command("Info")
+        return console.is_open()
+
+    assert run_against(server, exchange) is False
@@ -0,0 +1,222 @@
+"""Asyncio implementation of the Source RCON protocol.
+
+Packet layout (all integers are signed 32-bit little-endian):
+    size | request id | type | body (null-terminated) | empty string (null)
+
+Palworld's RCON server mostly follows the spec, but IGNs are not limited to
+latin characters, so bodies are decoded as UTF-8 (with replacement) instead
+of the ASCII that most Minecraft-oriented clients assume.
+"""
+import asyncio
+import itertools
+import socket
+import struct
+
+import logger
+
+log = logger.get_logger(__name__)
+
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+# Most commands of a batch sent ahead of their responses
+DEFAULT_BATCH_WINDOW = 8
+
+HEADER = struct.Struct("<iii")  # size, request id, type
+MIN_PACKET_SIZE = 10  # id + type + two null bytes
+MAX_PACKET_SIZE = 4096 + MIN_PACKET_SIZE
+# Servers split responses whose body would exceed this many bytes
+MULTI_PACKET_THRESHOLD = 4096 - MIN_PACKET_SIZE
+
+
+class RCONError(Exception):
+    """Raised when the server sends something that isn't a valid RCON packet"""
+
+
+class AuthenticationError(RCONError):
+    """Raised when the server rejects the RCON password"""
+
+
+# Framing helpers --------------------------------------------------------------
+def encode_packet(request_id: int, packet_type: int, body: str) -> bytes:
+    payload = body.encode("utf-8")
+    size = MIN_PACKET_SIZE + len(payload)
+    return HEADER.pack(size, request_id, packet_type) + payload + b"\x00\x00"
+
+
+async def read_packet(reader: asyncio.StreamReader) -> tuple[int, int, bytes]:
+    """Reads exactly one packet off the stream; returns (id, type, body)
+
+    `readexactly` is used throughout, so packets that arrive split across
+    several TCP segments are reassembled before being decoded.
+    """
+    size_bytes = await reader.readexactly(4)
+    (size,) = struct.unpack("<i", size_bytes)
+    if size < MIN_PACKET_SIZE or size > MAX_PACKET_SIZE:
+        raise RCONError(f"Invalid packet size: {size}")
+    data = await reader.readexactly(size)
+    request_id, packet_type = struct.unpack_from("<ii", data)
+    # Strip the body terminator and the trailing empty string
+    body = data[8:-2]
+    return request_id, packet_type, body
+
+
+# ------------------------------------------------------------------------------
+class AsyncConsole:
+    """A single authenticated RCON connection"""
+    def __init__(self, host: str, port: int, password: str, timeout: float):
+        self.HOST = host
+        self.PORT = port
+        self.PASSWORD = password
+        self.TIMEOUT = timeout
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.request_ids = itertools.count(1)
+        self.lock = asyncio.Lock()
+
+    def is_open(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def open(self) -> None:
+        log.debug(f"Opening RCON connection to {self.HOST}:{self.PORT}")
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.HOST, self.PORT),
+            timeout=self.TIMEOUT,
+        )
+        sock = self.writer.get_extra_info("socket")
+        if sock is not None:
+            # Lets the OS notice dead peers while the connection sits idle in a pool
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        try:
+            await asyncio.wait_for(self.authenticate(), timeout=self.TIMEOUT)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def close(self) -> None:
+        if self.writer is None:
+            return
+        writer = self.writer
+        self.reader = None
+        self.writer = None
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+    async def authenticate(self) -> None:
+        request_id = next(self.request_ids)
+        self.writer.write(encode_packet(request_id, SERVERDATA_AUTH, self.PASSWORD))
+        await self.writer.drain()
+        # Some servers send an empty SERVERDATA_RESPONSE_VALUE before the auth response
+        while True:
+            response_id, packet_type, _ = await read_packet(self.reader)
+            if packet_type == SERVERDATA_AUTH_RESPONSE:
+                break
+        if response_id == -1 or response_id != request_id:
+            raise AuthenticationError("RCON password was rejected by the server")
+
+    async def command(self, command: str) -> str:
+        """Sends a command and returns the full (reassembled) response body"""
+        async with self.lock:
+            if not self.is_open():
+                await self.open()
+            try:
+                return await asyncio.wait_for(self._exchange(command), timeout=self.TIMEOUT)
+            except BaseException:
+                # A half-read response would desync every later exchange
+                await self.close()
+                raise
+
+    async def _exchange(self, command: str) -> str:
+        request_id = next(self.request_ids)
+        sentinel_id = next(self.request_ids)
+        # The empty RESPONSE_VALUE packet is mirrored back after the full
+        # response, which marks the end of a multi-packet response
+        self.writer.write(
+            encode_packet(request_id, SERVERDATA_EXECCOMMAND, command)
+            + encode_packet(sentinel_id, SERVERDATA_RESPONSE_VALUE, "")
+        )
+        await self.writer.drain()
+
+        chunks = []
+        while True:
+            response_id, _, body = await read_packet(self.reader)
+            if response_id == sentinel_id:
+                break
+            if response_id != request_id:
+                # Leftovers from an earlier exchange (e.g. a late sentinel echo)
+                continue
+            chunks.append(body)
+            if len(body) < MULTI_PACKET_THRESHOLD:
+                # Not every server mirrors the sentinel; a short packet is always the last one.
+                # A late echo is skipped by the request ID check on the next exchange.
+                break
+        return b"".join(chunks).decode("utf-8", errors="replace")
+
+    async def batch(self, commands: list[str], window: int = DEFAULT_BATCH_WINDOW) -> list[str | Exception]:
+        """Sends several commands over this connection, pipelined up to `window` at a time
+
+        Responses are matched to commands by request ID. Returns one result per
+        command, in order: the response body, or the exception that ended the
+        batch (the connection is closed then, and every unanswered command gets it).
+        """
+        results: list[str | Exception | None] = [None] * len(commands)
+        async with self.lock:
+            try:
+                if not self.is_open():
+                    await self.open()
+                await self._pipeline(commands, results, max(1, window))
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, RCONError) as e:
+                await self.close()
+                results = [e if result is None else result for result in results]
+            except BaseException:
+                await self.close()
+                raise
+        return results
+
+    async def _pipeline(self, commands: list[str], results: list, window: int) -> None:
+        queued = iter(enumerate(commands))
+        pending: dict[int, tuple[int, list[bytes]]] = {}  # request id: (index of the command, body chunks)
+        sentinels: dict[int, int] = {}  # sentinel id: request id
+
+        def send_next() -> bool:
+            index, command = next(queued, (None, None))
+            if index is None:
+                return False
+            request_id = next(self.request_ids)
+            sentinel_id = next(self.request_ids)
+            pending[request_id] = (index, [])
+            sentinels[sentinel_id] = request_id
+            self.writer.write(
+                encode_packet(request_id, SERVERDATA_EXECCOMMAND, command)
+                + encode_packet(sentinel_id, SERVERDATA_RESPONSE_VALUE, "")
+            )
+            return True
+
+        for _ in range(window):
+            if not send_next():
+                break
+        await self.writer.drain()
+
+        while pending:
+            # The timeout applies per packet, so a long batch isn't cut short while it makes progress
+            response_id, _, body = await asyncio.wait_for(read_packet(self.reader), timeout=self.TIMEOUT)
+            if response_id in sentinels:
+                request_id = sentinels[response_id]
+            elif response_id in pending:
+                request_id = response_id
+                pending[request_id][1].append(body)
+                if len(body) >= MULTI_PACKET_THRESHOLD:
+                    continue
+            else:
+                # Late sentinel echoes of commands that already finished
+                continue
+            if request_id not in pending:
+                continue
+            index, chunks = pending.pop(request_id)
+            results[index] = b"".join(chunks).decode("utf-8", errors="replace")
+            if send_next():
+                await self.writer.drain()
@@ -0,0 +1,117 @@
+"""Discord UI components (message views) and the formatting they rely on."""
+from typing import Callable
+
+import discord
+
+from data import Player
+import logger
+
+log = logger.get_logger(__name__)
+
+STEAM_PROFILE_URL = "https://steamcommunity.com/profiles/{steam_id}/"
+FIELD_VALUE_LIMIT = 1024
+MAX_PLAYERS_PER_PAGE = 15
+PAGE_TIMEOUT = 180
+# Everything in a player line other than the name and Steam ID, incl. the newline separator
+LINE_OVERHEAD = len(f"[]({STEAM_PROFILE_URL.format(steam_id='')})\n")
+
+
+def format_player_line(steam_id: str, name: str) -> str:
+    return f"[{name}]({STEAM_PROFILE_URL.format(steam_id=steam_id)})"
+
+
+def format_player_list(players: list[Player]) -> str:
+    return "\n".join(format_player_line(player.steam_id, player.name) for player in players)
+
+
+def page_bounds(players: list[Player], limit: int = FIELD_VALUE_LIMIT) -> list[int]:
+    """Returns the start index of every page, so no page's field exceeds `limit`
+
+    Only string lengths are summed here; lines are formatted when a page is shown.
+    """
+    starts = [0]
+    page_length = 0
+    page_count = 0
+    for index, player in enumerate(players):
+        line_length = LINE_OVERHEAD + len(player.steam_id) + len(player.name)
+        if page_count and (page_length + line_length > limit or page_count == MAX_PLAYERS_PER_PAGE):
+            starts.append(index)
+            page_length = 0
+            page_count = 0
+        page_length += line_length
+        page_count += 1
+    return starts
+
+
+def format_player_preview(players: list[Player], more: Callable[[int], str]) -> str:
+    """As many players as fit in one field, then `more(count)` for the count that didn't"""
+    suffix_length = len(more(len(players)))
+    starts = page_bounds(players, limit=FIELD_VALUE_LIMIT - suffix_length)
+    shown = starts[1] if len(starts) > 1 else len(players)
+    value = format_player_list(players[:shown])
+    if shown < len(players):
+        value += more(len(players) - shown)
+    return value
+
+
+# ------------------------------------------------------------------------------
+class PlayerPages(discord.ui.View):
+    """Pages through a player list without querying the server again
+
+    `make_embed` builds the page-independent part of the embed (title, footer, etc.).
+    """
+    def __init__(self, players: dict[str, Player], make_embed: Callable[[], discord.Embed]):
+        super().__init__(timeout=PAGE_TIMEOUT)
+        self.players = list(players.values())
+        self.make_embed = make_embed
+        self.starts = page_bounds(self.players)
+        self.page = 0
+        self.message: discord.Message | None = None
+        self.update_buttons()
+
+    @property
+    def page_count(self) -> int:
+        return len(self.starts)
+
+    def render(self) -> discord.Embed:
+        start = self.starts[self.page]
+        end = self.starts[self.page + 1] if self.page + 1 < self.page_count else len(self.players)
+        embed_message = self.make_embed()
+        if self.players:
+            name = "Players" if self.page_count == 1 else f"Players (page {self.page + 1}/{self.page_count})"
+            embed_message.add_field(
+                name=name,
+                value=format_player_list(self.players[start:end])[:FIELD_VALUE_LIMIT],
+                inline=False,
+            )
+        return embed_message
+
+    def update_buttons(self) -> None:
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page + 1 >= self.page_count
+
+    async def show(self, interaction: discord.Interaction) -> None:
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = max(self.page - 1, 0)
+        await self.show(interaction)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = min(self.page + 1, self.page_count - 1)
+        await self.show(interaction)
+
+    async def on_timeout(self):
+        # Release the player list; the message keeps showing the last page, without buttons
+        self.players = []
+        self.starts = [0]
+        self.make_embed = None
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.DiscordException as e:
+                log.debug(f"Unable to remove expired page buttons: {e}")
+        self.message = None